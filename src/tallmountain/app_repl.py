@@ -14,13 +14,12 @@
 import logging
 import os
 import sys
+from concurrent.futures import Future
 from datetime import datetime
 from pathlib import Path
 from types import ModuleType
 from typing import Optional
 
-import ray
-
 readline: Optional[ModuleType]
 try:
     import readline
@@ -36,6 +35,10 @@ sys.path.append(path.parent.parent.absolute().__str__())
 sys.path.append(path.parent.parent.parent.absolute().__str__())
 # path fix for imports ----------------------------------------------
 
+from src.tallmountain.llm.llm_client_factory import LLMClientFactory  # noqa: E402
+from src.tallmountain.normative.analysis.conflict_analysis_executor import (  # noqa: E402
+    ConflictAnalysisExecutor,
+)
 from src.tallmountain.normative.analysis.impact_assessment import (  # noqa: E402
     ImpactAssessment,
     ImpactAssessmentResult,
@@ -43,13 +46,18 @@ from src.tallmountain.normative.analysis.impact_assessment import (  # noqa: E40
 from src.tallmountain.normative.analysis.norm_risk_analysis import (
     NormativeRiskAnalysis,
 )  # noqa: E402
+from src.tallmountain.normative.analysis.normative_pipeline import (  # noqa: E402
+    NormativePipeline,
+    NormativeVerdict,
+)
 from src.tallmountain.normative.analysis.np_extractor import (  # noqa: E402
     NormativeAnalysisResults,
     NormPropExtractor,
 )
-from src.tallmountain.normative.analysis.self_diagnostic import (
+from src.tallmountain.normative.analysis.self_diagnostic import (  # noqa: E402
+    NormativeDiagnostic,
     NormativeSelfDiagnostic,
-)  # noqa: E402
+)
 from src.tallmountain.normative.analysis.user_intent import (  # noqa: E402
     UserIntent,
     UserIntentAnalysis,
@@ -64,6 +72,7 @@ APP_LOGGER = logging.getLogger("<TallMountain App>")
 
 # command constants
 NRP_COMMAND = ":nrp"
+ALL_COMMAND = ":all"
 IAS_COMMAND = ":ias"
 UIS_COMMAND = ":uis"
 NP_COMMAND = ":np"
@@ -72,16 +81,29 @@ QUIT_COMMAND = ":q"
 
 
 def check_api_key():
+    if ConfigUtil.get_str("llm", "default_llm_provider") != LLMClientFactory.OPENAI_PROVIDER_STRING:
+        # other providers, such as the ReplayLLMClient, do not need an OpenAI key
+        return
     if os.getenv("OPENAI_API_KEY") is None:
         msg = "OPENAI_API_KEY environment variable not found"
         APP_LOGGER.debug(msg)
         raise EnvironmentError(msg)
 
 
-def perform_self_diagnosis():
+def perform_self_diagnosis() -> Optional[Future]:
+    """
+    Checks the norms before startup, or returns the diagnostic left running in the background
+    for the REPL to check between commands.
+    """
     APP_LOGGER.debug("Running the normative calculus self-diagnostic...")
     diagnostic = NormativeSelfDiagnostic()
-    result = diagnostic.run_diagnostic_test()
+    if NormativeSelfDiagnostic.BACKGROUND:
+        return diagnostic.diagnose_in_background()
+    check_self_diagnosis(diagnostic.diagnose())
+    return None
+
+
+def check_self_diagnosis(result: NormativeDiagnostic):
     if result.PassedDiagnostic == "False":
         msg = f"Sorry, the normative calculus self-diagnostic failed: {result.Analysis}"
         APP_LOGGER.debug(msg)
@@ -90,6 +112,30 @@ def perform_self_diagnosis():
         APP_LOGGER.debug("Normative calculus self-diagnostic passed successfully!")
 
 
+def check_background_diagnosis(diagnosis: Future):
+    try:
+        check_self_diagnosis(diagnosis.result())
+    except Exception:
+        stop_executor()
+        raise
+
+
+def start_executor():
+    if ConflictAnalysisExecutor.BACKEND == ConflictAnalysisExecutor.RAY:
+        # only the ray backend needs ray, started here rather than on the first nrp command
+        import ray
+
+        ray.init(ignore_reinit_error=True)
+
+
+def stop_executor():
+    ConflictAnalysisExecutor.shutdown_all()
+    if ConflictAnalysisExecutor.BACKEND == ConflictAnalysisExecutor.RAY:
+        import ray
+
+        ray.shutdown()
+
+
 def printf_implied_propositions(result: NormativeAnalysisResults):
     print("Implied Normative Propositions:")
     for prop in result.implied_propositions.NormativePropositions:
@@ -129,6 +175,15 @@ def printf_nrp(risk_profile: NormativeRiskAnalysis):
     print(f"Explanation: {risk_profile.explain()}")
 
 
+def printf_verdict(verdict: NormativeVerdict):
+    print("Normative Verdict:")
+    print(f"Task:\n  {verdict.task.name}: {verdict.task.goal}")
+    printf_uis(verdict.user_intent)
+    printf_ias(verdict.impact_assessment)
+    printf_nrp(verdict.risk_analysis)
+    print(f"Stage timings:\n{verdict.timings_to_md()}")
+
+
 def print_process_time(start_time, line):
     response = f"Processed: {line}"
     end_time = datetime.now()
@@ -140,10 +195,10 @@ def main():
     APP_LOGGER.debug("Starting TallMountain REPL... please wait")
 
     check_api_key()
-    perform_self_diagnosis()
+    diagnosis = perform_self_diagnosis()
 
-    # start ray
-    ray.init(ignore_reinit_error=True)
+    # start the conflict analysis backend
+    start_executor()
 
     APP_LOGGER.debug("Getting a cognitive cycle instance...")
     app_version = ConfigUtil.get_str("app", "version")
@@ -158,6 +213,10 @@ def main():
     )
 
     while True:
+        if diagnosis is not None and diagnosis.done():
+            # a failure stops the REPL, as it would have at startup
+            check_background_diagnosis(diagnosis)
+            diagnosis = None
         try:
             line = input("TallMountain (USER):> ").strip()
             start_time = datetime.now()
@@ -175,7 +234,8 @@ def main():
                     f"{NP_COMMAND}    - Extracts normative propositions from a query\n"
                     f"{UIS_COMMAND}   - Gets the User Intent Score for the query\n"
                     f"{IAS_COMMAND}   - Gets the Impact Assessment Score for the query\n"
-                    f"{NRP_COMMAND}   - Get a Normative Risk Profile for the query"
+                    f"{NRP_COMMAND}   - Get a Normative Risk Profile for the query\n"
+                    f"{ALL_COMMAND}   - Runs every stage concurrently for a consolidated verdict"
                 )
                 continue
 
@@ -204,20 +264,33 @@ def main():
                 print_process_time(start_time, line)
                 continue
 
+            if line.startswith(ALL_COMMAND):
+                query = line[5:].strip()
+                verdict: NormativeVerdict = NormativePipeline().assess(query)
+                printf_verdict(verdict)
+                print_process_time(start_time, line)
+                continue
+
             if line.startswith(NRP_COMMAND):
                 query = line[5:].strip()
-                user_task: UserTask = UserTask.get_from_query(query)
                 risk_analysis: NormativeRiskAnalysis = NormativeRiskAnalysis()
-                agent = NormativeAgent()
-                risk_analysis.analyse(user_task, agent)
+                agent = NormativeAgent.instance()
+                if NormPropExtractor.STREAM_PROPOSITIONS:
+                    # the conflict analyses start while the extraction is still streaming
+                    propositions = NormPropExtractor().stream_normative_propositions(query)
+                    risk_analysis.analyse_stream(propositions, agent)
+                else:
+                    user_task: UserTask = UserTask.get_from_query(query)
+                    risk_analysis.analyse(user_task, agent)
                 printf_nrp(risk_analysis)
                 print_process_time(start_time, line)
                 continue
 
         except Exception as e:
             print(f"An error occurred: {e}")
-        finally:
-            ray.shutdown()
+
+    # the conflict analysis backend lives for the whole session
+    stop_executor()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Compares the conflict analysis executor backends against the local stub server.
+# Each backend runs in a fresh process, so cold start and memory are measured from scratch.
+#
+#   python src/tallmountain/benchmarks/executor_benchmark.py --propositions 8 --latency-ms 500
+
+import os
+import sys
+from pathlib import Path
+
+# path fix for imports ----------------------------------------------
+path = Path(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(path.absolute().__str__())
+sys.path.append(path.parent.absolute().__str__())
+sys.path.append(path.parent.parent.absolute().__str__())
+sys.path.append(path.parent.parent.parent.absolute().__str__())
+# path fix for imports ----------------------------------------------
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import resource  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # nosec # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+from typing import Any, Dict, List, Optional  # noqa: E402
+
+from werkzeug.serving import make_server  # noqa: E402
+
+from src.tallmountain import stub_server  # noqa: E402
+from src.tallmountain.normative.analysis.conflict_analysis_executor import (  # noqa: E402
+    ConflictAnalysisExecutor,
+)
+from src.tallmountain.normative.normative_agent import NormativeAgent  # noqa: E402
+from src.tallmountain.normative.normative_proposition import (  # noqa: E402
+    Level,
+    Modality,
+    NormativeProposition,
+    Operator,
+)
+
+REPO_ROOT = path.parent.parent.parent.absolute().__str__()
+
+# prefixes the json result line in the noisy output of a backend run
+RESULT_MARKER = "EXECUTOR_BENCHMARK_RESULT "
+
+
+class ExecutorBenchmark:
+    """Runs the same conflict analyses on each executor backend and reports timings and memory."""
+
+    BACKENDS = [
+        ConflictAnalysisExecutor.RAY,
+        ConflictAnalysisExecutor.THREADS,
+        ConflictAnalysisExecutor.PROCESSES,
+        ConflictAnalysisExecutor.ASYNCIO,
+    ]
+
+    @staticmethod
+    def start_stub(latency_ms: int) -> str:
+        """Serves the stub on a free port from a background thread, returning its base url."""
+        stub_server.faults.update(
+            {
+                "rate_limit_rate": 0,
+                "server_error_rate": 0,
+                "content_filter_rate": 0,
+                "latency_distribution": "constant",
+                "latency_mean_ms": latency_ms,
+            }
+        )
+        server = make_server("127.0.0.1", 0, stub_server.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{server.server_port}/v1"
+
+    @staticmethod
+    def propositions(backend: str, run: int, count: int) -> List[NormativeProposition]:
+        # different on every run, so nothing is answered from the LLM cache
+        return [
+            NormativeProposition(
+                proposition_value=f"People should keep promise {index} ({backend} run {run}).",
+                operator=Operator.OUGHT,
+                level=Level.CODE_OF_CONDUCT,
+                modality=Modality.POSSIBLE,
+            )
+            for index in range(count)
+        ]
+
+    @staticmethod
+    def run_backend(backend: str, propositions: int, runs: int) -> Dict[str, Any]:
+        """Times the runs on one backend in this process."""
+        agent = NormativeAgent.instance()
+        started = time.perf_counter()
+        executor = ConflictAnalysisExecutor.create(backend)
+        timings: List[float] = []
+        for run in range(runs):
+            run_started = time.perf_counter()
+            executor.analyse(ExecutorBenchmark.propositions(backend, run, propositions), agent)
+            timings.append(time.perf_counter() - run_started)
+        # the first run includes starting the backend
+        cold_start = timings[0] + (time.perf_counter() - started - sum(timings))
+        # measured before shutdown, while any worker processes are still up
+        tree_rss_mb = ExecutorBenchmark.process_tree_rss_mb()
+        executor.shutdown()
+        if backend == ConflictAnalysisExecutor.RAY:
+            import ray
+
+            ray.shutdown()
+        return {
+            "backend": backend,
+            "cold_start_s": cold_start,
+            "warm_mean_s": statistics.mean(timings[1:]) if runs > 1 else timings[0],
+            # ru_maxrss is in kilobytes on linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "tree_rss_mb": tree_rss_mb,
+        }
+
+    @staticmethod
+    def process_tree_rss_mb() -> Optional[float]:
+        """The resident memory of this process and all its descendants, read from /proc."""
+        if not os.path.isdir("/proc"):
+            return None
+        parents: Dict[int, int] = {}
+        rss_kb: Dict[int, int] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/status") as status:
+                    for line in status:
+                        if line.startswith("PPid:"):
+                            parents[int(entry)] = int(line.split()[1])
+                        elif line.startswith("VmRSS:"):
+                            rss_kb[int(entry)] = int(line.split()[1])
+            except OSError:
+                # the process has gone
+                continue
+        tree = {os.getpid()}
+        added = True
+        while added:
+            children = {pid for pid, parent in parents.items() if parent in tree} - tree
+            tree |= children
+            added = len(children) > 0
+        return sum(rss_kb.get(pid, 0) for pid in tree) / 1024
+
+    @staticmethod
+    def run_in_subprocess(
+        backend: str, base_url: str, propositions: int, runs: int
+    ) -> Dict[str, Any]:
+        env = dict(os.environ, OPENAI_BASE_URL=base_url)
+        env.setdefault("OPENAI_API_KEY", "stub")
+        command = [
+            sys.executable,
+            os.path.realpath(__file__),
+            "--backend",
+            backend,
+            "--propositions",
+            str(propositions),
+            "--runs",
+            str(runs),
+        ]
+        completed = subprocess.run(  # nosec
+            command, cwd=REPO_ROOT, env=env, capture_output=True, text=True
+        )
+        for line in completed.stdout.splitlines():
+            if line.startswith(RESULT_MARKER):
+                result: Dict[str, Any] = json.loads(line.removeprefix(RESULT_MARKER))
+                return result
+        raise RuntimeError(f"{backend} benchmark failed:\n{completed.stderr[-2000:]}")
+
+    @staticmethod
+    def report(results: List[Dict[str, Any]]) -> str:
+        lines = [
+            "| backend | cold start s | warm mean s | peak rss MB | process tree rss MB |",
+            "|---------|--------------|-------------|-------------|---------------------|",
+        ]
+        for result in results:
+            tree_rss = result["tree_rss_mb"]
+            lines.append(
+                f"| {result['backend']} | {result['cold_start_s']:.2f} "
+                f"| {result['warm_mean_s']:.2f} | {result['peak_rss_mb']:.0f} "
+                f"| {'n/a' if tree_rss is None else f'{tree_rss:.0f}'} |"
+            )
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the conflict analysis executors.")
+    parser.add_argument("--backends", default=",".join(ExecutorBenchmark.BACKENDS))
+    parser.add_argument("--propositions", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency-ms", type=int, default=500)
+    # runs a single backend in this process, used for the per backend subprocesses
+    parser.add_argument("--backend")
+    args = parser.parse_args()
+
+    if args.backend:
+        result = ExecutorBenchmark.run_backend(args.backend, args.propositions, args.runs)
+        print(RESULT_MARKER + json.dumps(result))
+        return
+
+    base_url = ExecutorBenchmark.start_stub(args.latency_ms)
+    results = [
+        ExecutorBenchmark.run_in_subprocess(backend, base_url, args.propositions, args.runs)
+        for backend in args.backends.split(",")
+    ]
+    print(ExecutorBenchmark.report(results))
+
+
+if __name__ == "__main__":
+    main()
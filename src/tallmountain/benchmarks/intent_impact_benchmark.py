@@ -0,0 +1,167 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Compares scoring a task's intent and impact in one fused request with the two separate
+# requests, for latency, tokens and how often the scores agree. Runs against the local stub
+# server, or the configured provider with --live, where the agreement is meaningful.
+#
+#   python src/tallmountain/benchmarks/intent_impact_benchmark.py --runs 3 --latency-ms 500
+
+import os
+import sys
+from pathlib import Path
+
+# path fix for imports ----------------------------------------------
+path = Path(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(path.absolute().__str__())
+sys.path.append(path.parent.absolute().__str__())
+sys.path.append(path.parent.parent.absolute().__str__())
+sys.path.append(path.parent.parent.parent.absolute().__str__())
+# path fix for imports ----------------------------------------------
+
+import argparse  # noqa: E402
+import statistics  # noqa: E402
+import time  # noqa: E402
+from typing import Any, Dict, List, Tuple  # noqa: E402
+
+from src.tallmountain.benchmarks.executor_benchmark import ExecutorBenchmark  # noqa: E402
+from src.tallmountain.llm.llm_usage_metrics import LLMUsageMetrics  # noqa: E402
+from src.tallmountain.normative.analysis.impact_assessment import ImpactAssessment  # noqa: E402
+from src.tallmountain.normative.analysis.intent_impact_assessor import (  # noqa: E402
+    IntentImpactAnalysis,
+    IntentImpactAssessor,
+)
+from src.tallmountain.normative.analysis.user_intent import UserIntent  # noqa: E402
+
+QUERIES = [
+    "What is the capital of France?",
+    "Can you help me write a cover letter for a nursing job?",
+    "How do I pick the lock on my neighbour's front door?",
+    "Summarise the main causes of the First World War.",
+    "Write a fake doctor's note so I can skip work tomorrow.",
+]
+
+
+class IntentImpactBenchmark:
+    """Scores the same queries fused and separately and reports the differences."""
+
+    FUSED = "fused"
+    SEPARATE = "separate"
+
+    @staticmethod
+    def queries(run: int) -> List[str]:
+        # different on every run, so nothing is answered from the LLM cache
+        return [f"{query} (run {run})" for query in QUERIES]
+
+    @staticmethod
+    def score_fused(query: str) -> Tuple[int, int]:
+        analysis = IntentImpactAssessor().analyse(query)
+        return (
+            analysis.UserIntent.UserIntentScore,
+            analysis.ImpactAssessment.ImpactAssessmentScore,
+        )
+
+    @staticmethod
+    def score_separately(query: str) -> Tuple[int, int]:
+        return (
+            UserIntent().analyse_alone(query).UserIntentScore,
+            ImpactAssessment().analyse_alone(query).ImpactAssessmentScore,
+        )
+
+    @staticmethod
+    def tokens(labels: List[str]) -> Dict[str, int]:
+        totals = {
+            LLMUsageMetrics.REQUESTS: 0,
+            LLMUsageMetrics.PROMPT_TOKENS: 0,
+            LLMUsageMetrics.COMPLETION_TOKENS: 0,
+        }
+        for label in labels:
+            stats = LLMUsageMetrics.stats(label)
+            for key in totals:
+                totals[key] += stats.get(key, 0)
+        return totals
+
+    @staticmethod
+    def run(runs: int) -> Dict[str, Any]:
+        LLMUsageMetrics.clear()
+        latencies: Dict[str, List[float]] = {
+            IntentImpactBenchmark.FUSED: [],
+            IntentImpactBenchmark.SEPARATE: [],
+        }
+        scores: List[Tuple[Tuple[int, int], Tuple[int, int]]] = []
+        for run in range(runs):
+            for query in IntentImpactBenchmark.queries(run):
+                started = time.perf_counter()
+                fused = IntentImpactBenchmark.score_fused(query)
+                latencies[IntentImpactBenchmark.FUSED].append(time.perf_counter() - started)
+                started = time.perf_counter()
+                separate = IntentImpactBenchmark.score_separately(query)
+                latencies[IntentImpactBenchmark.SEPARATE].append(time.perf_counter() - started)
+                scores.append((fused, separate))
+        return {
+            "latency": {mode: statistics.mean(values) for mode, values in latencies.items()},
+            "tokens": {
+                IntentImpactBenchmark.FUSED: IntentImpactBenchmark.tokens(
+                    [IntentImpactAnalysis.__name__]
+                ),
+                IntentImpactBenchmark.SEPARATE: IntentImpactBenchmark.tokens(
+                    ["UserIntentAnalysis", "ImpactAssessmentResult"]
+                ),
+            },
+            "scores": scores,
+        }
+
+    @staticmethod
+    def report(result: Dict[str, Any]) -> str:
+        lines = [
+            "| mode | mean latency s | requests | prompt tokens | completion tokens |",
+            "|------|----------------|----------|---------------|-------------------|",
+        ]
+        for mode in [IntentImpactBenchmark.FUSED, IntentImpactBenchmark.SEPARATE]:
+            tokens = result["tokens"][mode]
+            lines.append(
+                f"| {mode} | {result['latency'][mode]:.2f} "
+                f"| {tokens[LLMUsageMetrics.REQUESTS]} "
+                f"| {tokens[LLMUsageMetrics.PROMPT_TOKENS]} "
+                f"| {tokens[LLMUsageMetrics.COMPLETION_TOKENS]} |"
+            )
+        lines.append("")
+        lines.append("| score | exact agreement | mean absolute difference |")
+        lines.append("|-------|-----------------|--------------------------|")
+        for index, name in enumerate(["User Intent", "Impact Assessment"]):
+            differences = [
+                abs(fused[index] - separate[index]) for fused, separate in result["scores"]
+            ]
+            agreement = sum(1 for difference in differences if difference == 0) / len(differences)
+            lines.append(f"| {name} | {agreement:.0%} | {statistics.mean(differences):.2f} |")
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark fused against separate intent and impact scoring."
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency-ms", type=int, default=500)
+    # use the configured provider rather than the stub, the stub's scores always agree
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    if not args.live:
+        os.environ["OPENAI_BASE_URL"] = ExecutorBenchmark.start_stub(args.latency_ms)
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+    print(IntentImpactBenchmark.report(IntentImpactBenchmark.run(args.runs)))
+
+
+if __name__ == "__main__":
+    main()
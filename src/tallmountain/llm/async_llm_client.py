@@ -0,0 +1,130 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from src.tallmountain.llm.llm_client import T
+from src.tallmountain.llm.xstructor_options import XStructorOptions
+from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class AsyncLLMClient:
+    """Base asyncio LLM client class. Mirrors LLMClient with awaitable methods."""
+
+    LOGGER = LoggingUtil.instance("<AsyncLLMClient>")
+
+    def __init__(self) -> None:
+        self._model: Optional[str] = None
+
+    @property
+    def model(self) -> Optional[str]:
+        return self._model
+
+    async def do_instructor(
+        self,
+        messages: List[Dict[str, str]],
+        response_model: Type[T],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        """
+        Base method for calling Instructor completions.
+        """
+        raise NotImplementedError
+
+    async def do_xstructor(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        """
+        Base method for calling XStructor xml schema based completions.
+        """
+        raise NotImplementedError
+
+    async def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        """
+        Base method for calling XStructor completions that return the validated lxml
+        root element rather than an xml string.
+        """
+        raise NotImplementedError
+
+    async def do_tool(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        """
+        Base method for calling tool using completions.
+        Returns a full completion object.
+        """
+        raise NotImplementedError
+
+    async def do_string(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+    ) -> str:
+        """
+        Base method for calling completions.
+        Returns a string.
+        """
+        raise NotImplementedError
+
+    async def do_string_candidates(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int,
+    ) -> List[str]:
+        """
+        Base method for sampling several completions from one request.
+        Returns a list of strings.
+        """
+        raise NotImplementedError
+
+    async def do_string_stream(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int = 1,
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Base method for streamed completions.
+        Yields (choice index, content chunk) pairs, closing the generator stops the request.
+        """
+        raise NotImplementedError
+        # unreachable, but makes this an async generator like the implementations
+        yield
+
+    async def do_completion(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        """
+        Base method for calling completions.
+        Returns a full completion object.
+        """
+        raise NotImplementedError
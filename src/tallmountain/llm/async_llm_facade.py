@@ -0,0 +1,229 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+
+from lxml import etree  # nosec
+from pydantic import BaseModel
+
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.async_llm_client import AsyncLLMClient
+from src.tallmountain.llm.llm_cache import LLMCache
+from src.tallmountain.llm.llm_client import T
+from src.tallmountain.llm.llm_client_factory import LLMClientFactory
+from src.tallmountain.llm.llm_facade import LLM
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_options import XStructorOptions
+from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class AsyncLLM:
+    """An asyncio facade for communicating with various LLMs. Mirrors the LLM facade."""
+
+    ERROR_FILTERED = LLM.ERROR_FILTERED
+    BAD_REQUEST = LLM.BAD_REQUEST
+    LOGGER = LoggingUtil.instance("<AsyncLLM>")
+
+    def __init__(self) -> None:
+        try:
+            self._wrapped_llm_client = LLMClientFactory.async_llm_client()
+            self._cache = LLMCache.instance()
+        except Exception as error:
+            raise LLMException(str(error))
+
+    @property
+    def wrapped_llm_client(self) -> AsyncLLMClient:
+        return self._wrapped_llm_client
+
+    @property
+    def cache(self) -> LLMCache:
+        return self._cache
+
+    def cache_key(
+        self,
+        call_type: str,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        response_spec: Any = None,
+    ) -> str:
+        # same key as the sync facade, so sync and async callers share entries
+        return LLMCache.make_key(
+            call_type, self.wrapped_llm_client.model, messages, mode, response_spec
+        )
+
+    async def do_tool(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List],
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+    ) -> Any:
+        try:
+            completion: Any = await self.wrapped_llm_client.do_tool(
+                messages=messages, tools=tools, mode=mode
+            )
+            return completion
+        except Exception as error:
+            return self.handle_error(error)
+
+    async def do_xstructor(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        try:
+            cache_key = self.cache_key(
+                LLMCache.XSTRUCTOR, messages, mode, {"schema": xml_schema, "example": xml_example}
+            )
+            cached = self.cache.get(LLMCache.XSTRUCTOR, cache_key)
+            if cached is not None:
+                return cached
+            completion: Any = await self.wrapped_llm_client.do_xstructor(
+                messages=messages,
+                xml_example=xml_example,
+                xml_schema=xml_schema,
+                mode=mode,
+                options=options,
+            )
+            if isinstance(completion, str):
+                self.cache.put(LLMCache.XSTRUCTOR, cache_key, completion)
+            return completion
+        except Exception as error:
+            return self.handle_error(error)
+
+    async def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        """Like do_xstructor, but returns the validated lxml root element."""
+        try:
+            cache_key = self.cache_key(
+                LLMCache.XSTRUCTOR, messages, mode, {"schema": xml_schema, "example": xml_example}
+            )
+            cached = self.cache.get(LLMCache.XSTRUCTOR, cache_key)
+            if cached is not None:
+                return etree.XML(cached)
+            element: Any = await self.wrapped_llm_client.do_xstructor_element(
+                messages=messages,
+                xml_example=xml_example,
+                xml_schema=xml_schema,
+                mode=mode,
+                options=options,
+            )
+            if self.cache.is_enabled(LLMCache.XSTRUCTOR):
+                self.cache.put(
+                    LLMCache.XSTRUCTOR, cache_key, etree.tostring(element, encoding="unicode")
+                )
+            return element
+        except Exception as error:
+            return self.handle_error(error)
+
+    async def do_xstructor_stream(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        element_tag: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+        options: Optional[XStructorOptions] = None,
+    ) -> AsyncIterator[etree._Element]:
+        """Async version of LLM.do_xstructor_stream."""
+        try:
+            cache_key = self.cache_key(
+                LLMCache.XSTRUCTOR, messages, mode, {"schema": xml_schema, "example": xml_example}
+            )
+            cached = self.cache.get(LLMCache.XSTRUCTOR, cache_key)
+            if cached is not None:
+                for element in etree.XML(cached).iter(element_tag):
+                    yield element
+                return
+            xstructor = XStructor(llm_client=self.wrapped_llm_client)
+            elements = xstructor.stream_elements_async(
+                messages, xml_example, xml_schema, element_tag, mode=mode, options=options
+            )
+            try:
+                async for element in elements:
+                    yield element
+            finally:
+                await elements.aclose()
+        except Exception as error:
+            # there is no marker to return from a stream, so a filtered request is an error too
+            if self.handle_error(error) == AsyncLLM.ERROR_FILTERED:
+                raise LLMException(AsyncLLM.ERROR_FILTERED)
+
+    async def do_instructor(
+        self,
+        messages: List[Dict[str, str]],
+        response_model: Type[T],
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+    ) -> Any:
+        try:
+            cache_key = self.cache_key(
+                LLMCache.INSTRUCTOR, messages, mode, LLMCache.response_model_spec(response_model)
+            )
+            cached = self.cache.get(LLMCache.INSTRUCTOR, cache_key)
+            if cached is not None:
+                return response_model.model_validate_json(cached)
+            completion: Any = await self.wrapped_llm_client.do_instructor(
+                messages=messages, response_model=response_model, mode=mode
+            )
+            if isinstance(completion, BaseModel):
+                self.cache.put(LLMCache.INSTRUCTOR, cache_key, completion.model_dump_json())
+            return completion
+        except Exception as error:
+            return self.handle_error(error)
+
+    async def do_completion(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+    ) -> Any:
+        try:
+            completion: Any = await self.wrapped_llm_client.do_completion(
+                messages=messages, mode=mode
+            )
+            return completion
+        except Exception as error:
+            return self.handle_error(error)
+
+    async def do_string_completion(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+    ) -> str:
+        try:
+            cache_key = self.cache_key(LLMCache.STRING, messages, mode)
+            cached = self.cache.get(LLMCache.STRING, cache_key)
+            if cached is not None:
+                return cached
+            completion: str = await self.wrapped_llm_client.do_string(messages=messages, mode=mode)
+            self.cache.put(LLMCache.STRING, cache_key, completion)
+            return completion
+        except Exception as error:
+            return self.handle_error(error)
+
+    def handle_error(self, error: Exception) -> str:
+        AsyncLLM.LOGGER.error(str(error))
+        if LLM.is_bad_request(error):
+            AsyncLLM.LOGGER.error(self.BAD_REQUEST)
+            return AsyncLLM.ERROR_FILTERED
+        else:
+            # all other errors
+            raise LLMException(str(error))
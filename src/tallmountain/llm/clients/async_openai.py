@@ -0,0 +1,267 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+import httpx2
+import instructor
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.async_llm_client import AsyncLLMClient
+from src.tallmountain.llm.clients.openai import OpenAIClient
+from src.tallmountain.llm.llm_client import T
+from src.tallmountain.llm.llm_client_registry import LLMClientRegistry
+from src.tallmountain.llm.llm_usage_metrics import LLMUsageMetrics
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_options import XStructorOptions
+from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class AsyncOpenAIClient(AsyncLLMClient):
+    """An asyncio interface to the OpenAI API. Used only from within the AsyncLLM facade."""
+
+    DEFAULT_MODEL = OpenAIClient.DEFAULT_MODEL
+
+    # keys for the shared per-loop clients in the LLMClientRegistry
+    OPENAI_CLIENT_KEY = "openai.async"
+    INSTRUCTOR_CLIENT_KEY = "openai.async.instructor"
+
+    LOGGER = LoggingUtil.instance("<AsyncOpenAIClient>")
+
+    def __init__(self) -> None:
+        super().__init__()
+        AsyncOpenAIClient.LOGGER.info("Initializing AsyncOpenAIClient...")
+        self._model = self.DEFAULT_MODEL
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # looked up on each use as the shared client belongs to the running loop
+        client: AsyncOpenAI = LLMClientRegistry.get_or_create_for_loop(
+            self.OPENAI_CLIENT_KEY, AsyncOpenAIClient.build_async_openai_client
+        )
+        return client
+
+    @property
+    def instructor_client(self) -> Any:
+        return LLMClientRegistry.get_or_create_for_loop(
+            self.INSTRUCTOR_CLIENT_KEY, lambda: instructor.from_openai(self.client)
+        )
+
+    @staticmethod
+    def build_async_openai_client(custom_config_file: str = None) -> AsyncOpenAI:
+        """Builds an AsyncOpenAI client with a keep-alive connection pool sized from config."""
+        # built with httpx2, the http library the SDK's clients are built on
+        limits = httpx2.Limits(
+            max_connections=LLMClientRegistry.POOL_SIZE,
+            max_keepalive_connections=LLMClientRegistry.POOL_SIZE,
+            keepalive_expiry=LLMClientRegistry.KEEPALIVE_EXPIRY,
+        )
+        return AsyncOpenAI(
+            api_key=OpenAIClient.api_key(),
+            base_url=OpenAIClient.base_url(custom_config_file),
+            http_client=DefaultAsyncHttpxClient(limits=limits),
+        )
+
+    async def do_xstructor(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        """
+        Method for calling XStructor xml schema based completions.
+        """
+        xstructor = XStructor(llm_client=self)
+        response = await xstructor.do_xstructor_completion_async(
+            messages, xml_example, xml_schema, mode=mode, options=options
+        )
+        return response
+
+    async def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        """
+        Method for calling XStructor completions that return the validated lxml element.
+        """
+        xstructor = XStructor(llm_client=self)
+        return await xstructor.do_xstructor_element_async(
+            messages, xml_example, xml_schema, mode=mode, options=options
+        )
+
+    async def do_instructor(
+        self,
+        messages: List[Dict[str, str]],
+        response_model: Type[T],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        """
+        Method for calling Instructor completions.
+        """
+        AsyncLLMClient.LOGGER.debug("Starting async instructor completion...")
+        try:
+            response, completion = (
+                await self.instructor_client.chat.completions.create_with_completion(
+                    model=self.model,
+                    messages=messages,  # type: ignore
+                    max_tokens=mode.max_tokens,
+                    temperature=mode.temperature,
+                    top_p=mode.top_p,
+                    response_model=response_model,
+                )
+            )
+            LLMUsageMetrics.record(response_model.__name__, getattr(completion, "usage", None))
+            return response
+        except Exception as error:
+            AsyncLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    async def do_tool(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        """
+        Method for calling tool using completions.
+        """
+        AsyncLLMClient.LOGGER.debug("Starting async tool completion...")
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,  # type: ignore
+                max_tokens=mode.max_tokens,
+                temperature=mode.temperature,
+                top_p=mode.top_p,
+                tools=tools,
+                tool_choice="auto",
+            )
+            LLMUsageMetrics.record(LLMUsageMetrics.TOOL, response.usage)
+            return response
+        except Exception as error:
+            AsyncLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    async def do_string(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+    ) -> str:
+        """
+        Method for calling completions.
+        Returns a string.
+        """
+        AsyncLLMClient.LOGGER.debug("Starting async string completion...")
+        try:
+            response: Any = await self.do_completion(messages=messages, mode=mode)
+            return f"{response.choices[0].message.content}"
+        except Exception as error:
+            AsyncLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    async def do_string_candidates(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int,
+    ) -> List[str]:
+        """
+        Method for sampling several completions from one request.
+        Returns a list of strings, one per choice.
+        """
+        AsyncLLMClient.LOGGER.debug(f"Starting async completion with {n} candidates...")
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,  # type: ignore
+                max_tokens=mode.max_tokens,
+                temperature=mode.temperature,
+                top_p=mode.top_p,
+                n=n,
+            )
+            LLMUsageMetrics.record(LLMUsageMetrics.COMPLETION, response.usage)
+            return [f"{choice.message.content}" for choice in response.choices]
+        except Exception as error:
+            AsyncLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    async def do_string_stream(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int = 1,
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Method for streamed completions.
+        Yields (choice index, content chunk) pairs as they arrive.
+        """
+        AsyncLLMClient.LOGGER.debug("Starting async streamed completion...")
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,  # type: ignore
+                max_tokens=mode.max_tokens,
+                temperature=mode.temperature,
+                top_p=mode.top_p,
+                n=n,
+                stream=True,
+                # the final chunk then carries the usage
+                stream_options={"include_usage": True},
+            )
+        except Exception as error:
+            AsyncLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+        try:
+            async for chunk in stream:
+                LLMUsageMetrics.record(LLMUsageMetrics.COMPLETION, chunk.usage)
+                for choice in chunk.choices:
+                    if choice.delta.content:
+                        yield choice.index, choice.delta.content
+        except Exception as error:
+            AsyncLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+        finally:
+            # closing the response stops the generation when the caller gives up early
+            await stream.close()
+
+    async def do_completion(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        """
+        Method for calling completions.
+        Returns a full completion object.
+        """
+        AsyncLLMClient.LOGGER.debug("Starting async completion...")
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,  # type: ignore
+                max_tokens=mode.max_tokens,
+                temperature=mode.temperature,
+                top_p=mode.top_p,
+            )
+            LLMUsageMetrics.record(LLMUsageMetrics.COMPLETION, response.usage)
+            return response
+        except Exception as error:
+            AsyncLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
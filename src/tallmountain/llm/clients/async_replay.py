@@ -0,0 +1,202 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from openai.types.chat import ChatCompletion
+
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.async_llm_client import AsyncLLMClient
+from src.tallmountain.llm.clients.replay import Cassette, LatencySampler, ReplayLLMClient
+from src.tallmountain.llm.llm_cache import LLMCache
+from src.tallmountain.llm.llm_client import T
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_options import XStructorOptions
+from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class AsyncReplayLLMClient(AsyncLLMClient):
+    """
+    An asyncio version of the ReplayLLMClient, sharing its cassette and record modes.
+    Used only from within the AsyncLLM facade.
+    """
+
+    LOGGER = LoggingUtil.instance("<AsyncReplayLLMClient>")
+
+    def __init__(
+        self,
+        cassette: Optional[Cassette] = None,
+        record_mode: Optional[str] = None,
+        latency: Optional[LatencySampler] = None,
+        recording_client: Optional[AsyncLLMClient] = None,
+    ) -> None:
+        super().__init__()
+        AsyncReplayLLMClient.LOGGER.info("Initializing AsyncReplayLLMClient...")
+        # the sync client does the cassette bookkeeping but never makes a request
+        self.replayer = ReplayLLMClient(cassette=cassette, record_mode=record_mode, latency=latency)
+        self._recording_client = recording_client
+        self._model = self.replayer.model
+
+    @property
+    def recording_client(self) -> AsyncLLMClient:
+        if self._recording_client is None:
+            from src.tallmountain.llm.clients.async_openai import AsyncOpenAIClient
+
+            self._recording_client = AsyncOpenAIClient()
+        return self._recording_client
+
+    async def do_xstructor(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        xstructor = XStructor(llm_client=self)
+        return await xstructor.do_xstructor_completion_async(
+            messages, xml_example, xml_schema, mode=mode, options=options
+        )
+
+    async def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        xstructor = XStructor(llm_client=self)
+        return await xstructor.do_xstructor_element_async(
+            messages, xml_example, xml_schema, mode=mode, options=options
+        )
+
+    async def do_instructor(
+        self,
+        messages: List[Dict[str, str]],
+        response_model: Type[T],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        request_type = ReplayLLMClient.INSTRUCTOR
+        key = ReplayLLMClient.request_key(
+            request_type, messages, mode, LLMCache.response_model_spec(response_model)
+        )
+        entry = self.replayer.replay(request_type, key)
+        if entry is not None:
+            await asyncio.sleep(self.replayer.latency.sample(entry.get("latency_ms")))
+            return response_model.model_validate_json(entry["response"])
+        started = time.perf_counter()
+        response = await self.recording_client.do_instructor(messages, response_model, mode)
+        self.replayer.record(request_type, key, messages, response.model_dump_json(), started)
+        return response
+
+    async def do_tool(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        request_type = ReplayLLMClient.TOOL
+        key = ReplayLLMClient.request_key(request_type, messages, mode, tools)
+        entry = self.replayer.replay(request_type, key)
+        if entry is not None:
+            await asyncio.sleep(self.replayer.latency.sample(entry.get("latency_ms")))
+            return ChatCompletion.model_validate_json(entry["response"])
+        started = time.perf_counter()
+        response = await self.recording_client.do_tool(messages, tools, mode)
+        self.replayer.record(request_type, key, messages, response.model_dump_json(), started)
+        return response
+
+    async def do_string(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+    ) -> str:
+        try:
+            response: Any = await self.do_completion(messages=messages, mode=mode)
+            return f"{response.choices[0].message.content}"
+        except Exception as error:
+            AsyncReplayLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    async def do_string_candidates(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int,
+    ) -> List[str]:
+        try:
+            request_type = ReplayLLMClient.COMPLETION
+            key = ReplayLLMClient.request_key(request_type, messages, mode, {"n": n})
+            entry = self.replayer.replay(request_type, key)
+            if entry is not None:
+                await asyncio.sleep(self.replayer.latency.sample(entry.get("latency_ms")))
+                replayed: List[str] = json.loads(entry["response"])
+                return replayed
+            started = time.perf_counter()
+            responses = await self.recording_client.do_string_candidates(messages, mode, n)
+            self.replayer.record(request_type, key, messages, json.dumps(responses), started)
+            return responses
+        except Exception as error:
+            AsyncReplayLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    async def do_string_stream(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int = 1,
+    ) -> AsyncIterator[Tuple[int, str]]:
+        contents, latency = await self.stream_contents(messages, mode, n)
+        chunks = ReplayLLMClient.stream_chunks(contents)
+        for index, chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield index, chunk
+
+    async def stream_contents(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int,
+    ) -> Tuple[List[str], float]:
+        request_type = ReplayLLMClient.COMPLETION
+        spec = {"n": n} if n > 1 else None
+        entry = self.replayer.replay(
+            request_type, ReplayLLMClient.request_key(request_type, messages, mode, spec)
+        )
+        if entry is None:
+            if n > 1:
+                return await self.do_string_candidates(messages, mode, n), 0.0
+            return [await self.do_string(messages, mode)], 0.0
+        latency = self.replayer.latency.sample(entry.get("latency_ms"))
+        return ReplayLLMClient.entry_contents(entry, n), latency
+
+    async def do_completion(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        request_type = ReplayLLMClient.COMPLETION
+        key = ReplayLLMClient.request_key(request_type, messages, mode)
+        entry = self.replayer.replay(request_type, key)
+        if entry is not None:
+            await asyncio.sleep(self.replayer.latency.sample(entry.get("latency_ms")))
+            return ChatCompletion.model_validate_json(entry["response"])
+        started = time.perf_counter()
+        response = await self.recording_client.do_completion(messages, mode)
+        self.replayer.record(request_type, key, messages, response.model_dump_json(), started)
+        return response
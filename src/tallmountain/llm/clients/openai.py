@@ -13,37 +13,77 @@
 
 #
 import os
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
 
+import httpx2
 import instructor
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import DefaultHttpxClient, OpenAI
 
 from src.tallmountain.exceptions.llm_exception import LLMException
 from src.tallmountain.llm.llm_client import LLMClient, T
+from src.tallmountain.llm.llm_client_registry import LLMClientRegistry
+from src.tallmountain.llm.llm_usage_metrics import LLMUsageMetrics
 from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_options import XStructorOptions
 from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+from src.tallmountain.util.config_util import ConfigUtil
 from src.tallmountain.util.logging_util import LoggingUtil
 
 # take environment variables from .env.
 load_dotenv()
 
-# OpenAI public api
-OPENI_API_KEY = os.environ["OPENAI_API_KEY"]
-
 
 class OpenAIClient(LLMClient):
     """An interface to the OpenAI API. Used only from within the LLM facade parent class."""
 
     DEFAULT_MODEL = "gpt-4o"
 
+    # keys for the shared clients in the LLMClientRegistry
+    OPENAI_CLIENT_KEY = "openai"
+    INSTRUCTOR_CLIENT_KEY = "openai.instructor"
+
     LOGGER = LoggingUtil.instance("<OpenAIClient>")
 
     def __init__(self) -> None:
         super().__init__()
         OpenAIClient.LOGGER.info("Initializing OpenAIClient...")
         self._model = self.DEFAULT_MODEL
-        self.client = OpenAI(api_key=OPENI_API_KEY)
+        self.client: OpenAI = LLMClientRegistry.get_or_create(
+            self.OPENAI_CLIENT_KEY, OpenAIClient.build_openai_client
+        )
+        self.instructor_client: Any = LLMClientRegistry.get_or_create(
+            self.INSTRUCTOR_CLIENT_KEY, lambda: instructor.from_openai(self.client)
+        )
+
+    @staticmethod
+    def api_key() -> str:
+        """Reads the OpenAI public api key, only when a client is first built."""
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if openai_api_key is None:
+            raise LLMException("OPENAI_API_KEY environment variable not found")
+        return openai_api_key
+
+    @staticmethod
+    def base_url(custom_config_file: str = None) -> Optional[str]:
+        """An alternative endpoint, such as the local stub server, or None for the public api."""
+        base_url = ConfigUtil.get_str("llm", "base_url", custom_config_file).strip()
+        return base_url or os.getenv("OPENAI_BASE_URL") or None
+
+    @staticmethod
+    def build_openai_client(custom_config_file: str = None) -> OpenAI:
+        """Builds an OpenAI client with a keep-alive connection pool sized from config."""
+        # built with httpx2, the http library the SDK's clients are built on
+        limits = httpx2.Limits(
+            max_connections=LLMClientRegistry.POOL_SIZE,
+            max_keepalive_connections=LLMClientRegistry.POOL_SIZE,
+            keepalive_expiry=LLMClientRegistry.KEEPALIVE_EXPIRY,
+        )
+        return OpenAI(
+            api_key=OpenAIClient.api_key(),
+            base_url=OpenAIClient.base_url(custom_config_file),
+            http_client=DefaultHttpxClient(limits=limits),
+        )
 
     def do_xstructor(
         self,
@@ -51,15 +91,34 @@ class OpenAIClient(LLMClient):
         xml_example: str,
         xml_schema: str,
         mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
     ) -> Any:
         """
         Base method for calling XStructor xml schema based completions.
         Used for more complex tasks where Instructor is not enough.
         """
         xstructor = XStructor(llm_client=self)
-        response = xstructor.do_xstructor_completion(messages, xml_example, xml_schema, mode=mode)
+        response = xstructor.do_xstructor_completion(
+            messages, xml_example, xml_schema, mode=mode, options=options
+        )
         return response
 
+    def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        """
+        Method for calling XStructor completions that return the validated lxml element.
+        """
+        xstructor = XStructor(llm_client=self)
+        return xstructor.do_xstructor_element(
+            messages, xml_example, xml_schema, mode=mode, options=options
+        )
+
     def do_instructor(
         self,
         messages: List[Dict[str, str]],
@@ -71,8 +130,7 @@ class OpenAIClient(LLMClient):
         """
         LLMClient.LOGGER.debug("Starting instructor completion...")
         try:
-            patched_client = instructor.from_openai(OpenAI())
-            response = patched_client.chat.completions.create(
+            response, completion = self.instructor_client.chat.completions.create_with_completion(
                 model=self.model,
                 messages=messages,  # type: ignore
                 max_tokens=mode.max_tokens,
@@ -80,6 +138,7 @@ class OpenAIClient(LLMClient):
                 top_p=mode.top_p,
                 response_model=response_model,
             )
+            LLMUsageMetrics.record(response_model.__name__, getattr(completion, "usage", None))
             return response
         except Exception as error:
             LLMClient.LOGGER.error(str(error))
@@ -105,6 +164,7 @@ class OpenAIClient(LLMClient):
                 tools=tools,
                 tool_choice="auto",
             )
+            LLMUsageMetrics.record(LLMUsageMetrics.TOOL, response.usage)
             return response
         except Exception as error:
             LLMClient.LOGGER.error(str(error))
@@ -127,6 +187,71 @@ class OpenAIClient(LLMClient):
             LLMClient.LOGGER.error(str(error))
             raise LLMException(str(error))
 
+    def do_string_candidates(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int,
+    ) -> List[str]:
+        """
+        Method for sampling several completions from one request.
+        Returns a list of strings, one per choice.
+        """
+        LLMClient.LOGGER.debug(f"Starting completion with {n} candidates...")
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,  # type: ignore
+                max_tokens=mode.max_tokens,
+                temperature=mode.temperature,
+                top_p=mode.top_p,
+                n=n,
+            )
+            LLMUsageMetrics.record(LLMUsageMetrics.COMPLETION, response.usage)
+            return [f"{choice.message.content}" for choice in response.choices]
+        except Exception as error:
+            LLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    def do_string_stream(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int = 1,
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Method for streamed completions.
+        Yields (choice index, content chunk) pairs as they arrive.
+        """
+        LLMClient.LOGGER.debug("Starting streamed completion...")
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,  # type: ignore
+                max_tokens=mode.max_tokens,
+                temperature=mode.temperature,
+                top_p=mode.top_p,
+                n=n,
+                stream=True,
+                # the final chunk then carries the usage
+                stream_options={"include_usage": True},
+            )
+        except Exception as error:
+            LLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+        try:
+            for chunk in stream:
+                LLMUsageMetrics.record(LLMUsageMetrics.COMPLETION, chunk.usage)
+                for choice in chunk.choices:
+                    if choice.delta.content:
+                        yield choice.index, choice.delta.content
+        except Exception as error:
+            LLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+        finally:
+            # closing the response stops the generation when the caller gives up early
+            stream.close()
+
     def do_completion(
         self,
         messages: List[Dict[str, str]],
@@ -145,6 +270,7 @@ class OpenAIClient(LLMClient):
                 temperature=mode.temperature,
                 top_p=mode.top_p,
             )
+            LLMUsageMetrics.record(LLMUsageMetrics.COMPLETION, response.usage)
             return response
         except Exception as error:
             LLMClient.LOGGER.error(str(error))
@@ -0,0 +1,410 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from openai.types.chat import ChatCompletion
+
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.llm_cache import LLMCache
+from src.tallmountain.llm.llm_client import LLMClient, T
+from src.tallmountain.llm.llm_client_registry import LLMClientRegistry
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_options import XStructorOptions
+from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.file_path_util import FilePathUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class LatencySampler:
+    """Samples a simulated response latency, in seconds, from a configurable distribution."""
+
+    NONE = "none"
+    CONSTANT = "constant"
+    UNIFORM = "uniform"
+    NORMAL = "normal"
+    LOGNORMAL = "lognormal"
+    # replays the latency measured when the response was recorded
+    RECORDED = "recorded"
+
+    def __init__(
+        self, distribution: str, mean_ms: float, stddev_ms: float, seed: Optional[int] = None
+    ) -> None:
+        if distribution not in [
+            self.NONE,
+            self.CONSTANT,
+            self.UNIFORM,
+            self.NORMAL,
+            self.LOGNORMAL,
+            self.RECORDED,
+        ]:
+            raise LLMException(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.mean_ms = mean_ms
+        self.stddev_ms = stddev_ms
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_config() -> "LatencySampler":
+        seed = ConfigUtil.get_int("replay", "latency_seed")
+        return LatencySampler(
+            distribution=ConfigUtil.get_str("replay", "latency_distribution"),
+            mean_ms=ConfigUtil.get_float("replay", "latency_mean_ms"),
+            stddev_ms=ConfigUtil.get_float("replay", "latency_stddev_ms"),
+            seed=seed if seed >= 0 else None,
+        )
+
+    def sample(self, recorded_ms: Optional[float] = None) -> float:
+        with self._lock:
+            if self.distribution == self.NONE:
+                latency_ms = 0.0
+            elif self.distribution == self.CONSTANT:
+                latency_ms = self.mean_ms
+            elif self.distribution == self.UNIFORM:
+                latency_ms = self._random.uniform(
+                    self.mean_ms - self.stddev_ms, self.mean_ms + self.stddev_ms
+                )
+            elif self.distribution == self.NORMAL:
+                latency_ms = self._random.gauss(self.mean_ms, self.stddev_ms)
+            elif self.distribution == self.LOGNORMAL and self.mean_ms <= 0:
+                # a lognormal has no parameters for a mean of zero
+                latency_ms = 0.0
+            elif self.distribution == self.LOGNORMAL:
+                # parameters chosen so the samples have the configured mean and stddev
+                sigma_squared = math.log(1 + (self.stddev_ms / self.mean_ms) ** 2)
+                mu = math.log(self.mean_ms) - sigma_squared / 2
+                latency_ms = self._random.lognormvariate(mu, math.sqrt(sigma_squared))
+            else:
+                latency_ms = recorded_ms if recorded_ms is not None else self.mean_ms
+        return max(latency_ms, 0.0) / 1000
+
+
+class Cassette:
+    """
+    A JSONL file of recorded LLM request/response pairs, keyed by a hash of the request.
+    Requests recorded more than once replay their responses in turn.
+    """
+
+    LOGGER = LoggingUtil.instance("<Cassette>")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._next_index: Dict[str, int] = {}
+        self.load()
+
+    @staticmethod
+    def shared(path: str) -> "Cassette":
+        """Returns the process-wide cassette for the path, so recordings are not interleaved."""
+        cassette: Cassette = LLMClientRegistry.get_or_create(
+            f"replay.cassette:{path}", lambda: Cassette(path)
+        )
+        return cassette
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as cassette_file:
+            for line in cassette_file:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+        Cassette.LOGGER.info(f"Loaded {len(self)} recorded requests from {self.path}")
+
+    def find(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = self._next_index.get(key, 0)
+            self._next_index[key] = index + 1
+            return entries[index % len(entries)]
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries.setdefault(entry["key"], []).append(entry)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as cassette_file:
+                cassette_file.write(json.dumps(entry) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ReplayLLMClient(LLMClient):
+    """
+    Replays LLM responses from a cassette file, with simulated latency, so the pipeline can be
+    run and benchmarked without a live provider. In record mode requests go to a real client
+    and the responses are appended to the cassette. Used only from within the LLM facade.
+
+    XStructor completions are replayed at the string completion level, so the XML cleaning
+    and schema validation still run locally.
+    """
+
+    LOGGER = LoggingUtil.instance("<ReplayLLMClient>")
+
+    # record modes
+    REPLAY = "replay"
+    RECORD = "record"
+    # replays what it can and records the rest
+    RECORD_MISSING = "record_missing"
+
+    # request types stored in the cassette
+    INSTRUCTOR = LLMCache.INSTRUCTOR
+    COMPLETION = "completion"
+    TOOL = "tool"
+
+    # replayed completions are streamed back in chunks of this many characters
+    STREAM_CHUNK_CHARS = 16
+
+    def __init__(
+        self,
+        cassette: Optional[Cassette] = None,
+        record_mode: Optional[str] = None,
+        latency: Optional[LatencySampler] = None,
+        recording_client: Optional[LLMClient] = None,
+    ) -> None:
+        super().__init__()
+        ReplayLLMClient.LOGGER.info("Initializing ReplayLLMClient...")
+        if cassette is None:
+            cassette = Cassette.shared(ReplayLLMClient.cassette_path())
+        self.cassette = cassette
+        self.record_mode = record_mode or ConfigUtil.get_str("replay", "record_mode")
+        if self.record_mode not in [self.REPLAY, self.RECORD, self.RECORD_MISSING]:
+            raise LLMException(f"Unknown replay record mode: {self.record_mode}")
+        self.latency = latency or LatencySampler.from_config()
+        self._recording_client = recording_client
+        self._model = ConfigUtil.get_str("replay", "model")
+
+    @staticmethod
+    def cassette_path() -> str:
+        return FilePathUtil.append_path_to_repo_path(ConfigUtil.get_str("replay", "cassette_path"))
+
+    @property
+    def recording_client(self) -> LLMClient:
+        if self._recording_client is None:
+            # imported here so replaying never needs the provider sdk or an api key
+            from src.tallmountain.llm.clients.openai import OpenAIClient
+
+            self._recording_client = OpenAIClient()
+        return self._recording_client
+
+    @staticmethod
+    def request_key(
+        request_type: str,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        response_spec: Any = None,
+    ) -> str:
+        # the model is left out so a cassette can be replayed whatever model recorded it
+        return LLMCache.make_key(request_type, None, messages, mode, response_spec)
+
+    def replay(self, request_type: str, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the recorded entry for the request, or None if it should be recorded."""
+        if self.record_mode == self.RECORD:
+            return None
+        entry = self.cassette.find(key)
+        if entry is None and self.record_mode == self.REPLAY:
+            raise LLMException(f"No recorded {request_type} response found for request {key}")
+        return entry
+
+    def record(
+        self,
+        request_type: str,
+        key: str,
+        messages: List[Dict[str, str]],
+        response: str,
+        started: float,
+    ) -> None:
+        self.cassette.record(
+            {
+                "key": key,
+                "type": request_type,
+                "messages": messages,
+                "response": response,
+                "latency_ms": (time.perf_counter() - started) * 1000,
+            }
+        )
+
+    def do_xstructor(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        xstructor = XStructor(llm_client=self)
+        return xstructor.do_xstructor_completion(
+            messages, xml_example, xml_schema, mode=mode, options=options
+        )
+
+    def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        xstructor = XStructor(llm_client=self)
+        return xstructor.do_xstructor_element(
+            messages, xml_example, xml_schema, mode=mode, options=options
+        )
+
+    def do_instructor(
+        self,
+        messages: List[Dict[str, str]],
+        response_model: Type[T],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        key = self.request_key(
+            self.INSTRUCTOR, messages, mode, LLMCache.response_model_spec(response_model)
+        )
+        entry = self.replay(self.INSTRUCTOR, key)
+        if entry is not None:
+            time.sleep(self.latency.sample(entry.get("latency_ms")))
+            return response_model.model_validate_json(entry["response"])
+        started = time.perf_counter()
+        response = self.recording_client.do_instructor(messages, response_model, mode)
+        self.record(self.INSTRUCTOR, key, messages, response.model_dump_json(), started)
+        return response
+
+    def do_tool(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        key = self.request_key(self.TOOL, messages, mode, tools)
+        entry = self.replay(self.TOOL, key)
+        if entry is not None:
+            time.sleep(self.latency.sample(entry.get("latency_ms")))
+            return ChatCompletion.model_validate_json(entry["response"])
+        started = time.perf_counter()
+        response = self.recording_client.do_tool(messages, tools, mode)
+        self.record(self.TOOL, key, messages, response.model_dump_json(), started)
+        return response
+
+    def do_string(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+    ) -> str:
+        try:
+            response: Any = self.do_completion(messages=messages, mode=mode)
+            return f"{response.choices[0].message.content}"
+        except Exception as error:
+            ReplayLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    def do_string_candidates(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int,
+    ) -> List[str]:
+        try:
+            key = self.request_key(self.COMPLETION, messages, mode, {"n": n})
+            entry = self.replay(self.COMPLETION, key)
+            if entry is not None:
+                time.sleep(self.latency.sample(entry.get("latency_ms")))
+                replayed: List[str] = json.loads(entry["response"])
+                return replayed
+            started = time.perf_counter()
+            responses = self.recording_client.do_string_candidates(messages, mode, n)
+            self.record(self.COMPLETION, key, messages, json.dumps(responses), started)
+            return responses
+        except Exception as error:
+            ReplayLLMClient.LOGGER.error(str(error))
+            raise LLMException(str(error))
+
+    def do_string_stream(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int = 1,
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Streams a recorded completion back in chunks, spreading the simulated latency over
+        them, so cutting a stream short saves time in a benchmark as it would live.
+        Streams share the cassette entries of the matching non-streamed requests.
+        """
+        contents, latency = self.stream_contents(messages, mode, n)
+        chunks = self.stream_chunks(contents)
+        for index, chunk in chunks:
+            time.sleep(latency / len(chunks))
+            yield index, chunk
+
+    def stream_contents(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int,
+    ) -> Tuple[List[str], float]:
+        """The choice contents to stream and the latency in seconds to spread over them."""
+        spec = {"n": n} if n > 1 else None
+        entry = self.replay(
+            self.COMPLETION, self.request_key(self.COMPLETION, messages, mode, spec)
+        )
+        if entry is None:
+            # recorded through the non-streamed requests, which have already taken their time
+            if n > 1:
+                return self.do_string_candidates(messages, mode, n), 0.0
+            return [self.do_string(messages, mode)], 0.0
+        return self.entry_contents(entry, n), self.latency.sample(entry.get("latency_ms"))
+
+    @staticmethod
+    def entry_contents(entry: Dict[str, Any], n: int) -> List[str]:
+        if n > 1:
+            contents: List[str] = json.loads(entry["response"])
+            return contents
+        completion = ChatCompletion.model_validate_json(entry["response"])
+        return [f"{completion.choices[0].message.content}"]
+
+    @staticmethod
+    def stream_chunks(contents: List[str]) -> List[Tuple[int, str]]:
+        """Splits the choice contents into (choice index, chunk) pairs, interleaving the choices."""
+        chunks: List[Tuple[int, str]] = []
+        size = ReplayLLMClient.STREAM_CHUNK_CHARS
+        for start in range(0, max((len(content) for content in contents), default=0), size):
+            end = start + size
+            for index, content in enumerate(contents):
+                if start < len(content):
+                    chunks.append((index, content[start:end]))
+        return chunks or [(0, "")]
+
+    def do_completion(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+    ) -> Any:
+        key = self.request_key(self.COMPLETION, messages, mode)
+        entry = self.replay(self.COMPLETION, key)
+        if entry is not None:
+            time.sleep(self.latency.sample(entry.get("latency_ms")))
+            return ChatCompletion.model_validate_json(entry["response"])
+        started = time.perf_counter()
+        response = self.recording_client.do_completion(messages, mode)
+        self.record(self.COMPLETION, key, messages, response.model_dump_json(), started)
+        return response
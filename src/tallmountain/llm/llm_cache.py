@@ -0,0 +1,274 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import (
+    Counter,
+    OrderedDict,
+)
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+)
+
+from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.file_path_util import FilePathUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class MemoryCacheTier:
+    """A thread-safe, size-bounded in-memory LRU tier."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheTier:
+    """A persistent SQLite tier with a TTL and least-recently-used eviction past max_entries."""
+
+    def __init__(self, db_path: str, ttl_seconds: float, max_entries: int) -> None:
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl_seconds > 0 and now - created > self.ttl_seconds:
+                self._connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._connection.commit()
+                return None
+            self._connection.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            return str(value)
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self.evict()
+            self._connection.commit()
+
+    def evict(self) -> None:
+        """Drops expired rows, then the least recently used rows over max_entries."""
+        if self.ttl_seconds > 0:
+            self._connection.execute(
+                "DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl_seconds,)
+            )
+        self._connection.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM llm_cache")
+            self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0])
+
+
+class LLMCache:
+    """
+    A content-addressed cache for LLM responses, used from within the LLM facades.
+    Keys are a hash of the call type, model, messages, request mode and the response model
+    or XML schema. Lookups go to an in-memory LRU tier first, then the optional SQLite tier.
+    """
+
+    LOGGER = LoggingUtil.instance("<LLMCache>")
+
+    # call types
+    INSTRUCTOR = "instructor"
+    XSTRUCTOR = "xstructor"
+    STRING = "string"
+
+    _instance: Optional["LLMCache"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        enabled_call_types: List[str],
+        memory_max_entries: int,
+        disk_path: Optional[str] = None,
+        disk_ttl_seconds: float = 0,
+        disk_max_entries: int = 0,
+    ) -> None:
+        self.enabled_call_types = set(enabled_call_types)
+        self.memory_tier = MemoryCacheTier(memory_max_entries)
+        self.disk_tier: Optional[SQLiteCacheTier] = None
+        if disk_path is not None:
+            self.disk_tier = SQLiteCacheTier(disk_path, disk_ttl_seconds, disk_max_entries)
+        self._counters: Counter = Counter()
+        self._counters_lock = threading.Lock()
+
+    @staticmethod
+    def instance() -> "LLMCache":
+        """Returns the process-wide cache configured from app.ini."""
+        if LLMCache._instance is None:
+            with LLMCache._instance_lock:
+                if LLMCache._instance is None:
+                    LLMCache._instance = LLMCache.from_config()
+        return LLMCache._instance
+
+    @staticmethod
+    def from_config() -> "LLMCache":
+        enabled_call_types: List[str] = []
+        if ConfigUtil.get_bool("llm_cache", "enabled"):
+            for call_type in [LLMCache.INSTRUCTOR, LLMCache.XSTRUCTOR, LLMCache.STRING]:
+                if ConfigUtil.get_bool("llm_cache", f"cache_{call_type}"):
+                    enabled_call_types.append(call_type)
+        disk_path = None
+        if ConfigUtil.get_bool("llm_cache", "disk_enabled"):
+            disk_path = FilePathUtil.append_path_to_repo_path(
+                ConfigUtil.get_str("llm_cache", "disk_path")
+            )
+        return LLMCache(
+            enabled_call_types=enabled_call_types,
+            memory_max_entries=ConfigUtil.get_int("llm_cache", "memory_max_entries"),
+            disk_path=disk_path,
+            disk_ttl_seconds=ConfigUtil.get_float("llm_cache", "disk_ttl_seconds"),
+            disk_max_entries=ConfigUtil.get_int("llm_cache", "disk_max_entries"),
+        )
+
+    @staticmethod
+    def make_key(
+        call_type: str,
+        model: Optional[str],
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        response_spec: Any,
+    ) -> str:
+        """Hashes everything that determines a response into a stable cache key."""
+        key_data = {
+            "call_type": call_type,
+            "model": model,
+            "messages": messages,
+            "mode": {
+                "mode": str(mode.mode),
+                "temperature": mode.temperature,
+                "top_p": mode.top_p,
+                "max_tokens": mode.max_tokens,
+            },
+            "response_spec": response_spec,
+        }
+        key_json = json.dumps(key_data, sort_keys=True, default=str)
+        return hashlib.sha256(key_json.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def response_model_spec(response_model: Any) -> Any:
+        """Describes a response model by name and JSON schema, so edits to it miss the cache."""
+        schema_method = getattr(response_model, "model_json_schema", None)
+        schema = schema_method() if callable(schema_method) else None
+        return {"name": getattr(response_model, "__name__", str(response_model)), "schema": schema}
+
+    def is_enabled(self, call_type: str) -> bool:
+        return call_type in self.enabled_call_types
+
+    def get(self, call_type: str, key: str) -> Optional[str]:
+        if not self.is_enabled(call_type):
+            return None
+        value = self.memory_tier.get(key)
+        if value is not None:
+            self.count(f"{call_type}.hits.memory")
+            return value
+        if self.disk_tier is not None:
+            try:
+                value = self.disk_tier.get(key)
+            except Exception as error:
+                # a broken disk tier is a miss, the LLM call goes ahead
+                self.LOGGER.error(f"Failed to read from the disk cache: {error}")
+            if value is not None:
+                self.count(f"{call_type}.hits.disk")
+                # promote to the faster tier
+                self.memory_tier.put(key, value)
+                return value
+        self.count(f"{call_type}.misses")
+        return None
+
+    def put(self, call_type: str, key: str, value: str) -> None:
+        if not self.is_enabled(call_type):
+            return
+        self.memory_tier.put(key, value)
+        if self.disk_tier is not None:
+            try:
+                self.disk_tier.put(key, value)
+            except Exception as error:
+                # a broken disk tier must never fail the LLM call itself
+                self.LOGGER.error(f"Failed to write to the disk cache: {error}")
+        self.count(f"{call_type}.stores")
+
+    def count(self, counter: str) -> None:
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._counters_lock:
+            return dict(self._counters)
+
+    def clear(self) -> None:
+        self.memory_tier.clear()
+        if self.disk_tier is not None:
+            self.disk_tier.clear()
+        with self._counters_lock:
+            self._counters.clear()
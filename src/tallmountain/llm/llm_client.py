@@ -11,16 +11,16 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from typing import Any, Dict, Iterable, List, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
 
-from instructor import Partial
 from pydantic import BaseModel
 
+from src.tallmountain.llm.xstructor_options import XStructorOptions
 from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
 from src.tallmountain.util.logging_util import LoggingUtil
 
-# based on T in instructor.client.Instructor
-T = TypeVar("T", bound=Union[BaseModel, Iterable, Partial])
+# the response models, pydantic models so cached responses can be validated back into them
+T = TypeVar("T", bound=BaseModel)
 
 
 class LLMClient:
@@ -52,6 +52,7 @@ class LLMClient:
         xml_example: str,
         xml_schema: str,
         mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
     ) -> Any:
         """
         Base method for calling XStructor xml schema based completions.
@@ -59,6 +60,20 @@ class LLMClient:
         """
         raise NotImplementedError
 
+    def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        """
+        Base method for calling XStructor completions that return the validated lxml
+        root element rather than an xml string.
+        """
+        raise NotImplementedError
+
     def do_tool(
         self,
         messages: List[Dict[str, str]],
@@ -82,6 +97,30 @@ class LLMClient:
         """
         raise NotImplementedError
 
+    def do_string_candidates(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int,
+    ) -> List[str]:
+        """
+        Base method for sampling several completions from one request.
+        Returns a list of strings.
+        """
+        raise NotImplementedError
+
+    def do_string_stream(
+        self,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        n: int = 1,
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Base method for streamed completions.
+        Yields (choice index, content chunk) pairs, closing the generator stops the request.
+        """
+        raise NotImplementedError
+
     def do_completion(
         self,
         messages: List[Dict[str, str]],
@@ -13,7 +13,11 @@
 #
 #
 from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.async_llm_client import AsyncLLMClient
+from src.tallmountain.llm.clients.async_openai import AsyncOpenAIClient
+from src.tallmountain.llm.clients.async_replay import AsyncReplayLLMClient
 from src.tallmountain.llm.clients.openai import OpenAIClient
+from src.tallmountain.llm.clients.replay import ReplayLLMClient
 from src.tallmountain.llm.llm_client import LLMClient
 from src.tallmountain.util.config_util import ConfigUtil
 
@@ -24,6 +28,7 @@ class LLMClientFactory:
     """
 
     OPENAI_PROVIDER_STRING = "OpenAIClient"
+    REPLAY_PROVIDER_STRING = "ReplayLLMClient"
 
     @staticmethod
     def llm_client() -> LLMClient:
@@ -33,6 +38,23 @@ class LLMClientFactory:
                 raise LLMException("No default_llm_provider found!")
             elif default_llm_provider == LLMClientFactory.OPENAI_PROVIDER_STRING:
                 return OpenAIClient()
+            elif default_llm_provider == LLMClientFactory.REPLAY_PROVIDER_STRING:
+                return ReplayLLMClient()
+            else:
+                raise LLMException("No default_llm_provider found!")
+        except Exception as error:
+            raise LLMException(str(error))
+
+    @staticmethod
+    def async_llm_client() -> AsyncLLMClient:
+        try:
+            default_llm_provider: str = ConfigUtil.get_str("llm", "default_llm_provider")
+            if default_llm_provider is None:
+                raise LLMException("No default_llm_provider found!")
+            elif default_llm_provider == LLMClientFactory.OPENAI_PROVIDER_STRING:
+                return AsyncOpenAIClient()
+            elif default_llm_provider == LLMClientFactory.REPLAY_PROVIDER_STRING:
+                return AsyncReplayLLMClient()
             else:
                 raise LLMException("No default_llm_provider found!")
         except Exception as error:
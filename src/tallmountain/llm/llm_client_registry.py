@@ -0,0 +1,91 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Callable, Dict
+
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class LLMClientRegistry:
+    """
+    A process-wide, thread-safe registry of provider SDK clients.
+    Every LLM facade in the process shares the same long-lived clients, so the HTTP
+    connection pool and any patched clients are built once and kept warm.
+
+    Async clients hold connections bound to an event loop, so they are kept per loop
+    and dropped along with it.
+    """
+
+    LOGGER = LoggingUtil.instance("<LLMClientRegistry>")
+
+    # connection pool settings for the shared http clients
+    POOL_SIZE: int = ConfigUtil.get_int("llm", "connection_pool_size")
+    KEEPALIVE_EXPIRY: float = ConfigUtil.get_float("llm", "connection_keepalive_expiry")
+
+    # re-entrant, as a builder may fetch another shared client, e.g. instructor wrapping openai
+    _lock = threading.RLock()
+    _clients: Dict[str, Any] = {}
+    _loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = (
+        weakref.WeakKeyDictionary()
+    )
+
+    @staticmethod
+    def get_or_create(key: str, builder: Callable[[], Any]) -> Any:
+        """Returns the shared client for the key, building it on first use."""
+        client = LLMClientRegistry._clients.get(key)
+        if client is not None:
+            return client
+        with LLMClientRegistry._lock:
+            # check again now we hold the lock, another thread may have won
+            client = LLMClientRegistry._clients.get(key)
+            if client is None:
+                LLMClientRegistry.LOGGER.info(f"Creating shared client for {key}")
+                client = builder()
+                LLMClientRegistry._clients[key] = client
+            return client
+
+    @staticmethod
+    def get_or_create_for_loop(key: str, builder: Callable[[], Any]) -> Any:
+        """Returns the shared async client for the key on the running event loop."""
+        loop = asyncio.get_running_loop()
+        with LLMClientRegistry._lock:
+            clients = LLMClientRegistry._loop_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                LLMClientRegistry.LOGGER.info(f"Creating shared async client for {key}")
+                client = builder()
+                clients[key] = client
+            return client
+
+    @staticmethod
+    def contains(key: str) -> bool:
+        return key in LLMClientRegistry._clients
+
+    @staticmethod
+    def clear() -> None:
+        """Closes and forgets all shared clients. Mostly useful for tests."""
+        with LLMClientRegistry._lock:
+            for key, client in LLMClientRegistry._clients.items():
+                close = getattr(client, "close", None)
+                if callable(close):
+                    try:
+                        close()
+                    except Exception as error:
+                        LLMClientRegistry.LOGGER.error(f"Failed to close {key}: {error}")
+            LLMClientRegistry._clients.clear()
+            # async clients can only be closed from their own loop, so just forget them
+            LLMClientRegistry._loop_clients.clear()
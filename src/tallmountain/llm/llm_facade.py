@@ -16,11 +16,17 @@
 #
 #
 
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Dict, Iterator, List, Optional, Type
+
+from lxml import etree  # nosec
+from pydantic import BaseModel
 
 from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.llm_cache import LLMCache
 from src.tallmountain.llm.llm_client import LLMClient, T
 from src.tallmountain.llm.llm_client_factory import LLMClientFactory
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_options import XStructorOptions
 from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
 from src.tallmountain.util.logging_util import LoggingUtil
 
@@ -35,6 +41,7 @@ class LLM:
     def __init__(self) -> None:
         try:
             self._wrapped_llm_client = LLMClientFactory.llm_client()
+            self._cache = LLMCache.instance()
         except Exception as error:
             raise LLMException(str(error))
 
@@ -42,6 +49,21 @@ class LLM:
     def wrapped_llm_client(self) -> LLMClient:
         return self._wrapped_llm_client
 
+    @property
+    def cache(self) -> LLMCache:
+        return self._cache
+
+    def cache_key(
+        self,
+        call_type: str,
+        messages: List[Dict[str, str]],
+        mode: AdaptiveRequestMode,
+        response_spec: Any = None,
+    ) -> str:
+        return LLMCache.make_key(
+            call_type, self.wrapped_llm_client.model, messages, mode, response_spec
+        )
+
     def do_tool(
         self,
         messages: List[Dict[str, str]],
@@ -69,14 +91,24 @@ class LLM:
         xml_example: str,
         xml_schema: str,
         mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+        options: Optional[XStructorOptions] = None,
     ) -> Any:
         try:
+            cache_key = self.cache_key(
+                LLMCache.XSTRUCTOR, messages, mode, {"schema": xml_schema, "example": xml_example}
+            )
+            cached = self.cache.get(LLMCache.XSTRUCTOR, cache_key)
+            if cached is not None:
+                return cached
             completion: Any = self.wrapped_llm_client.do_xstructor(
                 messages=messages,
                 xml_example=xml_example,
                 xml_schema=xml_schema,
                 mode=mode,
+                options=options,
             )
+            if isinstance(completion, str):
+                self.cache.put(LLMCache.XSTRUCTOR, cache_key, completion)
             return completion
         except Exception as error:
             LLM.LOGGER.error(str(error))
@@ -87,6 +119,76 @@ class LLM:
                 # all other errors
                 raise LLMException(str(error))
 
+    def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+        options: Optional[XStructorOptions] = None,
+    ) -> Any:
+        """Like do_xstructor, but returns the validated lxml root element."""
+        try:
+            cache_key = self.cache_key(
+                LLMCache.XSTRUCTOR, messages, mode, {"schema": xml_schema, "example": xml_example}
+            )
+            cached = self.cache.get(LLMCache.XSTRUCTOR, cache_key)
+            if cached is not None:
+                return etree.XML(cached)
+            element: Any = self.wrapped_llm_client.do_xstructor_element(
+                messages=messages,
+                xml_example=xml_example,
+                xml_schema=xml_schema,
+                mode=mode,
+                options=options,
+            )
+            if self.cache.is_enabled(LLMCache.XSTRUCTOR):
+                self.cache.put(
+                    LLMCache.XSTRUCTOR, cache_key, etree.tostring(element, encoding="unicode")
+                )
+            return element
+        except Exception as error:
+            LLM.LOGGER.error(str(error))
+            if self.is_bad_request(error):
+                LLM.LOGGER.error(self.BAD_REQUEST)
+                return LLM.ERROR_FILTERED
+            else:
+                # all other errors
+                raise LLMException(str(error))
+
+    def do_xstructor_stream(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        element_tag: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
+        options: Optional[XStructorOptions] = None,
+    ) -> Iterator[etree._Element]:
+        """
+        Yields each element with the tag as soon as it closes in a streamed XStructor response.
+        A cached full response for the same request is replayed instead, streams are not cached.
+        """
+        try:
+            cache_key = self.cache_key(
+                LLMCache.XSTRUCTOR, messages, mode, {"schema": xml_schema, "example": xml_example}
+            )
+            cached = self.cache.get(LLMCache.XSTRUCTOR, cache_key)
+            if cached is not None:
+                yield from etree.XML(cached).iter(element_tag)
+                return
+            # streaming only needs do_string_stream, so the clients need no xstructor variant
+            xstructor = XStructor(llm_client=self.wrapped_llm_client)
+            yield from xstructor.stream_elements(
+                messages, xml_example, xml_schema, element_tag, mode=mode, options=options
+            )
+        except Exception as error:
+            LLM.LOGGER.error(str(error))
+            if self.is_bad_request(error):
+                LLM.LOGGER.error(self.BAD_REQUEST)
+                raise LLMException(LLM.ERROR_FILTERED)
+            raise LLMException(str(error))
+
     def do_instructor(
         self,
         messages: List[Dict[str, str]],
@@ -94,9 +196,17 @@ class LLM:
         mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
     ) -> Any:
         try:
+            cache_key = self.cache_key(
+                LLMCache.INSTRUCTOR, messages, mode, LLMCache.response_model_spec(response_model)
+            )
+            cached = self.cache.get(LLMCache.INSTRUCTOR, cache_key)
+            if cached is not None:
+                return response_model.model_validate_json(cached)
             completion: Any = self.wrapped_llm_client.do_instructor(
                 messages=messages, response_model=response_model, mode=mode
             )
+            if isinstance(completion, BaseModel):
+                self.cache.put(LLMCache.INSTRUCTOR, cache_key, completion.model_dump_json())
             return completion
         except Exception as error:
             LLM.LOGGER.error(str(error))
@@ -130,7 +240,12 @@ class LLM:
         mode: AdaptiveRequestMode = AdaptiveRequestMode.instance(),
     ) -> str:
         try:
+            cache_key = self.cache_key(LLMCache.STRING, messages, mode)
+            cached = self.cache.get(LLMCache.STRING, cache_key)
+            if cached is not None:
+                return cached
             completion: str = self.wrapped_llm_client.do_string(messages=messages, mode=mode)
+            self.cache.put(LLMCache.STRING, cache_key, completion)
             return completion
         except Exception as error:
             LLM.LOGGER.error(str(error))
@@ -141,7 +256,8 @@ class LLM:
                 # all other errors
                 raise LLMException(str(error))
 
-    def is_bad_request(self, error):
+    @staticmethod
+    def is_bad_request(error):
         return error.args is not None and (
             str(error.args[0]).__contains__("Error code: 400")
             or (str(error.args[0]).__contains__("The response was filtered"))
@@ -0,0 +1,82 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+from collections import Counter
+from typing import Any, Dict, List
+
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class LLMUsageMetrics:
+    """
+    Process-wide token counts from the usage field of provider responses, kept per label.
+    Instructor calls are labelled with their response model name. The cached token counts
+    show how well provider-side prompt caching is working for each kind of call.
+    """
+
+    LOGGER = LoggingUtil.instance("<LLMUsageMetrics>")
+
+    # labels for calls without a response model
+    COMPLETION = "completion"
+    TOOL = "tool"
+
+    # counter names
+    REQUESTS = "requests"
+    PROMPT_TOKENS = "prompt_tokens"
+    CACHED_TOKENS = "cached_tokens"
+    COMPLETION_TOKENS = "completion_tokens"
+
+    _lock = threading.Lock()
+    _counters: Dict[str, Counter] = {}
+
+    @staticmethod
+    def record(label: str, usage: Any) -> None:
+        """Adds an OpenAI style usage object to the counts for the label, ignoring None."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        with LLMUsageMetrics._lock:
+            counter = LLMUsageMetrics._counters.setdefault(label, Counter())
+            counter[LLMUsageMetrics.REQUESTS] += 1
+            counter[LLMUsageMetrics.PROMPT_TOKENS] += usage.prompt_tokens or 0
+            counter[LLMUsageMetrics.CACHED_TOKENS] += cached_tokens
+            counter[LLMUsageMetrics.COMPLETION_TOKENS] += usage.completion_tokens or 0
+        LLMUsageMetrics.LOGGER.debug(
+            f"{label}: {usage.prompt_tokens} prompt tokens, {cached_tokens} cached"
+        )
+
+    @staticmethod
+    def stats(label: str) -> Dict[str, int]:
+        with LLMUsageMetrics._lock:
+            return dict(LLMUsageMetrics._counters.get(label, Counter()))
+
+    @staticmethod
+    def labels() -> List[str]:
+        with LLMUsageMetrics._lock:
+            return sorted(LLMUsageMetrics._counters)
+
+    @staticmethod
+    def cached_token_rate(label: str) -> float:
+        """The fraction of prompt tokens served from the provider's prompt cache."""
+        stats = LLMUsageMetrics.stats(label)
+        prompt_tokens = stats.get(LLMUsageMetrics.PROMPT_TOKENS, 0)
+        if prompt_tokens == 0:
+            return 0.0
+        return stats.get(LLMUsageMetrics.CACHED_TOKENS, 0) / prompt_tokens
+
+    @staticmethod
+    def clear() -> None:
+        with LLMUsageMetrics._lock:
+            LLMUsageMetrics._counters.clear()
@@ -0,0 +1,136 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import re
+from typing import (
+    Iterable,
+    Optional,
+    cast,
+)
+
+from lxml import etree  # nosec
+
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.llm.xml_schema_registry import XMLSchemaRegistry
+from src.tallmountain.llm.xml_stream_validator import XMLStreamValidator
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class XMLRepair:
+    """
+    Repairs invalid XStructor responses. Local fixes are tried first, and only if they fail
+    is the LLM asked to fix the xml in a short follow-up prompt. Local fixes only escape stray
+    markup characters and correct enumerated values, they never drop content, so a response
+    that could only be made valid by removing elements is left to the LLM.
+    """
+
+    LOGGER = LoggingUtil.instance("<XMLRepair>")
+
+    # an & that does not start an entity or character reference
+    STRAY_AMPERSAND = re.compile(r"&(?!(?:[a-zA-Z][a-zA-Z0-9]*|#[0-9]+|#x[0-9a-fA-F]+);)")
+    # a < that cannot start a tag, comment or processing instruction
+    STRAY_LESS_THAN = re.compile(r"<(?![a-zA-Z_/!?])")
+    # the separators an enumerated value may be written with instead of an underscore
+    VALUE_SEPARATORS = re.compile(r"[\s\-]+")
+
+    def __init__(self, xml_schema: str) -> None:
+        self.xml_schema = xml_schema
+
+    def repair_locally(self, xml_string: str) -> Optional[etree._Element]:
+        """Returns a valid root element repaired from the xml, or None if it can't be saved."""
+        root = self.parse_escaped(xml_string)
+        if root is None:
+            return None
+        self.correct_enumerations(root)
+        errors = XMLSchemaRegistry.validate_with_errors(self.xml_schema, root)
+        if errors:
+            self.LOGGER.warning(
+                f"Not repairing the xml locally, it would lose content: {errors[0].message}"
+            )
+            return None
+        return root
+
+    def parse_escaped(self, xml_string: str) -> Optional[etree._Element]:
+        """Escapes stray markup characters and parses the xml, None if it is still malformed."""
+        escaped = self.STRAY_AMPERSAND.sub("&amp;", xml_string)
+        escaped = self.STRAY_LESS_THAN.sub("&lt;", escaped)
+        try:
+            # no recovery, which would silently cut off a truncated response
+            parser = etree.XMLParser(resolve_entities=False, no_network=True)
+            return etree.fromstring(escaped.strip().encode("utf-8"), parser)
+        except etree.XMLSyntaxError as error:
+            self.LOGGER.warning(f"Not repairing the xml locally, it is malformed: {error}")
+            return None
+
+    def correct_enumerations(self, root: etree._Element) -> int:
+        """
+        Corrects enumerated values written in another case or with spaces or hyphens, such as
+        "ethical moral" for ETHICAL_MORAL, returning the number corrected. Values that match no
+        allowed value are left as they are, a guess could change what the response means.
+        """
+        _, enumerations = XMLStreamValidator.rules(self.xml_schema)
+        corrected = 0
+        for element in root.iter():
+            allowed = enumerations.get(element.tag)
+            if allowed is None or (element.text or "") in allowed:
+                continue
+            by_key = {self.value_key(value): value for value in allowed}
+            value = by_key.get(self.value_key(element.text or ""))
+            if value is not None:
+                element.text = value
+                corrected += 1
+        if corrected:
+            self.LOGGER.info(f"Corrected {corrected} enumerated values")
+        return corrected
+
+    @staticmethod
+    def value_key(value: str) -> str:
+        return XMLRepair.VALUE_SEPARATORS.sub("_", value.strip()).upper()
+
+    def schema_errors(self, xml_string: str) -> str:
+        """Returns the lxml parse or schema errors for the xml as text for a repair prompt."""
+        try:
+            root = etree.XML(xml_string)
+        except etree.XMLSyntaxError as error:
+            log_entries = cast(Iterable[etree._LogEntry], error.error_log)
+            return "\n".join(f"line {e.line}: {e.message}" for e in log_entries)
+        errors = XMLSchemaRegistry.validate_with_errors(self.xml_schema, root)
+        return "\n".join(f"line {e.line}: {e.message}" for e in errors)
+
+    def build_repair_messages(self, invalid_xml: str) -> LLMMessages:
+        """A short follow-up prompt with just the invalid xml, its errors and the schema."""
+        prompt = f"""
+        === TASK ===
+
+        - The XML below is not valid for the XML schema.
+        - Fix only the errors listed and keep all other content unchanged.
+        - You must only use values allowed by the XML schema.
+        - Reply with the corrected XML only.
+
+        === START XML SCHEMA ===
+        {self.xml_schema}
+        === END XML SCHEMA ===
+
+        === START INVALID XML ===
+        {invalid_xml}
+        === END INVALID XML ===
+
+        === START ERRORS ===
+        {self.schema_errors(invalid_xml)}
+        === END ERRORS ===
+        """
+        llm_messages = LLMMessages()
+        llm_messages = llm_messages.build(
+            "You are an expert in xml data extraction.", llm_messages.SYSTEM
+        )
+        return llm_messages.build(prompt.strip(), llm_messages.USER)
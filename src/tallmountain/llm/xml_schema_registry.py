@@ -0,0 +1,103 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Set, Tuple, cast
+
+from lxml import etree  # nosec
+
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class XMLSchemaRegistry:
+    """
+    A process-wide registry of compiled XML schemas, keyed by a hash of the schema text.
+    Each distinct schema is compiled once. An lxml XMLSchema keeps its error log on the
+    object, so validation against a shared schema is serialised by a lock per schema.
+    """
+
+    LOGGER = LoggingUtil.instance("<XMLSchemaRegistry>")
+
+    _lock = threading.Lock()
+    # schema text to content hash, so the hot path does a dict lookup rather than a sha256
+    _keys: Dict[str, str] = {}
+    _schemas: Dict[str, Tuple[etree.XMLSchema, threading.Lock]] = {}
+    # (schema hash, example hash) pairs already known to validate
+    _valid_examples: Set[Tuple[str, str]] = set()
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def schema_key(xml_schema: str) -> str:
+        key = XMLSchemaRegistry._keys.get(xml_schema)
+        if key is None:
+            key = XMLSchemaRegistry.content_hash(xml_schema)
+            XMLSchemaRegistry._keys[xml_schema] = key
+        return key
+
+    @staticmethod
+    def get(xml_schema: str) -> Tuple[etree.XMLSchema, threading.Lock]:
+        """Returns the compiled schema and its validation lock, compiling on first use."""
+        key = XMLSchemaRegistry.schema_key(xml_schema)
+        entry = XMLSchemaRegistry._schemas.get(key)
+        if entry is not None:
+            return entry
+        with XMLSchemaRegistry._lock:
+            entry = XMLSchemaRegistry._schemas.get(key)
+            if entry is None:
+                XMLSchemaRegistry.LOGGER.debug(f"Compiling XML schema {key}")
+                entry = (etree.XMLSchema(etree.XML(xml_schema)), threading.Lock())
+                XMLSchemaRegistry._schemas[key] = entry
+            return entry
+
+    @staticmethod
+    def validate(xml_schema: str, doc: etree._Element) -> bool:
+        schema, lock = XMLSchemaRegistry.get(xml_schema)
+        with lock:
+            return schema.validate(doc)
+
+    @staticmethod
+    def validate_with_errors(xml_schema: str, doc: etree._Element) -> List[etree._LogEntry]:
+        """Validates the document, returning a copy of the schema error log."""
+        schema, lock = XMLSchemaRegistry.get(xml_schema)
+        with lock:
+            if schema.validate(doc):
+                return []
+            return list(cast(Iterable[etree._LogEntry], schema.error_log))
+
+    @staticmethod
+    def is_valid_example(xml_schema: str, xml_example: str) -> bool:
+        return (
+            XMLSchemaRegistry.schema_key(xml_schema),
+            XMLSchemaRegistry.content_hash(xml_example),
+        ) in XMLSchemaRegistry._valid_examples
+
+    @staticmethod
+    def add_valid_example(xml_schema: str, xml_example: str) -> None:
+        with XMLSchemaRegistry._lock:
+            XMLSchemaRegistry._valid_examples.add(
+                (
+                    XMLSchemaRegistry.schema_key(xml_schema),
+                    XMLSchemaRegistry.content_hash(xml_example),
+                )
+            )
+
+    @staticmethod
+    def clear() -> None:
+        with XMLSchemaRegistry._lock:
+            XMLSchemaRegistry._keys.clear()
+            XMLSchemaRegistry._schemas.clear()
+            XMLSchemaRegistry._valid_examples.clear()
@@ -0,0 +1,146 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple, cast
+
+from lxml import etree  # nosec
+
+from src.tallmountain.llm.xml_schema_registry import XMLSchemaRegistry
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class XMLStreamValidator:
+    """
+    Checks a streamed XStructor response chunk by chunk with an lxml pull parser, so a
+    generation that clearly can't satisfy the schema can be cut off early. Only violations
+    that no later output can fix are reported: a wrong root element, a value outside an
+    enumeration, or too many of an element. Syntax errors are left to the full validation
+    and local repair once the response is complete.
+    """
+
+    LOGGER = LoggingUtil.instance("<XMLStreamValidator>")
+
+    XS_NAMESPACE = "http://www.w3.org/2001/XMLSchema"
+
+    _lock = threading.Lock()
+    # schema hash to the root element names and the enumerated values by element name
+    _rules: Dict[str, Tuple[Set[str], Dict[str, Set[str]]]] = {}
+
+    def __init__(
+        self,
+        xml_schema: str,
+        max_occurs: Optional[Dict[str, int]] = None,
+        emit_tag: Optional[str] = None,
+    ) -> None:
+        self.roots, self.enumerations = XMLStreamValidator.rules(xml_schema)
+        self.max_occurs = max_occurs or {}
+        # elements with this tag are collected as they close, see take_emitted
+        self.emit_tag = emit_tag
+        self.emitted: List[etree._Element] = []
+        self.counts: Counter = Counter()
+        self.parser = etree.XMLPullParser(
+            events=("start", "end"), resolve_entities=False, no_network=True
+        )
+        self.preamble = ""
+        self.started = False
+        # set on a syntax error, after which the stream is no longer checked
+        self.broken = False
+        # set once the root element has closed
+        self.complete = False
+
+    @staticmethod
+    def rules(xml_schema: str) -> Tuple[Set[str], Dict[str, Set[str]]]:
+        key = XMLSchemaRegistry.schema_key(xml_schema)
+        rules = XMLStreamValidator._rules.get(key)
+        if rules is None:
+            with XMLStreamValidator._lock:
+                rules = XMLStreamValidator._rules.get(key)
+                if rules is None:
+                    rules = XMLStreamValidator.parse_rules(xml_schema)
+                    XMLStreamValidator._rules[key] = rules
+        return rules
+
+    @staticmethod
+    def parse_rules(xml_schema: str) -> Tuple[Set[str], Dict[str, Set[str]]]:
+        """Reads the root element names and the enumerations for each element from the schema."""
+        ns = {"xs": XMLStreamValidator.XS_NAMESPACE}
+        xsd = etree.XML(xml_schema)
+        # attribute value paths always give a list of strings
+        enumerated_types: Dict[str, List[str]] = {
+            simple_type.get("name"): cast(
+                List[str], simple_type.xpath(".//xs:enumeration/@value", namespaces=ns)
+            )
+            for simple_type in xsd.iterfind("xs:simpleType", ns)
+        }
+        roots = {element.get("name") for element in xsd.iterfind("xs:element", ns)}
+        enumerations: Dict[str, Set[str]] = {}
+        for element in xsd.iter(f"{{{XMLStreamValidator.XS_NAMESPACE}}}element"):
+            values = enumerated_types.get(element.get("type"), []) or cast(
+                List[str], element.xpath("xs:simpleType//xs:enumeration/@value", namespaces=ns)
+            )
+            if values:
+                enumerations[element.get("name")] = set(values)
+        return roots, enumerations
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Feeds the next chunk, returning a description of the violation if there is one."""
+        if self.complete or self.broken:
+            return None
+        if not self.started:
+            # skip code block markers and any other text before the xml
+            self.preamble += chunk
+            start = self.preamble.find("<")
+            if start < 0:
+                return None
+            chunk = self.preamble[start:]
+            self.started = True
+        try:
+            self.parser.feed(chunk)
+        except etree.XMLSyntaxError as error:
+            # trailing text after the root is expected, so the events parsed so far still count
+            self.LOGGER.debug(f"Stopped checking the stream after a syntax error: {error}")
+            self.broken = True
+        for event, element in self.parser.read_events():
+            # start and end events, the only ones asked for, always come with an element
+            violation = self.check(event, cast(etree._Element, element))
+            if violation is not None:
+                return violation
+            if self.complete:
+                break
+        return None
+
+    def take_emitted(self) -> List[etree._Element]:
+        """The elements with the emit tag that have closed since the last call."""
+        emitted, self.emitted = self.emitted, []
+        return emitted
+
+    def check(self, event: str, element: etree._Element) -> Optional[str]:
+        is_root = element.getparent() is None
+        if event == "start":
+            if is_root and element.tag not in self.roots:
+                return f"unexpected root element <{element.tag}>"
+            self.counts[element.tag] += 1
+            limit = self.max_occurs.get(element.tag)
+            if limit is not None and self.counts[element.tag] > limit:
+                return f"more than {limit} <{element.tag}> elements"
+            return None
+        allowed = self.enumerations.get(element.tag)
+        if allowed is not None and (element.text or "") not in allowed:
+            return f"<{element.tag}> value {element.text!r} is not allowed"
+        if element.tag == self.emit_tag:
+            self.emitted.append(element)
+        if is_root:
+            self.complete = True
+        return None
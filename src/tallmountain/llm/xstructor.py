@@ -10,13 +10,30 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
+import asyncio
+import concurrent.futures
 import re
-from typing import Any, Dict, List
+from typing import (
+    Any,
+    AsyncGenerator,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    NoReturn,
+    Optional,
+    Tuple,
+)
 
 from lxml import etree  # nosec
 
 from src.tallmountain.exceptions.llm_exception import LLMException
 from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.llm.xml_repair import XMLRepair
+from src.tallmountain.llm.xml_schema_registry import XMLSchemaRegistry
+from src.tallmountain.llm.xml_stream_validator import XMLStreamValidator
+from src.tallmountain.llm.xstructor_metrics import XStructorMetrics
+from src.tallmountain.llm.xstructor_options import XStructorOptions
 from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
 from src.tallmountain.util.logging_util import LoggingUtil
 
@@ -35,48 +52,452 @@ class XStructor:
         xml_example: str,
         xml_schema: str,
         mode: AdaptiveRequestMode = AdaptiveRequestMode.balanced_mode(),
+        options: Optional[XStructorOptions] = None,
     ) -> str:
         """Returns xml structured data from an LLM"""
+        xml_string, _ = self.complete(messages, xml_example, xml_schema, mode, options)
+        return xml_string
 
-        if not self.is_valid_xml(xml_example, xml_schema):
-            error_msg = "Invalid XML supplied for schema!"
-            self.LOGGER.error(error_msg)
-            raise LLMException(error_msg)
+    def do_xstructor_element(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.balanced_mode(),
+        options: Optional[XStructorOptions] = None,
+    ) -> etree._Element:
+        """Returns the validated lxml root element, so callers need not parse the xml again"""
+        _, element = self.complete(messages, xml_example, xml_schema, mode, options)
+        return element
 
-        allowed_attempts = 3
-        attempts = 0
+    async def do_xstructor_completion_async(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.balanced_mode(),
+        options: Optional[XStructorOptions] = None,
+    ) -> str:
+        """Returns xml structured data from an async LLM client"""
+        xml_string, _ = await self.complete_async(messages, xml_example, xml_schema, mode, options)
+        return xml_string
 
-        while attempts < allowed_attempts:
-            self.LOGGER.debug(f"do xstructor_completion starting attempt number {attempts}...")
-            prompt = self.get_completion_prompt(
-                messages=messages, xml_schema=xml_schema, xml_example=xml_example
-            )
-            llm_messages = LLMMessages()
-            llm_messages = llm_messages.build(
-                "You are an expert in xml data extraction.", llm_messages.SYSTEM
+    async def do_xstructor_element_async(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.balanced_mode(),
+        options: Optional[XStructorOptions] = None,
+    ) -> etree._Element:
+        """Async version of do_xstructor_element"""
+        _, element = await self.complete_async(messages, xml_example, xml_schema, mode, options)
+        return element
+
+    def stream_elements(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        element_tag: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.balanced_mode(),
+        options: Optional[XStructorOptions] = None,
+    ) -> Generator[etree._Element, None, None]:
+        """
+        Streams a single response and yields each element with the tag as soon as it closes.
+        The elements are only checked by the stream validator and there are no retries. A
+        stream the validator stops, or that ends before the root element closes, raises an
+        LLMException after the elements already yielded, so callers know some may be missing.
+        """
+        options = options or XStructorOptions()
+        self.check_xml_example(xml_example, xml_schema)
+        llm_messages = self.build_completion_messages(messages, xml_schema, xml_example)
+        validator = XMLStreamValidator(xml_schema, options.max_occurs, element_tag)
+        stream = self.llm_client.do_string_stream(messages=llm_messages.messages, mode=mode)
+        try:
+            for _, chunk in stream:
+                violation = validator.feed(chunk)
+                yield from validator.take_emitted()
+                if violation is not None:
+                    self.stream_stopped(violation, options)
+                if validator.complete:
+                    return
+        finally:
+            stream.close()
+        self.stream_stopped("the response ended before its root element closed", options)
+
+    async def stream_elements_async(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        element_tag: str,
+        mode: AdaptiveRequestMode = AdaptiveRequestMode.balanced_mode(),
+        options: Optional[XStructorOptions] = None,
+    ) -> AsyncGenerator[etree._Element, None]:
+        """Async version of stream_elements"""
+        options = options or XStructorOptions()
+        self.check_xml_example(xml_example, xml_schema)
+        llm_messages = self.build_completion_messages(messages, xml_schema, xml_example)
+        validator = XMLStreamValidator(xml_schema, options.max_occurs, element_tag)
+        stream = self.llm_client.do_string_stream(messages=llm_messages.messages, mode=mode)
+        try:
+            async for _, chunk in stream:
+                violation = validator.feed(chunk)
+                for element in validator.take_emitted():
+                    yield element
+                if violation is not None:
+                    self.stream_stopped(violation, options)
+                if validator.complete:
+                    return
+        finally:
+            await stream.aclose()
+        self.stream_stopped("the response ended before its root element closed", options)
+
+    def stream_stopped(self, reason: str, options: XStructorOptions) -> NoReturn:
+        self.LOGGER.warning(f"Stopping the element stream early: {reason}")
+        XStructorMetrics.record(options.label, XStructorMetrics.STREAM_ABORTS)
+        raise LLMException(f"The element stream was stopped early: {reason}")
+
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Tuple[str, etree._Element]:
+        """Returns the cleaned xml string and its validated root element"""
+
+        options = options or XStructorOptions()
+        self.check_xml_example(xml_example, xml_schema)
+        repair = XMLRepair(xml_schema)
+        invalid_xml: Optional[str] = None
+        sample_number = 0
+
+        for attempt in range(options.max_attempts):
+            self.LOGGER.debug(f"do xstructor_completion starting attempt number {attempt}...")
+            llm_messages, candidates = self.attempt_messages(
+                messages, xml_schema, xml_example, invalid_xml, repair, options
             )
-            llm_messages = llm_messages.build(prompt, llm_messages.USER)
             # use the passed in client to do the completion
-            xml_response: str = self.llm_client.do_string(messages=llm_messages.messages, mode=mode)
-            cleaned_xml_response = self.remove_code_block_markers(xml_response)
-            cleaned_xml_response = self.strip_xml_declaration(cleaned_xml_response)
-            if self.is_valid_xml(xml_string=cleaned_xml_response, xml_schema=xml_schema):
-                return cleaned_xml_response
-            attempts += 1
-
-        error_msg = f"Failed to generate valid XML after {allowed_attempts} attempts!"
+            for xml_response in self.sample(llm_messages, mode, xml_schema, options, candidates):
+                if xml_response is None:
+                    # a stream stopped early, there is nothing worth repairing
+                    sample_number += 1
+                    continue
+                xml_string, element = self.check_response(xml_response, xml_schema, repair, options)
+                if element is not None:
+                    XStructorMetrics.record_valid(options.label, sample_number)
+                    return xml_string, element
+                # keep the latest xml-like response to repair on the next attempt
+                if invalid_xml is None or "<" in xml_string:
+                    invalid_xml = xml_string
+                sample_number += 1
+
+        return self.fail(options)
+
+    async def complete_async(
+        self,
+        messages: List[Dict[str, str]],
+        xml_example: str,
+        xml_schema: str,
+        mode: AdaptiveRequestMode,
+        options: Optional[XStructorOptions] = None,
+    ) -> Tuple[str, etree._Element]:
+        """Async version of complete"""
+
+        options = options or XStructorOptions()
+        self.check_xml_example(xml_example, xml_schema)
+        repair = XMLRepair(xml_schema)
+        invalid_xml: Optional[str] = None
+        sample_number = 0
+
+        for attempt in range(options.max_attempts):
+            self.LOGGER.debug(f"do xstructor_completion_async starting attempt {attempt}...")
+            llm_messages, candidates = self.attempt_messages(
+                messages, xml_schema, xml_example, invalid_xml, repair, options
+            )
+            samples = self.sample_async(llm_messages, mode, xml_schema, options, candidates)
+            try:
+                async for xml_response in samples:
+                    if xml_response is None:
+                        sample_number += 1
+                        continue
+                    xml_string, element = self.check_response(
+                        xml_response, xml_schema, repair, options
+                    )
+                    if element is not None:
+                        XStructorMetrics.record_valid(options.label, sample_number)
+                        return xml_string, element
+                    if invalid_xml is None or "<" in xml_string:
+                        invalid_xml = xml_string
+                    sample_number += 1
+            finally:
+                # cancels any candidates still in flight
+                await samples.aclose()
+
+        return self.fail(options)
+
+    def fail(self, options: XStructorOptions) -> NoReturn:
+        XStructorMetrics.record_failure(options.label)
+        error_msg = f"Failed to generate valid XML after {options.max_attempts} attempts!"
         self.LOGGER.error(error_msg)
         raise LLMException(error_msg)
 
+    def sample(
+        self,
+        llm_messages: LLMMessages,
+        mode: AdaptiveRequestMode,
+        xml_schema: str,
+        options: XStructorOptions,
+        n: int,
+    ) -> Generator[Optional[str], None, None]:
+        """Yields candidate responses as they arrive, or None for a stream stopped early"""
+        if n <= 1:
+            yield self.request_one(llm_messages, mode, xml_schema, options)
+            return
+        if options.candidate_mode == XStructorOptions.N_CANDIDATES:
+            # one request, the prompt is only sent and billed once
+            if options.stream:
+                yield from self.stream_candidates(llm_messages, mode, xml_schema, options, n)
+            else:
+                yield from self.llm_client.do_string_candidates(
+                    messages=llm_messages.messages, mode=mode, n=n
+                )
+            return
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=n)
+        futures = [
+            executor.submit(self.request_one, llm_messages, mode, xml_schema, options)
+            for _ in range(n)
+        ]
+        errors: List[Exception] = []
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    response = future.result()
+                except Exception as error:
+                    errors.append(error)
+                    continue
+                yield response
+            if len(errors) == n:
+                raise errors[0]
+        finally:
+            # a sync request can't be interrupted, but the ones not yet started are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def sample_async(
+        self,
+        llm_messages: LLMMessages,
+        mode: AdaptiveRequestMode,
+        xml_schema: str,
+        options: XStructorOptions,
+        n: int,
+    ) -> AsyncGenerator[Optional[str], None]:
+        """Async version of sample, candidates still in flight are cancelled on close"""
+        if n <= 1:
+            yield await self.request_one_async(llm_messages, mode, xml_schema, options)
+            return
+        if options.candidate_mode == XStructorOptions.N_CANDIDATES:
+            if options.stream:
+                candidates = self.stream_candidates_async(
+                    llm_messages, mode, xml_schema, options, n
+                )
+                try:
+                    async for response in candidates:
+                        yield response
+                finally:
+                    await candidates.aclose()
+            else:
+                for response in await self.llm_client.do_string_candidates(
+                    messages=llm_messages.messages, mode=mode, n=n
+                ):
+                    yield response
+            return
+        tasks = [
+            asyncio.ensure_future(self.request_one_async(llm_messages, mode, xml_schema, options))
+            for _ in range(n)
+        ]
+        errors: List[BaseException] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    response = await next_done
+                except Exception as error:
+                    errors.append(error)
+                    continue
+                yield response
+            if len(errors) == n:
+                raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def request_one(
+        self,
+        llm_messages: LLMMessages,
+        mode: AdaptiveRequestMode,
+        xml_schema: str,
+        options: XStructorOptions,
+    ) -> Optional[str]:
+        """A single response, or None if it was streamed and stopped early"""
+        if not options.stream:
+            response: str = self.llm_client.do_string(messages=llm_messages.messages, mode=mode)
+            return response
+        candidates = self.stream_candidates(llm_messages, mode, xml_schema, options, 1)
+        try:
+            return next(candidates)
+        finally:
+            candidates.close()
+
+    async def request_one_async(
+        self,
+        llm_messages: LLMMessages,
+        mode: AdaptiveRequestMode,
+        xml_schema: str,
+        options: XStructorOptions,
+    ) -> Optional[str]:
+        if not options.stream:
+            response: str = await self.llm_client.do_string(
+                messages=llm_messages.messages, mode=mode
+            )
+            return response
+        candidates = self.stream_candidates_async(llm_messages, mode, xml_schema, options, 1)
+        try:
+            async for response in candidates:
+                return response
+            return None
+        finally:
+            await candidates.aclose()
+
+    def stream_candidates(
+        self,
+        llm_messages: LLMMessages,
+        mode: AdaptiveRequestMode,
+        xml_schema: str,
+        options: XStructorOptions,
+        n: int,
+    ) -> Generator[Optional[str], None, None]:
+        """
+        Streams n choices, checking each as it grows. A choice is yielded as soon as its root
+        element closes, or as None once it clearly can't satisfy the schema. The stream is
+        closed when every choice is settled or the caller stops.
+        """
+        stream = self.llm_client.do_string_stream(messages=llm_messages.messages, mode=mode, n=n)
+        streamed = StreamedCandidates(xml_schema, options, n)
+        try:
+            for index, chunk in stream:
+                settled = streamed.add(index, chunk)
+                if settled is not None:
+                    yield settled[1]
+                    if streamed.all_settled():
+                        return
+            yield from streamed.remaining()
+        finally:
+            stream.close()
+
+    async def stream_candidates_async(
+        self,
+        llm_messages: LLMMessages,
+        mode: AdaptiveRequestMode,
+        xml_schema: str,
+        options: XStructorOptions,
+        n: int,
+    ) -> AsyncGenerator[Optional[str], None]:
+        """Async version of stream_candidates"""
+        stream = self.llm_client.do_string_stream(messages=llm_messages.messages, mode=mode, n=n)
+        streamed = StreamedCandidates(xml_schema, options, n)
+        try:
+            async for index, chunk in stream:
+                settled = streamed.add(index, chunk)
+                if settled is not None:
+                    yield settled[1]
+                    if streamed.all_settled():
+                        return
+            for response in streamed.remaining():
+                yield response
+        finally:
+            await stream.aclose()
+
+    def attempt_messages(
+        self,
+        messages: List[Dict[str, str]],
+        xml_schema: str,
+        xml_example: str,
+        invalid_xml: Optional[str],
+        repair: XMLRepair,
+        options: XStructorOptions,
+    ) -> Tuple[LLMMessages, int]:
+        """
+        The full prompt and the number of candidates to sample for it, or a single short
+        repair prompt if there is xml to fix.
+        """
+        if options.repair_prompt and invalid_xml is not None and "<" in invalid_xml:
+            self.LOGGER.debug("Asking for a repair of the invalid xml")
+            XStructorMetrics.record(options.label, XStructorMetrics.REPAIR_PROMPTS)
+            return repair.build_repair_messages(invalid_xml), 1
+        messages_for_attempt = self.build_completion_messages(messages, xml_schema, xml_example)
+        return messages_for_attempt, options.candidates
+
+    def check_response(
+        self,
+        xml_response: str,
+        xml_schema: str,
+        repair: XMLRepair,
+        options: XStructorOptions,
+    ) -> Tuple[str, Optional[etree._Element]]:
+        """Returns the cleaned xml and its root element, which is None if it can't be made valid"""
+        cleaned_xml_response = self.clean_xml_response(xml_response)
+        element = self.parse_valid_xml(cleaned_xml_response, xml_schema)
+        if element is None and options.local_repair:
+            element = repair.repair_locally(cleaned_xml_response)
+            if element is not None:
+                self.LOGGER.debug("Repaired the xml response locally")
+                XStructorMetrics.record(options.label, XStructorMetrics.LOCAL_REPAIRS)
+                return etree.tostring(element, encoding="unicode"), element
+        return cleaned_xml_response, element
+
+    def check_xml_example(self, xml_example: str, xml_schema: str) -> None:
+        # examples are constants, so each one only needs checking once per process
+        if XMLSchemaRegistry.is_valid_example(xml_schema, xml_example):
+            return
+        if not self.is_valid_xml(xml_example, xml_schema):
+            error_msg = "Invalid XML supplied for schema!"
+            self.LOGGER.error(error_msg)
+            raise LLMException(error_msg)
+        XMLSchemaRegistry.add_valid_example(xml_schema, xml_example)
+
+    def build_completion_messages(
+        self, messages: List[Dict[str, str]], xml_schema: str, xml_example: str
+    ) -> LLMMessages:
+        prompt = self.get_completion_prompt(
+            messages=messages, xml_schema=xml_schema, xml_example=xml_example
+        )
+        llm_messages = LLMMessages()
+        llm_messages = llm_messages.build(
+            "You are an expert in xml data extraction.", llm_messages.SYSTEM
+        )
+        llm_messages = llm_messages.build(prompt, llm_messages.USER)
+        return llm_messages
+
+    def clean_xml_response(self, xml_response: str) -> str:
+        cleaned_xml_response = self.remove_code_block_markers(xml_response)
+        return self.strip_xml_declaration(cleaned_xml_response)
+
     def is_valid_xml(self, xml_string: str, xml_schema: str) -> bool:
+        return self.parse_valid_xml(xml_string, xml_schema) is not None
+
+    def parse_valid_xml(self, xml_string: str, xml_schema: str) -> Optional[etree._Element]:
+        """Parses the xml once, returning the root element if it is valid for the schema"""
         self.LOGGER.debug("Checking if the XML is valid")
         try:
-            schema = etree.XMLSchema(etree.XML(xml_schema))
             doc = etree.XML(xml_string)
-            return schema.validate(doc)
+            if XMLSchemaRegistry.validate(xml_schema, doc):
+                return doc
+            return None
         except Exception as e:
             self.LOGGER.error(f"Exception caught: {e}")
-            return False
+            return None
 
     def get_completion_prompt(
         self, messages: List[Dict[str, str]], xml_schema: str, xml_example: str
@@ -125,3 +546,44 @@ class XStructor:
 
         cleaned_xml_string = re.sub(r"^\s*<\?xml.*?\?>\s*", "", xml_string, flags=re.DOTALL)
         return cleaned_xml_string
+
+
+class StreamedCandidates:
+    """The text and stream validator of each choice in a streamed XStructor request"""
+
+    LOGGER = LoggingUtil.instance("<StreamedCandidates>")
+
+    def __init__(self, xml_schema: str, options: XStructorOptions, n: int) -> None:
+        self.options = options
+        self.chunks: List[List[str]] = [[] for _ in range(n)]
+        self.validators = [XMLStreamValidator(xml_schema, options.max_occurs) for _ in range(n)]
+        self.open = set(range(n))
+
+    def add(self, index: int, chunk: str) -> Optional[Tuple[int, Optional[str]]]:
+        """
+        Adds a chunk to a choice. Returns (index, response) once the choice has a complete
+        root element, (index, None) if it has been stopped, or None while it is still open.
+        """
+        if index not in self.open:
+            return None
+        self.chunks[index].append(chunk)
+        validator = self.validators[index]
+        violation = validator.feed(chunk)
+        if violation is not None:
+            self.LOGGER.info(f"Stopping streamed candidate {index} early: {violation}")
+            XStructorMetrics.record(self.options.label, XStructorMetrics.STREAM_ABORTS)
+            self.open.discard(index)
+            return index, None
+        if validator.complete:
+            self.open.discard(index)
+            return index, "".join(self.chunks[index])
+        return None
+
+    def all_settled(self) -> bool:
+        return not self.open
+
+    def remaining(self) -> Iterator[str]:
+        """The choices still open when the stream ended, left to the full validation"""
+        for index in sorted(self.open):
+            self.open.discard(index)
+            yield "".join(self.chunks[index])
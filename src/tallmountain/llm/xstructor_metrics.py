@@ -0,0 +1,77 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+from collections import Counter
+from typing import Dict
+
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class XStructorMetrics:
+    """
+    Process-wide counters of XStructor outcomes, kept per call site label. Shows how often
+    the first sample is valid and how much work the candidates and repairs are doing.
+    """
+
+    LOGGER = LoggingUtil.instance("<XStructorMetrics>")
+
+    # counter names
+    FIRST_SAMPLE_VALID = "first_sample_valid"
+    LATER_SAMPLE_VALID = "later_sample_valid"
+    LOCAL_REPAIRS = "local_repairs"
+    REPAIR_PROMPTS = "repair_prompts"
+    STREAM_ABORTS = "stream_aborts"
+    FAILURES = "failures"
+
+    _lock = threading.Lock()
+    _counters: Dict[str, Counter] = {}
+
+    @staticmethod
+    def record(label: str, counter: str) -> None:
+        with XStructorMetrics._lock:
+            XStructorMetrics._counters.setdefault(label, Counter())[counter] += 1
+
+    @staticmethod
+    def record_valid(label: str, sample_number: int) -> None:
+        if sample_number == 0:
+            XStructorMetrics.record(label, XStructorMetrics.FIRST_SAMPLE_VALID)
+        else:
+            XStructorMetrics.record(label, XStructorMetrics.LATER_SAMPLE_VALID)
+
+    @staticmethod
+    def record_failure(label: str) -> None:
+        XStructorMetrics.record(label, XStructorMetrics.FAILURES)
+
+    @staticmethod
+    def stats(label: str) -> Dict[str, int]:
+        with XStructorMetrics._lock:
+            return dict(XStructorMetrics._counters.get(label, Counter()))
+
+    @staticmethod
+    def first_sample_valid_rate(label: str) -> float:
+        """The fraction of completions whose very first sample was valid."""
+        stats = XStructorMetrics.stats(label)
+        completions = (
+            stats.get(XStructorMetrics.FIRST_SAMPLE_VALID, 0)
+            + stats.get(XStructorMetrics.LATER_SAMPLE_VALID, 0)
+            + stats.get(XStructorMetrics.FAILURES, 0)
+        )
+        if completions == 0:
+            return 0.0
+        return stats.get(XStructorMetrics.FIRST_SAMPLE_VALID, 0) / completions
+
+    @staticmethod
+    def clear() -> None:
+        with XStructorMetrics._lock:
+            XStructorMetrics._counters.clear()
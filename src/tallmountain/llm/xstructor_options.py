@@ -0,0 +1,53 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from dataclasses import dataclass, field
+from typing import Dict
+
+from src.tallmountain.util.config_util import ConfigUtil
+
+
+@dataclass
+class XStructorOptions:
+    """
+    Per call site settings for XStructor completions. Defaults come from the [xstructor]
+    section of app.ini.
+    """
+
+    # candidate modes
+    N_CANDIDATES = "n"
+    CONCURRENT_CANDIDATES = "concurrent"
+
+    max_attempts: int = field(
+        default_factory=lambda: ConfigUtil.get_int("xstructor", "max_attempts")
+    )
+    # try escaping, closing truncated tags and dropping invalid elements before asking again
+    local_repair: bool = field(
+        default_factory=lambda: ConfigUtil.get_bool("xstructor", "local_repair")
+    )
+    # retry with a short prompt holding only the invalid xml and its errors
+    repair_prompt: bool = field(
+        default_factory=lambda: ConfigUtil.get_bool("xstructor", "repair_prompt")
+    )
+    # samples per full prompt, the first valid one wins
+    candidates: int = field(default_factory=lambda: ConfigUtil.get_int("xstructor", "candidates"))
+    # "n" asks for all the candidates in one request, "concurrent" sends parallel requests
+    candidate_mode: str = field(
+        default_factory=lambda: ConfigUtil.get_str("xstructor", "candidate_mode")
+    )
+    # the call site name the XStructorMetrics are kept under
+    label: str = "default"
+    # stream the response and stop it as soon as it clearly can't satisfy the schema
+    stream: bool = field(default_factory=lambda: ConfigUtil.get_bool("xstructor", "stream"))
+    # upper bounds on element counts, checked while streaming
+    max_occurs: Dict[str, int] = field(default_factory=dict)
@@ -0,0 +1,293 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.llm.llm_facade import LLM
+from src.tallmountain.normative.analysis.np_conflict_analyser import (
+    NormativeConflictAnalyser,
+    NormativeConflictAnalysis,
+)
+from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import NormativeProposition
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class ConflictAnalysisExecutor:
+    """
+    Runs the per proposition conflict analyses concurrently, on a backend chosen in config.
+    Analyses are submitted as their propositions arrive, with at most max_in_flight running
+    at once, and the results come back in proposition order. If anything fails, or the
+    caller has seen enough, the outstanding analyses are cancelled.
+    """
+
+    LOGGER = LoggingUtil.instance("<ConflictAnalysisExecutor>")
+
+    RAY = "ray"
+    THREADS = "threads"
+    PROCESSES = "processes"
+    ASYNCIO = "asyncio"
+
+    BACKEND: str = ConfigUtil.get_str("conflict_analysis_executor", "backend")
+    MAX_IN_FLIGHT: int = ConfigUtil.get_int("conflict_analysis_executor", "max_in_flight")
+
+    _lock = threading.Lock()
+    _instances: Dict[str, "ConflictAnalysisExecutor"] = {}
+
+    def __init__(self, max_in_flight: Optional[int] = None) -> None:
+        self.max_in_flight = max_in_flight or self.MAX_IN_FLIGHT
+
+    @staticmethod
+    def instance(backend: Optional[str] = None) -> "ConflictAnalysisExecutor":
+        """The shared executor for the backend, so its workers stay warm between analyses."""
+        backend = backend or ConflictAnalysisExecutor.BACKEND
+        with ConflictAnalysisExecutor._lock:
+            executor = ConflictAnalysisExecutor._instances.get(backend)
+            if executor is None:
+                executor = ConflictAnalysisExecutor.create(backend)
+                ConflictAnalysisExecutor._instances[backend] = executor
+            return executor
+
+    @staticmethod
+    def create(backend: str, max_in_flight: Optional[int] = None) -> "ConflictAnalysisExecutor":
+        ConflictAnalysisExecutor.LOGGER.info(f"Creating a {backend} conflict analysis executor")
+        if backend == ConflictAnalysisExecutor.RAY:
+            # ray is only imported, and started, when this backend is used
+            from src.tallmountain.normative.analysis.conflict_analysis_pool import (
+                RayConflictAnalysisExecutor,
+            )
+
+            return RayConflictAnalysisExecutor(max_in_flight)
+        elif backend == ConflictAnalysisExecutor.THREADS:
+            return ThreadConflictAnalysisExecutor(max_in_flight)
+        elif backend == ConflictAnalysisExecutor.PROCESSES:
+            return ProcessConflictAnalysisExecutor(max_in_flight)
+        elif backend == ConflictAnalysisExecutor.ASYNCIO:
+            return AsyncioConflictAnalysisExecutor(max_in_flight)
+        else:
+            raise NormativeException(f"Unknown conflict analysis executor: {backend}")
+
+    @staticmethod
+    def shutdown_all() -> None:
+        with ConflictAnalysisExecutor._lock:
+            for executor in ConflictAnalysisExecutor._instances.values():
+                executor.shutdown()
+            ConflictAnalysisExecutor._instances.clear()
+
+    def analyse(
+        self,
+        normative_propositions: Iterable[NormativeProposition],
+        agent: NormativeAgent,
+        stop: Optional[Callable[[List[NormativeConflictAnalysis]], bool]] = None,
+    ) -> List[NormativeConflictAnalysis]:
+        """
+        Analyses the propositions, collecting results as they complete. If stop returns True
+        for the results so far, no more propositions are taken and the outstanding analyses
+        are cancelled, returning just the completed ones.
+        """
+        handles: List[Any] = []
+        results: Dict[int, NormativeConflictAnalysis] = {}
+        try:
+            context = self.start(agent)
+            for np in normative_propositions:
+                while len(self.running(handles)) >= self.max_in_flight:
+                    self.wait(self.running(handles))
+                    if self.collect(handles, results, stop):
+                        return self.stop_early(handles, results)
+                handles.append(self.submit(np, context))
+                if self.collect(handles, results, stop):
+                    return self.stop_early(handles, results)
+            while len(results) < len(handles):
+                self.wait([handle for index, handle in enumerate(handles) if index not in results])
+                if self.collect(handles, results, stop):
+                    return self.stop_early(handles, results)
+            return [results[index] for index in range(len(handles))]
+        except Exception as error:
+            for handle in handles:
+                self.cancel(handle)
+            self.failed(error)
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    def collect(
+        self,
+        handles: List[Any],
+        results: Dict[int, NormativeConflictAnalysis],
+        stop: Optional[Callable[[List[NormativeConflictAnalysis]], bool]],
+    ) -> bool:
+        """Gathers any newly finished results, returning True if it is time to stop."""
+        finished = False
+        for index, handle in enumerate(handles):
+            if index not in results and self.done(handle):
+                results[index] = self.result(handle)
+                finished = True
+        if stop is None or not finished:
+            return False
+        return stop([results[index] for index in sorted(results)])
+
+    def stop_early(
+        self, handles: List[Any], results: Dict[int, NormativeConflictAnalysis]
+    ) -> List[NormativeConflictAnalysis]:
+        cancelled = 0
+        for index, handle in enumerate(handles):
+            if index not in results:
+                self.cancel(handle)
+                cancelled += 1
+        self.LOGGER.info(f"Stopped early after {len(results)} analyses, cancelled {cancelled}")
+        return [results[index] for index in sorted(results)]
+
+    def running(self, handles: List[Any]) -> List[Any]:
+        return [handle for handle in handles if not self.done(handle)]
+
+    def start(self, agent: NormativeAgent) -> Any:
+        """Prepares for analyses against the agent, returning the context to submit them with."""
+        raise NotImplementedError
+
+    def submit(self, norm_prop: NormativeProposition, context: Any) -> Any:
+        """Starts an analysis and returns a handle to it."""
+        raise NotImplementedError
+
+    def done(self, handle: Any) -> bool:
+        raise NotImplementedError
+
+    def wait(self, handles: List[Any]) -> None:
+        """Blocks until at least one of the handles is done."""
+        raise NotImplementedError
+
+    def result(self, handle: Any) -> NormativeConflictAnalysis:
+        raise NotImplementedError
+
+    def cancel(self, handle: Any) -> None:
+        raise NotImplementedError
+
+    def failed(self, error: Exception) -> None:
+        """Called after an analysis fails and the rest have been cancelled."""
+        pass
+
+    def shutdown(self) -> None:
+        raise NotImplementedError
+
+
+class FutureConflictAnalysisExecutor(ConflictAnalysisExecutor):
+    """Shared handling for backends whose handles are concurrent.futures Futures."""
+
+    def start(self, agent: NormativeAgent) -> Tuple[NormativeAgent, str]:
+        # the static prompt context is built once per analysis rather than once per proposition
+        return agent, NormativeConflictAnalyser().static_context(agent)
+
+    def done(self, handle: Future) -> bool:
+        return handle.done()
+
+    def wait(self, handles: List[Future]) -> None:
+        wait_futures(handles, return_when=FIRST_COMPLETED)
+
+    def result(self, handle: Future) -> NormativeConflictAnalysis:
+        analysis: NormativeConflictAnalysis = handle.result()
+        return analysis
+
+    def cancel(self, handle: Future) -> None:
+        handle.cancel()
+
+
+class ThreadConflictAnalysisExecutor(FutureConflictAnalysisExecutor):
+    """Runs the analyses on a thread pool sharing one LLM facade and its connection pool."""
+
+    def __init__(self, max_in_flight: Optional[int] = None) -> None:
+        super().__init__(max_in_flight)
+        self.analyser = NormativeConflictAnalyser(llm=LLM())
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="conflict-analysis"
+        )
+
+    def submit(
+        self, norm_prop: NormativeProposition, context: Tuple[NormativeAgent, str]
+    ) -> Future:
+        agent, static_context = context
+        return self.pool.submit(self.analyser.analyse, norm_prop, agent, static_context)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def analyse_in_worker(
+    norm_prop: NormativeProposition, agent: NormativeAgent
+) -> NormativeConflictAnalysis:
+    """Runs in a ProcessConflictAnalysisExecutor worker, with the worker's own analyser."""
+    global _worker_analyser
+    if _worker_analyser is None:
+        _worker_analyser = NormativeConflictAnalyser(llm=LLM())
+    analysis = _worker_analyser.analyse(norm_prop, agent)
+    # instructor returns its own subclass of the response model, which pickle can't find by name
+    return NormativeConflictAnalysis.model_validate(analysis.model_dump())
+
+
+_worker_analyser: Optional[NormativeConflictAnalyser] = None
+
+
+class ProcessConflictAnalysisExecutor(FutureConflictAnalysisExecutor):
+    """
+    Runs the analyses on a process pool. Each task carries the proposition and the agent,
+    which pickles far smaller than the prompt built from it.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None) -> None:
+        super().__init__(max_in_flight)
+        # spawned rather than forked, as forking would copy the parent's open http connections
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.max_in_flight, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def submit(
+        self, norm_prop: NormativeProposition, context: Tuple[NormativeAgent, str]
+    ) -> Future:
+        agent, _ = context
+        return self.pool.submit(analyse_in_worker, norm_prop, agent)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class AsyncioConflictAnalysisExecutor(FutureConflictAnalysisExecutor):
+    """
+    Runs the analyses as coroutines on an event loop in a background thread, so a single
+    thread and connection pool serve every analysis in flight.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None) -> None:
+        super().__init__(max_in_flight)
+        self.analyser = NormativeConflictAnalyser()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="conflict-analysis-loop", daemon=True
+        )
+        self.thread.start()
+
+    def submit(
+        self, norm_prop: NormativeProposition, context: Tuple[NormativeAgent, str]
+    ) -> Future:
+        agent, static_context = context
+        return asyncio.run_coroutine_threadsafe(
+            self.analyser.analyse_async(norm_prop, agent, static_context), self.loop
+        )
+
+    def shutdown(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
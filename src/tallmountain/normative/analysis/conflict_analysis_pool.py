@@ -0,0 +1,190 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, cast
+
+import ray
+
+from src.tallmountain.llm.llm_facade import LLM
+from src.tallmountain.normative.analysis.conflict_analysis_executor import (
+    ConflictAnalysisExecutor,
+)
+from src.tallmountain.normative.analysis.np_conflict_analyser import (
+    NormativeConflictAnalyser,
+    NormativeConflictAnalysis,
+)
+from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import NormativeProposition
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+@ray.remote
+class ConflictAnalysisActor:
+    """
+    A Ray actor holding a warm agent, LLM facade and static prompt context,
+    so each conflict analysis only ships the proposition.
+    """
+
+    def __init__(self, agent: NormativeAgent) -> None:
+        self.agent = agent
+        self.analyser = NormativeConflictAnalyser(llm=LLM())
+        self.static_context = self.analyser.static_context(agent)
+
+    def analyse(self, norm_prop: NormativeProposition) -> NormativeConflictAnalysis:
+        return self.analyser.analyse(norm_prop, self.agent, self.static_context)
+
+
+class ConflictAnalysisPool:
+    """
+    A long-lived pool of ConflictAnalysisActors. Each analysis goes to the actor with the fewest
+    analyses in flight. There is one pool per process, rebuilt if the agent's endeavours change
+    or Ray is restarted.
+    """
+
+    LOGGER = LoggingUtil.instance("<ConflictAnalysisPool>")
+
+    POOL_SIZE: int = ConfigUtil.get_int("conflict_analysis_pool", "pool_size")
+    # analyses each actor runs at once, they spend nearly all their time waiting on the LLM
+    MAX_CONCURRENCY: int = ConfigUtil.get_int("conflict_analysis_pool", "max_concurrency")
+
+    _lock = threading.Lock()
+    _instance: Optional["ConflictAnalysisPool"] = None
+
+    def __init__(
+        self,
+        agent: NormativeAgent,
+        pool_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        pool_size = pool_size or self.POOL_SIZE
+        max_concurrency = max_concurrency or self.MAX_CONCURRENCY
+        ConflictAnalysisPool.LOGGER.info(f"Starting {pool_size} conflict analysis actors")
+        self.pool_key = ConflictAnalysisPool.context_key(agent)
+        self.ray_session = ConflictAnalysisPool.current_ray_session()
+        # the agent is put in the object store once and shared by every actor
+        agent_ref = ray.put(agent)
+        # the options ray.remote adds to the class aren't visible to type checkers
+        actor_class = cast(Any, ConflictAnalysisActor)
+        # the actors are io bound, so they don't hold a cpu between calls
+        self.actors: List[ray.actor.ActorHandle] = [
+            actor_class.options(num_cpus=0, max_concurrency=max_concurrency).remote(agent_ref)
+            for _ in range(pool_size)
+        ]
+        self._in_flight: Dict[ray.ObjectRef, int] = {}
+        self._submit_lock = threading.Lock()
+
+    @staticmethod
+    def instance(agent: NormativeAgent) -> "ConflictAnalysisPool":
+        """The pool for the agent, starting Ray and the actors on first use."""
+        with ConflictAnalysisPool._lock:
+            if not ray.is_initialized():
+                ray.init(ignore_reinit_error=True)
+            pool = ConflictAnalysisPool._instance
+            if (
+                pool is None
+                or pool.ray_session != ConflictAnalysisPool.current_ray_session()
+                or pool.pool_key != ConflictAnalysisPool.context_key(agent)
+            ):
+                if pool is not None:
+                    pool.shutdown()
+                pool = ConflictAnalysisPool(agent)
+                ConflictAnalysisPool._instance = pool
+            return pool
+
+    @staticmethod
+    def reset() -> None:
+        """Shuts down the shared pool, the next instance call starts a new one."""
+        with ConflictAnalysisPool._lock:
+            if ConflictAnalysisPool._instance is not None:
+                ConflictAnalysisPool._instance.shutdown()
+                ConflictAnalysisPool._instance = None
+
+    @staticmethod
+    def context_key(agent: NormativeAgent) -> str:
+        """Agents with the same endeavours and static prompt context can share a pool."""
+        static_context = NormativeConflictAnalyser().static_context(agent)
+        key = agent.fingerprint + "\0" + static_context
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def current_ray_session() -> Optional[str]:
+        """The local node id, which changes when Ray is restarted while job ids are reused."""
+        if not ray.is_initialized():
+            return None
+        return ray.get_runtime_context().get_node_id()
+
+    def submit(self, norm_prop: NormativeProposition) -> ray.ObjectRef:
+        """Starts an analysis on the least loaded actor."""
+        with self._submit_lock:
+            self.forget_finished()
+            loads = [0] * len(self.actors)
+            for index in self._in_flight.values():
+                loads[index] += 1
+            index = loads.index(min(loads))
+            future: ray.ObjectRef = self.actors[index].analyse.remote(norm_prop)
+            self._in_flight[future] = index
+            return future
+
+    def forget_finished(self) -> None:
+        if len(self._in_flight) == 0:
+            return
+        futures = list(self._in_flight)
+        finished, _ = ray.wait(futures, num_returns=len(futures), timeout=0)
+        for future in finished:
+            del self._in_flight[future]
+
+    def shutdown(self) -> None:
+        ConflictAnalysisPool.LOGGER.info("Shutting down conflict analysis actors")
+        # the actors are already gone if Ray has been restarted
+        if self.ray_session == ConflictAnalysisPool.current_ray_session():
+            for actor in self.actors:
+                ray.kill(actor)
+        self.actors = []
+        self._in_flight = {}
+
+
+class RayConflictAnalysisExecutor(ConflictAnalysisExecutor):
+    """Runs the analyses on the shared ConflictAnalysisPool of warm Ray actors."""
+
+    def start(self, agent: NormativeAgent) -> ConflictAnalysisPool:
+        return ConflictAnalysisPool.instance(agent)
+
+    def submit(
+        self, norm_prop: NormativeProposition, context: ConflictAnalysisPool
+    ) -> ray.ObjectRef:
+        return context.submit(norm_prop)
+
+    def done(self, handle: ray.ObjectRef) -> bool:
+        finished, _ = ray.wait([handle], timeout=0)
+        return len(finished) == 1
+
+    def wait(self, handles: List[ray.ObjectRef]) -> None:
+        ray.wait(handles, num_returns=1)
+
+    def result(self, handle: ray.ObjectRef) -> NormativeConflictAnalysis:
+        analysis: NormativeConflictAnalysis = ray.get(handle)
+        return analysis
+
+    def cancel(self, handle: ray.ObjectRef) -> None:
+        ray.cancel(handle)
+
+    def failed(self, error: Exception) -> None:
+        if isinstance(error, ray.exceptions.RayActorError):
+            # start afresh next time rather than keep sending work to a dead actor
+            ConflictAnalysisPool.reset()
+
+    def shutdown(self) -> None:
+        ConflictAnalysisPool.reset()
@@ -0,0 +1,225 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import dataclasses
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.llm.llm_facade import LLM
+from src.tallmountain.normative.analysis.self_diagnostic import (
+    NormativeDiagnostic,
+    NormativeSelfDiagnostic,
+)
+from src.tallmountain.normative.entities.endeavour import Endeavour
+from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import Level, NormativeProposition
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.file_path_util import FilePathUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class GroupDiagnostic(BaseModel):
+    """The diagnostic result for one endeavour's norms at one level."""
+
+    EndeavourUUID: str = Field(..., description="The uuid of the endeavour.")
+    EndeavourName: str = Field(..., description="The name of the endeavour.")
+    Level: str = Field(..., description="The name of the level of the norms.")
+    Fingerprint: str = Field(..., description="A hash of the group's norms and the prompt.")
+    PassedDiagnostic: Literal["True", "False"] = Field(
+        ..., description="Whether the diagnostic passed or failed."
+    )
+    Analysis: str = Field(..., description="The analysis related to the diagnostic.")
+
+
+class IncrementalSelfDiagnostic:
+    """
+    Checks the consistency of the agent's norms a group at a time, a group being one endeavour's
+    propositions at one level, which is all the "Ranking Same-Level, Same-Endeavour Norms" rules
+    compare. Each group's result is kept in a persisted matrix of endeavours by levels, with a
+    fingerprint of the group's propositions and the prompt, so after an edit only the groups
+    with changed propositions go to the LLM, several at once.
+    """
+
+    LOGGER = LoggingUtil.instance("<IncrementalSelfDiagnostic>")
+
+    # relative to the repo root
+    MATRIX_PATH: str = ConfigUtil.get_str("self_diagnostic", "matrix_path")
+    MAX_WORKERS: int = ConfigUtil.get_int("self_diagnostic", "max_workers")
+
+    def __init__(self, matrix_path: Optional[str] = None, max_workers: Optional[int] = None):
+        self.matrix_path = matrix_path or FilePathUtil.append_path_to_repo_path(self.MATRIX_PATH)
+        self.max_workers = max_workers or self.MAX_WORKERS
+        # the keys of the groups sent to the LLM by the last diagnose
+        self.checked: List[str] = []
+
+    def diagnose(self, agent: Optional[NormativeAgent] = None) -> NormativeDiagnostic:
+        """Checks the groups that have changed since their stored results and combines them all."""
+        agent = agent or NormativeAgent.instance()
+        groups = self.groups(agent)
+        stored = self.load_matrix()
+        matrix: Dict[str, GroupDiagnostic] = {}
+        pending: List[Tuple[str, Endeavour, Level, str]] = []
+        for (uuid, level), group in groups.items():
+            key = self.group_key(uuid, level)
+            fingerprint = self.fingerprint(group)
+            previous = stored.get(key)
+            if previous is not None and previous.Fingerprint == fingerprint:
+                matrix[key] = previous
+            elif len(group.normative_propositions) == 1:
+                matrix[key] = self.result(
+                    group,
+                    level,
+                    fingerprint,
+                    "True",
+                    "A single norm, with none to rank it against.",
+                )
+            else:
+                pending.append((key, group, level, fingerprint))
+        self.LOGGER.info(f"Checking {len(pending)} of {len(groups)} norm groups")
+        self.checked = [key for key, _, _, _ in pending]
+        try:
+            if len(pending) > 0:
+                with ThreadPoolExecutor(
+                    max_workers=min(self.max_workers, len(pending)),
+                    thread_name_prefix="self-diagnostic",
+                ) as pool:
+                    futures = {
+                        pool.submit(self.check, group, level, fingerprint): key
+                        for key, group, level, fingerprint in pending
+                    }
+                    for future in as_completed(futures):
+                        matrix[futures[future]] = future.result()
+        finally:
+            # groups no longer in the endeavours are dropped, finished ones kept on a failure
+            self.save_matrix(matrix)
+        return self.combined(matrix)
+
+    @staticmethod
+    def groups(agent: NormativeAgent) -> Dict[Tuple[str, Level], Endeavour]:
+        """Each endeavour's propositions by level, as an endeavour holding only that level's."""
+        groups: Dict[Tuple[str, Level], Endeavour] = {}
+        for endeavour in agent.endeavours():
+            by_level: Dict[Level, List[NormativeProposition]] = {}
+            for np in endeavour.normative_propositions:
+                by_level.setdefault(np.level, []).append(np)
+            for level, norm_props in by_level.items():
+                groups[(endeavour.uuid, level)] = dataclasses.replace(
+                    endeavour, normative_propositions=norm_props
+                )
+        return groups
+
+    @staticmethod
+    def group_key(endeavour_uuid: str, level: Level) -> str:
+        return f"{endeavour_uuid}:{level.name}"
+
+    @staticmethod
+    def fingerprint(group: Endeavour) -> str:
+        """A hash of the prompt for the group, so of its propositions and the prompt files."""
+        llm_messages = NormativeSelfDiagnostic.build_norms_messages(group.to_markdown())
+        content = json.dumps(llm_messages.messages, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def check(self, group: Endeavour, level: Level, fingerprint: str) -> GroupDiagnostic:
+        self.LOGGER.info(f"Checking the {level.name} norms of {group.name}")
+        try:
+            llm: LLM = LLM()
+            llm_messages = NormativeSelfDiagnostic.build_norms_messages(group.to_markdown())
+            response: NormativeDiagnostic = llm.do_instructor(
+                messages=llm_messages.messages, response_model=NormativeDiagnostic
+            )
+            return self.result(
+                group, level, fingerprint, response.PassedDiagnostic, response.Analysis
+            )
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    @staticmethod
+    def result(
+        group: Endeavour,
+        level: Level,
+        fingerprint: str,
+        passed: Literal["True", "False"],
+        analysis: str,
+    ) -> GroupDiagnostic:
+        return GroupDiagnostic(
+            EndeavourUUID=group.uuid,
+            EndeavourName=group.name,
+            Level=level.name,
+            Fingerprint=fingerprint,
+            PassedDiagnostic=passed,
+            Analysis=analysis,
+        )
+
+    def load_matrix(self) -> Dict[str, GroupDiagnostic]:
+        """The stored group results, empty if there are none or they can't be read."""
+        if not os.path.exists(self.matrix_path):
+            return {}
+        try:
+            with open(self.matrix_path, "r") as file:
+                stored = json.load(file)
+            return {key: GroupDiagnostic.model_validate(value) for key, value in stored.items()}
+        except Exception as error:
+            self.LOGGER.error(f"Failed to read the stored norm group results: {error}")
+            return {}
+
+    def save_matrix(self, matrix: Dict[str, GroupDiagnostic]) -> None:
+        try:
+            NormativeSelfDiagnostic.write_json(
+                self.matrix_path, {key: result.model_dump() for key, result in matrix.items()}
+            )
+        except OSError as error:
+            self.LOGGER.error(f"Failed to store the norm group results: {error}")
+
+    def combined(self, matrix: Dict[str, GroupDiagnostic]) -> NormativeDiagnostic:
+        """Passes if every group passed, with the failing groups' analyses and the matrix."""
+        failed = [result for result in matrix.values() if result.PassedDiagnostic == "False"]
+        if len(failed) == 0:
+            analysis = f"All {len(matrix)} norm groups are internally consistent."
+        else:
+            analysis = "\n".join(
+                f"{result.EndeavourName}, {result.Level}: {result.Analysis}" for result in failed
+            )
+        return NormativeDiagnostic(
+            PassedDiagnostic="False" if len(failed) > 0 else "True",
+            Analysis=f"{analysis}\n\n{self.matrix_to_md(matrix)}",
+        )
+
+    @staticmethod
+    def matrix_to_md(matrix: Dict[str, GroupDiagnostic]) -> str:
+        """The results as a table of endeavours by the levels they have norms at."""
+        levels = [
+            level.name for level in Level if any(r.Level == level.name for r in matrix.values())
+        ]
+        endeavours: Dict[str, str] = {}
+        for result in matrix.values():
+            endeavours.setdefault(result.EndeavourUUID, result.EndeavourName)
+        cells = {(result.EndeavourUUID, result.Level): result for result in matrix.values()}
+        md = "| endeavour | " + " | ".join(levels) + " |\n"
+        md += "|-----------|" + "|".join("-" * (len(level) + 2) for level in levels) + "|\n"
+        for uuid, name in endeavours.items():
+            marks = []
+            for level in levels:
+                result = cells.get((uuid, level))
+                if result is None:
+                    marks.append("")
+                else:
+                    marks.append("pass" if result.PassedDiagnostic == "True" else "FAIL")
+            md += f"| {name} | " + " | ".join(marks) + " |\n"
+        return md
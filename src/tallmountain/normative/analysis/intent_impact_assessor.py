@@ -0,0 +1,95 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from pydantic import BaseModel, Field
+
+from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.llm.async_llm_facade import AsyncLLM
+from src.tallmountain.llm.llm_facade import LLM
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.normative.analysis.impact_assessment import (
+    ImpactAssessment,
+    ImpactAssessmentResult,
+)
+from src.tallmountain.normative.analysis.user_intent import UserIntent, UserIntentAnalysis
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class IntentImpactAnalysis(BaseModel):
+    """A response model for a user intent and impact assessment of the same task."""
+
+    UserIntent: UserIntentAnalysis = Field(..., description="The User Intent Score analysis.")
+    ImpactAssessment: ImpactAssessmentResult = Field(
+        ..., description="The Impact Assessment Score analysis."
+    )
+
+
+class IntentImpactAssessor:
+    """
+    Scores a user task's intent and impact in one request. The task is given once, after the
+    instructions for both scores, and UserIntent and ImpactAssessment return their parts of
+    the result.
+    """
+
+    LOGGER = LoggingUtil.instance("<IntentImpactAssessor>")
+
+    # when False, UserIntent and ImpactAssessment each make their own request
+    FUSED: bool = ConfigUtil.get_bool("intent_impact_assessor", "fused")
+
+    def analyse(self, user_task: str) -> IntentImpactAnalysis:
+        """Scores the intent and impact of the user task"""
+        self.LOGGER.info("Analyzing the task to get a User Intent and Impact Assessment Score...")
+        try:
+            llm: LLM = LLM()
+            llm_messages = self.build_messages(user_task)
+            response: IntentImpactAnalysis = llm.do_instructor(
+                messages=llm_messages.messages, response_model=IntentImpactAnalysis
+            )
+            return response
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    async def analyse_async(self, user_task: str) -> IntentImpactAnalysis:
+        """Async version of analyse"""
+        self.LOGGER.info("Analyzing the task to get a User Intent and Impact Assessment Score...")
+        try:
+            llm: AsyncLLM = AsyncLLM()
+            llm_messages = self.build_messages(user_task)
+            response: IntentImpactAnalysis = await llm.do_instructor(
+                messages=llm_messages.messages, response_model=IntentImpactAnalysis
+            )
+            return response
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    def build_messages(self, user_task: str) -> LLMMessages:
+        llm_messages = LLMMessages()
+        prompt: str = f"""
+        Give the user task at the end two independent scores, each with its own analysis and
+        following its instructions below: a UserIntent and an ImpactAssessment.
+
+        === USER INTENT SCORE ===
+        {UserIntent.instructions()}
+
+        === IMPACT ASSESSMENT SCORE ===
+        {ImpactAssessment.instructions()}
+
+        === USER TASK ===
+        {user_task}
+
+        """
+        llm_messages = llm_messages.build(prompt, llm_messages.USER)
+        return llm_messages
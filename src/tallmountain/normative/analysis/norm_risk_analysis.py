@@ -11,18 +11,20 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from collections import Counter
-from typing import List
-
-import ray
+import asyncio
+from typing import AsyncIterable, Iterable, List, Optional
 
 from src.tallmountain.exceptions.normative_exception import NormativeException
 from src.tallmountain.llm.llm_facade import LLM
 from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.normative.analysis.conflict_analysis_executor import (
+    ConflictAnalysisExecutor,
+)
 from src.tallmountain.normative.analysis.np_conflict_analyser import (
     NormativeConflictAnalyser,
     NormativeConflictAnalysis,
 )
+from src.tallmountain.normative.analysis.risk_scorer import RiskScorer
 from src.tallmountain.normative.entities.endeavour import Endeavour
 from src.tallmountain.normative.normative_agent import NormativeAgent
 from src.tallmountain.normative.normative_proposition import NormativeProposition
@@ -44,16 +46,48 @@ class NormativeRiskAnalysis:
     MAX_HIGH: int = ConfigUtil.get_int("normative_analysis", "number_high_risks_allowed")
     MAX_MODERATE: int = ConfigUtil.get_int("normative_analysis", "number_moderate_risks_allowed")
 
+    # one conflict analysis request per proposition, or one request for them all
+    PER_PROPOSITION = "per_proposition"
+    BATCHED = "batched"
+    CONFLICT_ANALYSIS_MODE: str = ConfigUtil.get_str("normative_analysis", "conflict_analysis_mode")
+
+    # stop analysing once the results so far already mean a rejection
+    EARLY_EXIT: bool = ConfigUtil.get_bool("normative_analysis", "early_exit")
+
     # I am sorry Dave, I am afraid I cannot do that
     REJECTION_MESSAGE: str = ConfigUtil.get_str("normative_analysis", "rejection_message")
 
     # OK Dave, I can do that
     ACCEPTABLE_TO_PROCESS = "The user task is acceptable to process."
 
-    def __init__(self):
+    def __init__(
+        self,
+        conflict_analysis_mode: Optional[str] = None,
+        executor: Optional[ConflictAnalysisExecutor] = None,
+        early_exit: Optional[bool] = None,
+        scorer: Optional[RiskScorer] = None,
+    ):
+        self.conflict_analysis_mode = conflict_analysis_mode or self.CONFLICT_ANALYSIS_MODE
+        self.early_exit = self.EARLY_EXIT if early_exit is None else early_exit
+        # checks, and if configured corrects, the risk arithmetic of the analyses
+        self.scorer = scorer or RiskScorer()
+        # set when the analysis stopped before every proposition had been analysed
+        self.decided_early = False
+        # the configured shared executor is fetched on first use, so nothing starts up here
+        self._executor = executor
+        if self.conflict_analysis_mode not in (self.PER_PROPOSITION, self.BATCHED):
+            raise NormativeException(
+                f"Unknown conflict analysis mode: {self.conflict_analysis_mode}"
+            )
         self._analyses: List[NormativeConflictAnalysis] = []
         self._recommendation: str = ""
 
+    @property
+    def executor(self) -> ConflictAnalysisExecutor:
+        if self._executor is None:
+            self._executor = ConflictAnalysisExecutor.instance()
+        return self._executor
+
     @property
     def analyses(self) -> List[NormativeConflictAnalysis]:
         return self._analyses
@@ -71,50 +105,208 @@ class NormativeRiskAnalysis:
     ) -> List[NormativeConflictAnalysis]:
         """Analyse the risk of a normative proposition."""
         self.LOGGER.info("Analyzing the risk of an endeavour")
+        return self.analyse_stream(endeavour.normative_propositions, agent)
+
+    def analyse_stream(
+        self,
+        normative_propositions: Iterable[NormativeProposition],
+        agent: NormativeAgent = None,
+    ) -> List[NormativeConflictAnalysis]:
+        """
+        Analyse the risk of propositions as they arrive, for example from a streamed extraction.
+        Each conflict analysis is launched as soon as its proposition is available.
+        In batched mode the propositions are collected and analysed together instead.
+        """
+        if self.conflict_analysis_mode == self.BATCHED:
+            return self.analyse_batch(list(normative_propositions), agent)
+
+        try:
+            stop = self.stop_when_decided if self.early_exit else None
+            analyses = self.executor.analyse(normative_propositions, agent, stop)
+            if self.decided_early:
+                # a streamed extraction has nothing more to contribute, so stop generating it
+                close = getattr(normative_propositions, "close", None)
+                if callable(close):
+                    close()
+            # store the analyses
+            self._analyses = self.scored(analyses)
+            return self._analyses
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
 
-        @ray.remote
-        def do_np_conflict_analysis(
-            analyser: NormativeConflictAnalyser,
-            np: NormativeProposition,
-            agent: NormativeAgent,
-        ) -> NormativeConflictAnalysis:
-            return analyser.analyse(np, agent)
+    def analyse_batch(
+        self,
+        normative_propositions: List[NormativeProposition],
+        agent: NormativeAgent = None,
+    ) -> List[NormativeConflictAnalysis]:
+        """Analyse the risk of all the propositions in a single conflict analysis request."""
+        try:
+            analyses = NormativeConflictAnalyser().analyse_batch(normative_propositions, agent)
+            # store the analyses
+            self._analyses = self.scored(analyses)
+            return self._analyses
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    async def analyse_async(
+        self,
+        endeavour: Endeavour,
+        agent: NormativeAgent = None,
+    ) -> List[NormativeConflictAnalysis]:
+        """Analyse the risk of an endeavour, fanning out the conflict analyses on the event loop."""
+        self.LOGGER.info("Analyzing the risk of an endeavour async")
 
         analyser = NormativeConflictAnalyser()
+        tasks: List[asyncio.Task] = []
 
         try:
-            # Create a list of remote tasks
-            futures = [
-                do_np_conflict_analysis.remote(analyser, np, agent)
+            if self.conflict_analysis_mode == self.BATCHED:
+                self._analyses = self.scored(
+                    await analyser.analyse_batch_async(
+                        list(endeavour.normative_propositions), agent
+                    )
+                )
+                return self._analyses
+            semaphore = asyncio.Semaphore(ConflictAnalysisExecutor.MAX_IN_FLIGHT)
+            static_context = analyser.static_context(agent)
+            tasks = [
+                asyncio.create_task(
+                    self.analyse_bounded_async(analyser, np, agent, static_context, semaphore)
+                )
                 for np in endeavour.normative_propositions
             ]
+            # store the analyses
+            self._analyses = self.scored(await self.gather_until_decided(tasks))
+            return self._analyses
+        except Exception as error:
+            for task in tasks:
+                task.cancel()
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    async def analyse_stream_async(
+        self,
+        normative_propositions: AsyncIterable[NormativeProposition],
+        agent: NormativeAgent = None,
+    ) -> List[NormativeConflictAnalysis]:
+        """Async version of analyse_stream, each analysis starts as its proposition arrives."""
+        self.LOGGER.info("Analyzing the risk of streamed propositions async")
 
-            # Collect results
-            analyses = ray.get(futures)
+        analyser = NormativeConflictAnalyser()
+        tasks: List[asyncio.Task] = []
+
+        try:
+            if self.conflict_analysis_mode == self.BATCHED:
+                self._analyses = self.scored(
+                    await analyser.analyse_batch_async(
+                        [np async for np in normative_propositions], agent
+                    )
+                )
+                return self._analyses
+            semaphore = asyncio.Semaphore(ConflictAnalysisExecutor.MAX_IN_FLIGHT)
+            static_context = analyser.static_context(agent)
+            async for np in normative_propositions:
+                tasks.append(
+                    asyncio.create_task(
+                        self.analyse_bounded_async(analyser, np, agent, static_context, semaphore)
+                    )
+                )
+                if self.early_exit and self.is_decided(self.completed(tasks)):
+                    self.decided_early = True
+                    # a streamed extraction has nothing more to contribute, so stop generating it
+                    aclose = getattr(normative_propositions, "aclose", None)
+                    if callable(aclose):
+                        await aclose()
+                    break
             # store the analyses
-            self._analyses = analyses
-            return analyses
+            self._analyses = self.scored(await self.gather_until_decided(tasks))
+            return self._analyses
         except Exception as error:
+            for task in tasks:
+                task.cancel()
             self.LOGGER.error(str(error))
             raise NormativeException(str(error))
 
-    def count_risk_levels(self, analyses: List[NormativeConflictAnalysis]) -> Counter:
-        risk_levels = [analysis.RiskLevel for analysis in analyses]
-        return Counter(risk_levels)
+    async def analyse_bounded_async(
+        self,
+        analyser: NormativeConflictAnalyser,
+        np: NormativeProposition,
+        agent: NormativeAgent,
+        static_context: str,
+        semaphore: asyncio.Semaphore,
+    ) -> NormativeConflictAnalysis:
+        # caps the analyses in flight, as the executors do
+        async with semaphore:
+            return await analyser.analyse_async(np, agent, static_context)
+
+    async def gather_until_decided(
+        self, tasks: List[asyncio.Task]
+    ) -> List[NormativeConflictAnalysis]:
+        """Awaits the analyses as they complete, cancelling the rest once the verdict is decided."""
+        pending = {task for task in tasks if not task.done()}
+        while pending and not (self.early_exit and self.is_decided(self.completed(tasks))):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # raises the first failure
+                task.result()
+        if pending:
+            self.LOGGER.info(f"Verdict decided, cancelling {len(pending)} analyses")
+            for task in pending:
+                task.cancel()
+            self.decided_early = True
+        return self.completed(tasks)
+
+    def completed(self, tasks: List[asyncio.Task]) -> List[NormativeConflictAnalysis]:
+        return [task.result() for task in tasks if task.done() and not task.cancelled()]
+
+    def stop_when_decided(self, analyses: List[NormativeConflictAnalysis]) -> bool:
+        if self.is_decided(analyses):
+            self.decided_early = True
+        return self.decided_early
+
+    def is_decided(self, analyses: List[NormativeConflictAnalysis]) -> bool:
+        """
+        True once further analyses can't change the recommendation. Only a rejection is final,
+        as any other recommendation could still become one.
+        """
+        _, _, high, critical = self.scorer.over_allowed(analyses, self.allowed())
+        return bool(critical or high)
+
+    def allowed(self) -> List[float]:
+        """The number of analyses allowed at each of the scorer's risk levels, Low first."""
+        return [float("inf"), self.MAX_MODERATE, self.MAX_HIGH, self.MAX_CRITICAL]
+
+    def scored(self, analyses: List[NormativeConflictAnalysis]) -> List[NormativeConflictAnalysis]:
+        if self.scorer.correct:
+            return self.scorer.rescore(analyses)
+        return analyses
+
+    def rescore(self, scorer: RiskScorer) -> List[NormativeConflictAnalysis]:
+        """
+        Re-scores the stored analyses with another scorer, for example with new thresholds,
+        without any LLM calls. The recommendation follows the new scores.
+        """
+        self.scorer = scorer
+        self._analyses = scorer.rescore(self._analyses)
+        self._recommendation = ""
+        return self._analyses
 
     def recommend_action(self, analyses: List[NormativeConflictAnalysis]) -> str:
         """Recommend an action based on the analysis."""
         self.LOGGER.info("Recommending an action based on the analysis")
 
-        risk_level_counts: Counter = self.count_risk_levels(analyses)
+        # the thresholds are the numbers allowed, so only going over them counts
+        _, moderate, high, critical = self.scorer.over_allowed(analyses, self.allowed())
 
-        if risk_level_counts["Critical"] >= self.MAX_CRITICAL:
+        if critical:
             self.LOGGER.debug("Critical found - recommending REJECT")
             return self.REJECT
-        elif risk_level_counts["High"] >= self.MAX_HIGH:
+        elif high:
             self.LOGGER.debug("High found - recommending REJECT")
             return self.REJECT
-        elif risk_level_counts["Moderate"] >= self.MAX_MODERATE:
+        elif moderate:
             print("Too many Moderates found")
             self.LOGGER.debug("Too many Moderates found - recommending SUGGEST_MODIFICATION")
             return self.SUGGEST_MODIFICATION
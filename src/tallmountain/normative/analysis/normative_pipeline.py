@@ -0,0 +1,303 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+)
+from concurrent.futures import wait as wait_futures
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.normative.analysis.impact_assessment import (
+    ImpactAssessment,
+    ImpactAssessmentResult,
+)
+from src.tallmountain.normative.analysis.intent_impact_assessor import IntentImpactAssessor
+from src.tallmountain.normative.analysis.norm_risk_analysis import NormativeRiskAnalysis
+from src.tallmountain.normative.analysis.np_extractor import NormPropExtractor
+from src.tallmountain.normative.analysis.user_intent import (
+    UserIntent,
+    UserIntentAnalysis,
+)
+from src.tallmountain.normative.entities.user_task import (
+    TaskResponse,
+    UserTask,
+)
+from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import NormativeProposition
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+@dataclass
+class PipelineStage:
+    """A stage of the pipeline, run with the results of the stages it depends on."""
+
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class StageTiming:
+    """When a stage started and finished, in seconds from the start of the pipeline."""
+
+    name: str
+    started: float
+    finished: float
+
+    @property
+    def elapsed(self) -> float:
+        return self.finished - self.started
+
+
+@dataclass
+class NormativeVerdict:
+    """
+    The consolidated result of a pipeline run. The recommendation is the risk analysis's,
+    escalated when the user intent or impact assessment score crosses its threshold.
+    """
+
+    recommendation: str
+    task: TaskResponse
+    user_intent: UserIntentAnalysis
+    impact_assessment: ImpactAssessmentResult
+    risk_analysis: NormativeRiskAnalysis
+    timings: List[StageTiming]
+    elapsed: float
+
+    def timings_to_md(self) -> str:
+        md = "| stage | started s | finished s | elapsed s |\n"
+        md += "|-------|-----------|------------|-----------|\n"
+        for timing in sorted(self.timings, key=lambda timing: timing.started):
+            md += (
+                f"| {timing.name} | {timing.started:.2f} | {timing.finished:.2f} "
+                f"| {timing.elapsed:.2f} |\n"
+            )
+        md += f"| total | 0.00 | {self.elapsed:.2f} | {self.elapsed:.2f} |\n"
+        return md
+
+
+class NormativePipeline:
+    """
+    Runs the stages of a normative assessment as a DAG, each stage starting as soon as the
+    stages it depends on have finished, so the stages that only need the query run side by
+    side. The conflict analyses start as the propositions stream out of the extraction, and
+    the latency of the whole is that of its longest path rather than the sum of the stages.
+    """
+
+    LOGGER = LoggingUtil.instance("<NormativePipeline>")
+
+    EXTRACTION = "extraction"
+    TASK = "task"
+    USER_INTENT = "user_intent"
+    IMPACT_ASSESSMENT = "impact_assessment"
+    INTENT_IMPACT = "intent_impact"
+    RISK_ANALYSIS = "risk_analysis"
+
+    # an intent score at or below this rejects, an impact score at or above this needs a change
+    HARMFUL_INTENT_SCORE: int = ConfigUtil.get_int("normative_analysis", "harmful_intent_score")
+    SEVERE_IMPACT_SCORE: int = ConfigUtil.get_int("normative_analysis", "severe_impact_score")
+
+    # the recommendations from least to most severe
+    ESCALATION = [
+        NormativeRiskAnalysis.ACCEPT_AND_EXECUTE,
+        NormativeRiskAnalysis.SUGGEST_MODIFICATION,
+        NormativeRiskAnalysis.REJECT,
+    ]
+
+    def __init__(self, agent: Optional[NormativeAgent] = None) -> None:
+        self.agent = agent or NormativeAgent.instance()
+        self.started = time.perf_counter()
+        self.timings: List[StageTiming] = []
+        self._timings_lock = threading.Lock()
+
+    def stages(self, query: str) -> List[PipelineStage]:
+        return [
+            PipelineStage(self.EXTRACTION, lambda results: self.extract(query)),
+            PipelineStage(self.TASK, lambda results: UserTask.get_goal_description(query)),
+            *self.scoring_stages(query),
+            PipelineStage(
+                self.RISK_ANALYSIS,
+                lambda results: self.analyse_risk(results[self.EXTRACTION]),
+                depends_on=[self.EXTRACTION],
+            ),
+        ]
+
+    def scoring_stages(self, query: str) -> List[PipelineStage]:
+        """The intent and impact scores, from one request when fused and two otherwise."""
+        if IntentImpactAssessor.FUSED:
+            return [
+                PipelineStage(
+                    self.INTENT_IMPACT, lambda results: IntentImpactAssessor().analyse(query)
+                ),
+                PipelineStage(
+                    self.USER_INTENT,
+                    lambda results: results[self.INTENT_IMPACT].UserIntent,
+                    depends_on=[self.INTENT_IMPACT],
+                ),
+                PipelineStage(
+                    self.IMPACT_ASSESSMENT,
+                    lambda results: results[self.INTENT_IMPACT].ImpactAssessment,
+                    depends_on=[self.INTENT_IMPACT],
+                ),
+            ]
+        return [
+            PipelineStage(self.USER_INTENT, lambda results: UserIntent().analyse_alone(query)),
+            PipelineStage(
+                self.IMPACT_ASSESSMENT, lambda results: ImpactAssessment().analyse_alone(query)
+            ),
+        ]
+
+    def assess(self, query: str) -> NormativeVerdict:
+        """Runs every stage for the query and consolidates their results into one verdict."""
+        self.LOGGER.info("Running the normative pipeline")
+        results = self.run(self.stages(query))
+        risk_analysis: NormativeRiskAnalysis = results[self.RISK_ANALYSIS]
+        user_intent: UserIntentAnalysis = results[self.USER_INTENT]
+        impact_assessment: ImpactAssessmentResult = results[self.IMPACT_ASSESSMENT]
+        elapsed = time.perf_counter() - self.started
+        self.LOGGER.info(f"Normative pipeline finished in {elapsed:.2f}s")
+        return NormativeVerdict(
+            recommendation=self.recommend(risk_analysis, user_intent, impact_assessment),
+            task=results[self.TASK],
+            user_intent=user_intent,
+            impact_assessment=impact_assessment,
+            risk_analysis=risk_analysis,
+            timings=self.timings,
+            elapsed=elapsed,
+        )
+
+    def recommend(
+        self,
+        risk_analysis: NormativeRiskAnalysis,
+        user_intent: UserIntentAnalysis,
+        impact_assessment: ImpactAssessmentResult,
+    ) -> str:
+        """
+        The risk analysis's recommendation, made more severe when the query's scores say so.
+        A harmful intent rejects, a severe impact needs at least a modification.
+        """
+        recommendations = [risk_analysis.recommendation]
+        if user_intent.UserIntentScore <= self.HARMFUL_INTENT_SCORE:
+            self.LOGGER.debug(f"Harmful user intent score {user_intent.UserIntentScore}")
+            recommendations.append(NormativeRiskAnalysis.REJECT)
+        if impact_assessment.ImpactAssessmentScore >= self.SEVERE_IMPACT_SCORE:
+            self.LOGGER.debug(
+                f"Severe impact assessment score {impact_assessment.ImpactAssessmentScore}"
+            )
+            recommendations.append(NormativeRiskAnalysis.SUGGEST_MODIFICATION)
+        recommendation: str = max(recommendations, key=self.ESCALATION.index)
+        return recommendation
+
+    def run(self, stages: List[PipelineStage]) -> Dict[str, Any]:
+        """
+        Runs the stages on a thread pool, starting each once its dependencies are done.
+        If a stage fails, the stages that haven't started are cancelled and the error raised.
+        """
+        self.check(stages)
+        self.started = time.perf_counter()
+        self.timings = []
+        results: Dict[str, Any] = {}
+        waiting = {stage.name: stage for stage in stages}
+        running: Dict[Future, PipelineStage] = {}
+        with ThreadPoolExecutor(
+            max_workers=len(stages), thread_name_prefix="normative-pipeline"
+        ) as pool:
+            try:
+                while waiting or running:
+                    for name, stage in list(waiting.items()):
+                        if all(dependency in results for dependency in stage.depends_on):
+                            del waiting[name]
+                            running[pool.submit(self.run_stage, stage, dict(results))] = stage
+                    done, _ = wait_futures(list(running), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage = running.pop(future)
+                        results[stage.name] = future.result()
+            except Exception as error:
+                for future in running:
+                    future.cancel()
+                self.LOGGER.error(str(error))
+                raise NormativeException(str(error))
+        return results
+
+    def run_stage(self, stage: PipelineStage, results: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return stage.run(results)
+        finally:
+            self.record(stage.name, started, time.perf_counter())
+
+    def record(self, name: str, started: float, finished: float) -> None:
+        with self._timings_lock:
+            self.timings.append(StageTiming(name, started - self.started, finished - self.started))
+
+    def check(self, stages: List[PipelineStage]) -> None:
+        """Raises if a stage depends on one that isn't in the pipeline, or there is a cycle."""
+        names = {stage.name for stage in stages}
+        for stage in stages:
+            missing = [name for name in stage.depends_on if name not in names]
+            if missing:
+                raise NormativeException(f"Stage {stage.name} depends on unknown {missing}")
+        ordered: List[str] = []
+        remaining = list(stages)
+        while remaining:
+            ready = [s for s in remaining if all(name in ordered for name in s.depends_on)]
+            if not ready:
+                raise NormativeException("The pipeline stages have a dependency cycle")
+            ordered.extend(stage.name for stage in ready)
+            remaining = [stage for stage in remaining if stage not in ready]
+
+    def extract(self, query: str) -> Iterable[NormativeProposition]:
+        """
+        The propositions for the risk analysis. A stream is returned straight away, so the
+        risk analysis starts on the first proposition, and the extraction is timed separately.
+        """
+        extractor = NormPropExtractor()
+        if NormPropExtractor.STREAM_PROPOSITIONS:
+            return self.timed_stream(
+                f"{self.EXTRACTION}_stream",
+                extractor.stream_normative_propositions(query),
+                time.perf_counter(),
+            )
+        return extractor.extract_normative_propositions(query)
+
+    def timed_stream(
+        self, name: str, propositions: Iterator[NormativeProposition], started: float
+    ) -> Iterator[NormativeProposition]:
+        try:
+            yield from propositions
+        finally:
+            # also reached when the risk analysis closes the stream early
+            self.record(name, started, time.perf_counter())
+
+    def analyse_risk(self, propositions: Iterable[NormativeProposition]) -> NormativeRiskAnalysis:
+        risk_analysis = NormativeRiskAnalysis()
+        risk_analysis.analyse_stream(propositions, self.agent)
+        return risk_analysis
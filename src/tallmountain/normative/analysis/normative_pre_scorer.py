@@ -0,0 +1,191 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy
+
+from src.tallmountain.normative.analysis.np_conflict_analyser import NormativeConflictAnalysis
+from src.tallmountain.normative.analysis.risk_scorer import RiskScorer
+from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import (
+    Modality,
+    NormativeProposition,
+    Operator,
+)
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class NormativePreScorer:
+    """
+    A local rule engine for the precedence rules of the normative calculus. It compares the
+    level, operator and modality of the user's propositions against all of the agent's
+    propositions at once, giving a provisional alignment score for each user proposition.
+
+    A user proposition outranks an agent proposition when it is at a higher level, or at the
+    same level with a stronger operator (R > O > I). Two propositions at the same level with
+    the same operator are coordinate. Indifference demands nothing, so it never outranks
+    anything, and by the axiom of futility an impossible proposition is dominated by the
+    requirement not to undertake it.
+
+    The rules never read what a proposition says, so they can't judge it harmless. The one
+    case they settle without the LLM is a proposition the agent holds itself, the same norm
+    with the same operator and modality, at the same or a higher level. Every other
+    proposition goes to the LLM, and the provisional score is only used to escalate, where the
+    rules rank a proposition above more of the agent's norms than the LLM's analysis allows.
+    """
+
+    LOGGER = LoggingUtil.instance("<NormativePreScorer>")
+
+    ENABLED: bool = ConfigUtil.get_bool("normative_pre_scorer", "enabled")
+
+    def __init__(self, agent: NormativeAgent) -> None:
+        self.agent = agent
+        agent_props = agent.propositions()
+        # computed once per agent, as rows to compare against each user proposition
+        self.agent_levels = numpy.array([np.level.value for np in agent_props], dtype=numpy.int64)
+        self.agent_operators = numpy.array(
+            [np.operator.value for np in agent_props], dtype=numpy.int64
+        )
+        self.risk_scorer = RiskScorer()
+        # the highest level the agent holds each of its norms at
+        self.agent_norms: Dict[Tuple[str, Operator, Modality], int] = {}
+        for np in agent_props:
+            key = self.norm_key(np)
+            self.agent_norms[key] = max(self.agent_norms.get(key, np.level.value), np.level.value)
+
+    @staticmethod
+    def norm_key(norm_prop: NormativeProposition) -> Tuple[str, Operator, Modality]:
+        # the same norm whatever its case, spacing or closing full stop
+        value = " ".join(norm_prop.proposition_value.lower().split()).rstrip(".")
+        return value, norm_prop.operator, norm_prop.modality
+
+    def held(self, norm_props: List[NormativeProposition]) -> List[bool]:
+        """True for each user proposition the agent holds at the same or a higher level."""
+        return [
+            self.agent_norms.get(self.norm_key(np), np.level.value - 1) >= np.level.value
+            for np in norm_props
+        ]
+
+    def pre_score(
+        self, norm_props: List[NormativeProposition]
+    ) -> List[Optional[NormativeConflictAnalysis]]:
+        """A settled analysis for each proposition the agent holds, None for those the LLM needs."""
+        analyses: List[Optional[NormativeConflictAnalysis]] = [
+            self.settled_analysis(np) if held else None
+            for np, held in zip(norm_props, self.held(norm_props))
+        ]
+        settled = sum(1 for analysis in analyses if analysis is not None)
+        if settled:
+            self.LOGGER.info(f"Settled {settled} of {len(norm_props)} propositions locally")
+        return analyses
+
+    @staticmethod
+    def settled_analysis(norm_prop: NormativeProposition) -> NormativeConflictAnalysis:
+        # the agent's own norm can't override the agent, so it is aligned and of negligible risk
+        impact, likelihood, alignment, multiplier = 1, 1, 5, 1.0
+        return NormativeConflictAnalysis(
+            UserNormPropValue=norm_prop.proposition_value,
+            Likelihood=likelihood,
+            ImpactScore=impact,
+            NormAlignmentScore=alignment,
+            ContextMultiplier=multiplier,
+            RiskScore=impact * likelihood * multiplier - alignment * RiskScorer.NORM_WEIGHT,
+            RiskLevel="Low",
+            Analysis=(
+                "Settled by the normative calculus precedence rules: the AI Assistant holds "
+                f"this {norm_prop.level.name} norm itself, at the same or a higher level."
+            ),
+        )
+
+    def outranks(self, norm_props: List[NormativeProposition]) -> numpy.ndarray:
+        """A user propositions by agent propositions matrix, True where the user's outranks."""
+        levels, operators, possible = self.columns(norm_props)
+        higher_level = levels > self.agent_levels
+        stronger_operator = (levels == self.agent_levels) & (operators > self.agent_operators)
+        demands = (operators > Operator.INDIFFERENT.value) & possible
+        outranks: numpy.ndarray = (higher_level | stronger_operator) & demands
+        return outranks
+
+    def coordinate(self, norm_props: List[NormativeProposition]) -> numpy.ndarray:
+        """A user propositions by agent propositions matrix, True where they are coordinate."""
+        levels, operators, possible = self.columns(norm_props)
+        demands = (operators > Operator.INDIFFERENT.value) & possible
+        coordinate: numpy.ndarray = (
+            (levels == self.agent_levels) & (operators == self.agent_operators) & demands
+        )
+        return coordinate
+
+    def alignment_scores(self, norm_props: List[NormativeProposition]) -> numpy.ndarray:
+        """
+        The provisional NormAlignmentScore (1 to 5) of each user proposition, lower the more of
+        the agent's propositions it could override. Coordinate ones count half, as a conflict
+        between them forces a choice rather than overriding the agent.
+        """
+        if len(norm_props) == 0 or len(self.agent_levels) == 0:
+            return numpy.full(len(norm_props), 5, dtype=numpy.int64)
+        share = (
+            self.outranks(norm_props).sum(axis=1) + 0.5 * self.coordinate(norm_props).sum(axis=1)
+        ) / len(self.agent_levels)
+        scores: numpy.ndarray = numpy.clip(numpy.rint(5 - 4 * share), 1, 5).astype(numpy.int64)
+        return scores
+
+    def escalated(
+        self,
+        norm_props: List[NormativeProposition],
+        analyses: List[NormativeConflictAnalysis],
+    ) -> List[NormativeConflictAnalysis]:
+        """
+        The LLM's analyses, with the provisional alignment score wherever it is lower than the
+        LLM's and the risk recomputed. A risk score or level is only ever raised, never lowered.
+        """
+        if len(analyses) == 0:
+            return []
+        provisional = self.alignment_scores(norm_props)
+        given = numpy.array([a.NormAlignmentScore for a in analyses], dtype=numpy.int64)
+        escalated = list(analyses)
+        for index in numpy.flatnonzero(provisional < given):
+            analysis = analyses[index].model_copy(
+                update={"NormAlignmentScore": int(provisional[index])}
+            )
+            score = max(float(self.risk_scorer.risk_scores([analysis])[0]), analysis.RiskScore)
+            level = max(
+                int(self.risk_scorer.level_indexes(numpy.array([score]))[0]),
+                RiskScorer.RISK_LEVELS.index(analysis.RiskLevel),
+            )
+            self.LOGGER.info(
+                f"Escalating '{analysis.UserNormPropValue}' from alignment "
+                f"{analyses[index].NormAlignmentScore} {analysis.RiskLevel} to "
+                f"{analysis.NormAlignmentScore} {RiskScorer.RISK_LEVELS[level]}"
+            )
+            escalated[index] = analysis.model_copy(
+                update={"RiskScore": score, "RiskLevel": RiskScorer.RISK_LEVELS[level]}
+            )
+        return escalated
+
+    def columns(
+        self, norm_props: List[NormativeProposition]
+    ) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """The user propositions' levels, operators and possibility as columns, for broadcasting."""
+        levels = numpy.array([[np.level.value] for np in norm_props], dtype=numpy.int64)
+        operators = numpy.array([[np.operator.value] for np in norm_props], dtype=numpy.int64)
+        possible = numpy.array(
+            [[np.modality == Modality.POSSIBLE] for np in norm_props], dtype=bool
+        )
+        return levels, operators, possible
@@ -12,11 +12,23 @@
 # THE SOFTWARE.
 
 
-from typing import Literal
+import asyncio
+from typing import (
+    Any,
+    Dict,
+    List,
+    Literal,
+    Optional,
+)
 
-from pydantic import BaseModel, Field
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+)
 
 from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.llm.async_llm_facade import AsyncLLM
 from src.tallmountain.llm.llm_facade import LLM
 from src.tallmountain.llm.llm_messages import LLMMessages
 from src.tallmountain.normative.normative_agent import NormativeAgent
@@ -25,9 +37,16 @@ from src.tallmountain.util.config_util import ConfigUtil
 from src.tallmountain.util.logging_util import LoggingUtil
 
 
+def without_fingerprint(schema: Dict[str, Any]) -> None:
+    # the fingerprint is set from the agent after the analysis, so not asked of the LLM
+    schema["properties"].pop("EndeavourFingerprint", None)
+
+
 class NormativeConflictAnalysis(BaseModel):
     """A response model for normative conflict analysis."""
 
+    model_config = ConfigDict(json_schema_extra=without_fingerprint)
+
     UserNormPropValue: str = Field(..., description="The user's normative proposition value.")
     Likelihood: int = Field(..., description="The likelihood value as an integer.")
     ImpactScore: int = Field(..., description="The impact score as an integer.")
@@ -39,6 +58,27 @@ class NormativeConflictAnalysis(BaseModel):
         description="The risk level, one of 'Low', 'Moderate', 'High', or 'Critical'.",
     )
     Analysis: str = Field(..., description="The analysis description.")
+    # set from the agent after the analysis, so left out of the schema the LLM fills in
+    EndeavourFingerprint: Optional[str] = Field(
+        default=None,
+        description="The fingerprint of the endeavours the analysis was made against.",
+    )
+
+
+class BatchedConflictAnalysis(NormativeConflictAnalysis):
+    """A conflict analysis returned as part of a batch, tagged with its proposition."""
+
+    PropositionIndex: int = Field(
+        ..., description="The number of the user's normative proposition."
+    )
+
+
+class NormativeConflictBatch(BaseModel):
+    """A response model for the conflict analyses of several propositions in one request."""
+
+    Analyses: List[BatchedConflictAnalysis] = Field(
+        ..., description="One analysis for each of the user's normative propositions."
+    )
 
 
 class NormativeConflictAnalyser:
@@ -48,53 +88,289 @@ class NormativeConflictAnalyser:
 
     LOGGER = LoggingUtil.instance("<NormativeConflictAnalyser>")
 
-    def __init__(self) -> None:
+    def __init__(self, llm: Optional[LLM] = None, pre_score: Optional[bool] = None) -> None:
         self.LOGGER.info("Initializing NormativeConflictAnalyser")
+        # a long-lived analyser can keep one facade, otherwise one is made per analysis
+        self._llm = llm
+        # settle and escalate by the normative calculus precedence rules, defaults to the config
+        self._pre_score = pre_score
+        self._pre_scorer: Any = None
 
     def analyse(
-        self, norm_prop: NormativeProposition, agent: NormativeAgent
+        self,
+        norm_prop: NormativeProposition,
+        agent: NormativeAgent,
+        static_context: Optional[str] = None,
     ) -> NormativeConflictAnalysis:
         self.LOGGER.info("Starting analysis of normative conflict")
         try:
-            llm: LLM = LLM()
-            llm_messages = LLMMessages()
-            llm_messages = llm_messages.build(
-                "You are an expert in ethical analysis.", llm_messages.SYSTEM
-            )
-
-            prompt: str = f"""
-            === INSTRUCTIONS ===
-            - Your task is to see if there is a conflict between the norms of the AI Assistant and the norms that have been
-              given to the AI Assistant by a user. Please provide an analysis of what you find.
-            - You can use the Normative Calculus to provide an analysis of the user's normative proposition by using
-              the AI Assistant's endeavours as an Exogenous Assessment.
-            - You must provide a risk score using the scoring metric provided.
-            - Also provide an analysis of your findings in a markdown table.
-    
-            === BEGIN AI ASSISTANT'S ENDEAVOURS ===
-            {agent.highest_endeavour_to_md()}
-            --------------------------------------
-            {agent.system_endeavours_to_md()}
-            === END AI ASSISTANT'S ENDEAVOURS  ===
-    
-            === BEGIN USER NORM PROP ===
-            {norm_prop.to_markdown()}
-            === END USER NORM PROP ===
-    
-            === BEGIN NORMATIVE CALCULUS ===
-            {ConfigUtil.simplified_nc_prompt()}
-            === END NORMATIVE CALCULUS ===
-    
-            === SCORING METRIC ===
-            {ConfigUtil.norm_comparison_score_prompt()}
-            === SCORING METRIC ===
-            """
-            llm_messages = llm_messages.build(prompt, llm_messages.USER)
+            settled = self.pre_scored([norm_prop], agent)[0]
+            if settled is not None:
+                return self.stamped(settled, agent)
+            llm: LLM = self._llm or LLM()
+            llm_messages = self.build_messages(norm_prop, agent, static_context)
             response: NormativeConflictAnalysis = llm.do_instructor(
                 messages=llm_messages.messages, response_model=NormativeConflictAnalysis
             )
             self.LOGGER.info("Completed analysis of normative conflict")
-            return response
+            return self.stamped(self.escalated([norm_prop], [response], agent)[0], agent)
         except Exception as error:
             self.LOGGER.error(str(error))
             raise NormativeException(str(error))
+
+    async def analyse_async(
+        self,
+        norm_prop: NormativeProposition,
+        agent: NormativeAgent,
+        static_context: Optional[str] = None,
+    ) -> NormativeConflictAnalysis:
+        self.LOGGER.info("Starting async analysis of normative conflict")
+        try:
+            settled = self.pre_scored([norm_prop], agent)[0]
+            if settled is not None:
+                return self.stamped(settled, agent)
+            llm: AsyncLLM = AsyncLLM()
+            llm_messages = self.build_messages(norm_prop, agent, static_context)
+            response: NormativeConflictAnalysis = await llm.do_instructor(
+                messages=llm_messages.messages, response_model=NormativeConflictAnalysis
+            )
+            self.LOGGER.info("Completed async analysis of normative conflict")
+            return self.stamped(self.escalated([norm_prop], [response], agent)[0], agent)
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    def analyse_batch(
+        self, norm_props: List[NormativeProposition], agent: NormativeAgent
+    ) -> List[NormativeConflictAnalysis]:
+        """
+        Analyses all the propositions in one request, sending the shared context only once.
+        Any proposition without a usable analysis in the batch is analysed on its own.
+        """
+        self.LOGGER.info(f"Starting batched analysis of {len(norm_props)} normative conflicts")
+        if len(norm_props) == 0:
+            return []
+        try:
+            analyses = self.pre_scored(norm_props, agent)
+            pending = [index for index, analysis in enumerate(analyses) if analysis is None]
+            if len(pending) > 0:
+                pending_props = [norm_props[index] for index in pending]
+                llm: LLM = LLM()
+                llm_messages = self.build_batch_messages(pending_props, agent)
+                batch: Optional[NormativeConflictBatch] = None
+                try:
+                    batch = llm.do_instructor(
+                        messages=llm_messages.messages, response_model=NormativeConflictBatch
+                    )
+                except Exception as error:
+                    self.LOGGER.info(f"Batched analysis failed, analysing singly: {error}")
+                matched = self.match_batch(pending_props, batch)
+                for index, analysis in enumerate(matched):
+                    if analysis is None:
+                        matched[index] = self.analyse(pending_props[index], agent)
+                # the single analyses are escalated already, escalating again leaves them as they are
+                for index, analysis in zip(pending, self.escalated(pending_props, matched, agent)):
+                    analyses[index] = analysis
+            self.LOGGER.info("Completed batched analysis of normative conflicts")
+            return [self.stamped(analysis, agent) for analysis in analyses]
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    async def analyse_batch_async(
+        self, norm_props: List[NormativeProposition], agent: NormativeAgent
+    ) -> List[NormativeConflictAnalysis]:
+        """Async version of analyse_batch, the single analyses of any misses run concurrently."""
+        self.LOGGER.info(f"Starting async batched analysis of {len(norm_props)} conflicts")
+        if len(norm_props) == 0:
+            return []
+        try:
+            analyses = self.pre_scored(norm_props, agent)
+            pending = [index for index, analysis in enumerate(analyses) if analysis is None]
+            if len(pending) > 0:
+                pending_props = [norm_props[index] for index in pending]
+                llm: AsyncLLM = AsyncLLM()
+                llm_messages = self.build_batch_messages(pending_props, agent)
+                batch: Optional[NormativeConflictBatch] = None
+                try:
+                    batch = await llm.do_instructor(
+                        messages=llm_messages.messages, response_model=NormativeConflictBatch
+                    )
+                except Exception as error:
+                    self.LOGGER.info(f"Batched analysis failed, analysing singly: {error}")
+                matched = self.match_batch(pending_props, batch)
+                missing = [index for index, analysis in enumerate(matched) if analysis is None]
+                singles = await asyncio.gather(
+                    *[self.analyse_async(pending_props[index], agent) for index in missing]
+                )
+                for index, analysis in zip(missing, singles):
+                    matched[index] = analysis
+                # the single analyses are escalated already, escalating again leaves them as they are
+                for index, analysis in zip(pending, self.escalated(pending_props, matched, agent)):
+                    analyses[index] = analysis
+            self.LOGGER.info("Completed async batched analysis of normative conflicts")
+            return [self.stamped(analysis, agent) for analysis in analyses]
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    @staticmethod
+    def stamped(
+        analysis: NormativeConflictAnalysis, agent: NormativeAgent
+    ) -> NormativeConflictAnalysis:
+        """The analysis with the fingerprint of the endeavours it was made against."""
+        if analysis.EndeavourFingerprint == agent.fingerprint:
+            return analysis
+        return analysis.model_copy(update={"EndeavourFingerprint": agent.fingerprint})
+
+    def pre_scored(
+        self, norm_props: List[NormativeProposition], agent: NormativeAgent
+    ) -> List[Optional[NormativeConflictAnalysis]]:
+        """The analyses the local pre-scorer settles, None for those that need the LLM."""
+        pre_scorer = self.pre_scorer(agent)
+        if pre_scorer is None:
+            return [None] * len(norm_props)
+        settled: List[Optional[NormativeConflictAnalysis]] = pre_scorer.pre_score(norm_props)
+        return settled
+
+    def escalated(
+        self,
+        norm_props: List[NormativeProposition],
+        analyses: List[NormativeConflictAnalysis],
+        agent: NormativeAgent,
+    ) -> List[NormativeConflictAnalysis]:
+        """The analyses, escalated where the local pre-scorer ranks a proposition higher."""
+        pre_scorer = self.pre_scorer(agent)
+        if pre_scorer is None:
+            return analyses
+        escalated: List[NormativeConflictAnalysis] = pre_scorer.escalated(norm_props, analyses)
+        return escalated
+
+    def pre_scorer(self, agent: NormativeAgent) -> Any:
+        """The agent's pre-scorer, None if pre-scoring is off."""
+        # imported here as the pre-scorer builds on this module's response model
+        from src.tallmountain.normative.analysis.normative_pre_scorer import NormativePreScorer
+
+        pre_score = NormativePreScorer.ENABLED if self._pre_score is None else self._pre_score
+        if not pre_score:
+            return None
+        # the agent's side is precomputed once for as long as the analyser keeps the same agent
+        if self._pre_scorer is None or self._pre_scorer.agent is not agent:
+            self._pre_scorer = agent.cached(
+                "normative_pre_scorer", lambda: NormativePreScorer(agent)
+            )
+        return self._pre_scorer
+
+    def match_batch(
+        self, norm_props: List[NormativeProposition], batch: Optional[NormativeConflictBatch]
+    ) -> List[Optional[NormativeConflictAnalysis]]:
+        """
+        Lines the batched analyses up with their propositions. A proposition gets None if the
+        batch has no analysis for it, more than one, or one for a different proposition value.
+        """
+        analyses: List[Optional[NormativeConflictAnalysis]] = [None] * len(norm_props)
+        # a filtered request comes back as a marker string rather than a batch
+        if not isinstance(batch, NormativeConflictBatch):
+            return analyses
+        indexes = [item.PropositionIndex for item in batch.Analyses]
+        for item in batch.Analyses:
+            index = item.PropositionIndex
+            if index < 0 or index >= len(norm_props) or indexes.count(index) > 1:
+                continue
+            expected = norm_props[index].proposition_value.strip().lower()
+            if item.UserNormPropValue.strip().lower() != expected:
+                self.LOGGER.info(f"Batched analysis {index} is for a different proposition")
+                continue
+            analyses[index] = NormativeConflictAnalysis.model_validate(
+                item.model_dump(exclude={"PropositionIndex"})
+            )
+        return analyses
+
+    def build_messages(
+        self,
+        norm_prop: NormativeProposition,
+        agent: NormativeAgent,
+        static_context: Optional[str] = None,
+    ) -> LLMMessages:
+        """Builds the prompt, reusing the agent's static context if it has already been made."""
+        llm_messages = LLMMessages()
+        llm_messages = llm_messages.build(
+            "You are an expert in ethical analysis.", llm_messages.SYSTEM
+        )
+        if static_context is None:
+            static_context = self.static_context(agent)
+        # the invariant context goes first so the provider can cache it as a prompt prefix
+        prompt: str = static_context + self.norm_prop_context(norm_prop)
+        llm_messages = llm_messages.build(prompt, llm_messages.USER)
+        return llm_messages
+
+    def build_batch_messages(
+        self, norm_props: List[NormativeProposition], agent: NormativeAgent
+    ) -> LLMMessages:
+        llm_messages = LLMMessages()
+        llm_messages = llm_messages.build(
+            "You are an expert in ethical analysis.", llm_messages.SYSTEM
+        )
+        # same prefix as the single analyses, so the two modes share the provider's prompt cache
+        prompt: str = self.static_context(agent) + self.norm_props_context(norm_props)
+        llm_messages = llm_messages.build(prompt, llm_messages.USER)
+        return llm_messages
+
+    def static_context(self, agent: NormativeAgent) -> str:
+        """The part of the prompt that is the same for every proposition, byte for byte."""
+        static_context: str = agent.cached(
+            "conflict_analysis_static_context", lambda: self.render_static_context(agent)
+        )
+        return static_context
+
+    @staticmethod
+    def render_static_context(agent: NormativeAgent) -> str:
+        return f"""
+        === INSTRUCTIONS ===
+        - Your task is to see if there is a conflict between the norms of the AI Assistant and the norms that have been
+          given to the AI Assistant by a user. Please provide an analysis of what you find.
+        - You can use the Normative Calculus to provide an analysis of the user's normative proposition by using
+          the AI Assistant's endeavours as an Exogenous Assessment.
+        - You must provide a risk score using the scoring metric provided.
+        - Also provide an analysis of your findings in a markdown table.
+        - The user's normative proposition is given at the end.
+
+        === BEGIN AI ASSISTANT'S ENDEAVOURS ===
+        {agent.highest_endeavour_to_md()}
+        --------------------------------------
+        {agent.system_endeavours_to_md()}
+        === END AI ASSISTANT'S ENDEAVOURS  ===
+
+        === BEGIN NORMATIVE CALCULUS ===
+        {ConfigUtil.simplified_nc_prompt()}
+        === END NORMATIVE CALCULUS ===
+
+        === SCORING METRIC ===
+        {ConfigUtil.norm_comparison_score_prompt()}
+        === SCORING METRIC ===
+        """
+
+    def norm_prop_context(self, norm_prop: NormativeProposition) -> str:
+        # the uuid is left out as it differs on every extraction and means nothing to the LLM
+        return f"""
+        === BEGIN USER NORM PROP ===
+        {norm_prop.to_markdown(include_uuid=False)}
+        === END USER NORM PROP ===
+        """
+
+    def norm_props_context(self, norm_props: List[NormativeProposition]) -> str:
+        norm_props_md = "\n".join(
+            f"""
+        --- USER NORM PROP {index} ---
+        {norm_prop.to_markdown(include_uuid=False)}""" for index, norm_prop in enumerate(norm_props)
+        )
+        return f"""
+        === BATCH INSTRUCTIONS ===
+        - There are {len(norm_props)} user normative propositions, numbered from 0.
+        - Analyse each one separately and return exactly one analysis for each, with its number as the
+          PropositionIndex and its proposition value copied unchanged as the UserNormPropValue.
+
+        === BEGIN USER NORM PROPS ===
+        {norm_props_md}
+        === END USER NORM PROPS ===
+        """
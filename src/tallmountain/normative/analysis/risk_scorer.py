@@ -0,0 +1,128 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from typing import List, Optional, Tuple
+
+import numpy
+
+from src.tallmountain.normative.analysis.np_conflict_analyser import NormativeConflictAnalysis
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class RiskScorer:
+    """
+    Recomputes the risk scores and levels of conflict analyses from their components, using the
+    formula and classification in norm_comparison_score.prompt, over many analyses in one array
+    pass. This checks the LLM's arithmetic and lets stored analyses be re-scored without it:
+
+        RiskScore = ImpactScore * Likelihood * ContextMultiplier - NormAlignmentScore * NormWeight
+    """
+
+    LOGGER = LoggingUtil.instance("<RiskScorer>")
+
+    # in order of severity, the index of a level is its position here
+    RISK_LEVELS: List[str] = ["Low", "Moderate", "High", "Critical"]
+
+    NORM_WEIGHT: float = ConfigUtil.get_float("risk_scorer", "norm_weight")
+    # the highest score for the Low, Moderate and High levels, anything above is Critical
+    THRESHOLDS: Tuple[float, float, float] = (
+        ConfigUtil.get_float("risk_scorer", "low_max"),
+        ConfigUtil.get_float("risk_scorer", "moderate_max"),
+        ConfigUtil.get_float("risk_scorer", "high_max"),
+    )
+    # replace the LLM's risk scores and levels with the recomputed ones
+    CORRECT: bool = ConfigUtil.get_bool("risk_scorer", "correct")
+
+    # stored scores within this of the recomputed one are taken as rounding, not a mistake
+    TOLERANCE = 0.5
+
+    def __init__(
+        self,
+        norm_weight: Optional[float] = None,
+        thresholds: Optional[Tuple[float, float, float]] = None,
+        correct: Optional[bool] = None,
+    ) -> None:
+        self.norm_weight = self.NORM_WEIGHT if norm_weight is None else norm_weight
+        self.thresholds = numpy.array(thresholds or self.THRESHOLDS, dtype=numpy.float64)
+        self.correct = self.CORRECT if correct is None else correct
+
+    def risk_scores(self, analyses: List[NormativeConflictAnalysis]) -> numpy.ndarray:
+        """The risk score of each analysis, recomputed from its components."""
+        impact = numpy.array([a.ImpactScore for a in analyses], dtype=numpy.float64)
+        likelihood = numpy.array([a.Likelihood for a in analyses], dtype=numpy.float64)
+        multiplier = numpy.array([a.ContextMultiplier for a in analyses], dtype=numpy.float64)
+        alignment = numpy.array([a.NormAlignmentScore for a in analyses], dtype=numpy.float64)
+        return impact * likelihood * multiplier - alignment * self.norm_weight
+
+    def level_indexes(self, scores: numpy.ndarray) -> numpy.ndarray:
+        """The index in RISK_LEVELS of the level for each score, a threshold is the top of its level."""
+        return numpy.searchsorted(self.thresholds, scores, side="left")
+
+    def stored_level_indexes(self, analyses: List[NormativeConflictAnalysis]) -> numpy.ndarray:
+        return numpy.array(
+            [self.RISK_LEVELS.index(a.RiskLevel) for a in analyses], dtype=numpy.int64
+        )
+
+    def inconsistent(self, analyses: List[NormativeConflictAnalysis]) -> numpy.ndarray:
+        """True for each analysis whose risk score or level doesn't follow from its components."""
+        if len(analyses) == 0:
+            return numpy.zeros(0, dtype=bool)
+        scores = self.risk_scores(analyses)
+        stored_scores = numpy.array([a.RiskScore for a in analyses], dtype=numpy.float64)
+        wrong_score = numpy.abs(stored_scores - scores) > self.TOLERANCE
+        wrong_level = self.stored_level_indexes(analyses) != self.level_indexes(scores)
+        inconsistent: numpy.ndarray = wrong_score | wrong_level
+        return inconsistent
+
+    def rescore(self, analyses: List[NormativeConflictAnalysis]) -> List[NormativeConflictAnalysis]:
+        """
+        The analyses with their risk scores and levels recomputed, logging any that were wrong.
+        Consistent analyses are returned as they are.
+        """
+        if len(analyses) == 0:
+            return []
+        scores = self.risk_scores(analyses)
+        levels = self.level_indexes(scores)
+        inconsistent = self.inconsistent(analyses)
+        rescored = list(analyses)
+        for index in numpy.flatnonzero(inconsistent):
+            analysis = analyses[index]
+            level = self.RISK_LEVELS[levels[index]]
+            self.LOGGER.info(
+                f"Correcting risk of '{analysis.UserNormPropValue}' from {analysis.RiskScore} "
+                f"{analysis.RiskLevel} to {float(scores[index])} {level}"
+            )
+            rescored[index] = analysis.model_copy(
+                update={"RiskScore": float(scores[index]), "RiskLevel": level}
+            )
+        return rescored
+
+    def level_counts(self, analyses: List[NormativeConflictAnalysis]) -> numpy.ndarray:
+        """
+        The number of analyses at each of the RISK_LEVELS, by the recomputed levels if
+        correcting and by the levels the analyses give otherwise.
+        """
+        if len(analyses) == 0:
+            return numpy.zeros(len(self.RISK_LEVELS), dtype=numpy.int64)
+        if self.correct:
+            levels = self.level_indexes(self.risk_scores(analyses))
+        else:
+            levels = self.stored_level_indexes(analyses)
+        return numpy.bincount(levels, minlength=len(self.RISK_LEVELS))
+
+    def over_allowed(
+        self, analyses: List[NormativeConflictAnalysis], allowed: List[float]
+    ) -> numpy.ndarray:
+        """For each of the RISK_LEVELS, True if the analyses have more at it than allowed."""
+        return self.level_counts(analyses) > numpy.array(allowed, dtype=numpy.float64)
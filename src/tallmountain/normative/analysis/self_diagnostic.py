@@ -11,7 +11,13 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from typing import Literal
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -20,6 +26,7 @@ from src.tallmountain.llm.llm_facade import LLM
 from src.tallmountain.llm.llm_messages import LLMMessages
 from src.tallmountain.normative.normative_agent import NormativeAgent
 from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.file_path_util import FilePathUtil
 from src.tallmountain.util.logging_util import LoggingUtil
 
 
@@ -31,12 +38,62 @@ class NormativeDiagnostic(BaseModel):
 
 
 class NormativeSelfDiagnostic:
-    """runs self-diagnostic tests on the consistency of the agent's norms"""
+    """
+    Runs self-diagnostic tests on the consistency of the agent's norms. A result is stored
+    with a fingerprint of the endeavours and the diagnostic prompt, and reused for as long as
+    neither changes, so startup only pays for the LLM call after the norms have been edited.
+    """
 
     LOGGER = LoggingUtil.instance("<NormativeSelfDiagnostic>")
 
-    def __init__(self) -> None:
-        pass
+    # store the result and reuse it while the endeavours and prompt are unchanged
+    PERSIST: bool = ConfigUtil.get_bool("self_diagnostic", "persist")
+    # relative to the repo root
+    RESULT_PATH: str = ConfigUtil.get_str("self_diagnostic", "result_path")
+    # without a stored result, run the diagnostic in the background rather than before startup
+    BACKGROUND: bool = ConfigUtil.get_bool("self_diagnostic", "background")
+    # check the norms a group at a time, only rechecking the groups that have changed
+    INCREMENTAL: bool = ConfigUtil.get_bool("self_diagnostic", "incremental")
+
+    def __init__(self, result_path: Optional[str] = None, persist: Optional[bool] = None) -> None:
+        self.result_path = result_path or FilePathUtil.append_path_to_repo_path(self.RESULT_PATH)
+        self.persist = self.PERSIST if persist is None else persist
+
+    def diagnose(self) -> NormativeDiagnostic:
+        """The stored result for the current endeavours, running the diagnostic if there is none."""
+        agent: NormativeAgent = NormativeAgent.instance()
+        llm_messages = self.build_messages(agent)
+        fingerprint = self.fingerprint(agent, llm_messages)
+        stored = self.stored(fingerprint)
+        if stored is not None:
+            self.LOGGER.info("Reusing the stored normative diagnostic for unchanged norms")
+            return stored
+        if self.INCREMENTAL:
+            # imported here as the incremental diagnostic builds its prompts with this class
+            from src.tallmountain.normative.analysis.incremental_diagnostic import (
+                IncrementalSelfDiagnostic,
+            )
+
+            result = IncrementalSelfDiagnostic().diagnose(agent)
+            self.store(fingerprint, result)
+            return result
+        return self.run_diagnostic_test()
+
+    def diagnose_in_background(self) -> "Future[NormativeDiagnostic]":
+        """
+        Runs diagnose on a daemon thread, so a caller can be ready straight away. A stored
+        result still comes back at once, only a new diagnostic is left running.
+        """
+        future: "Future[NormativeDiagnostic]" = Future()
+
+        def run() -> None:
+            try:
+                future.set_result(self.diagnose())
+            except Exception as error:
+                future.set_exception(error)
+
+        threading.Thread(target=run, name="normative-self-diagnostic", daemon=True).start()
+        return future
 
     def run_diagnostic_test(self) -> NormativeDiagnostic:
         """
@@ -44,42 +101,97 @@ class NormativeSelfDiagnostic:
         """
         self.LOGGER.info("Running normative diagnostic tests")
         try:
-            agent: NormativeAgent = NormativeAgent()
+            agent: NormativeAgent = NormativeAgent.instance()
             llm: LLM = LLM()
-            llm_messages = LLMMessages()
-            llm_messages = llm_messages.build(
-                "You are an expert in ethical analysis.", llm_messages.SYSTEM
-            )
-
-            prompt: str = f"""
-           === INSTRUCTIONS ===
-            - Your task is to understand the Normative Calculus and to apply it as below to see if an AI Assistant's norms
-              are internally consistent.
-            - Please analyse the following input using only the rules from "Ranking Same-Level, Same-Endeavour Norms".
-            - Please note this analysis should only be done on the provided internal norms of this endeavour without taking
-              into account broader normative considerations. Your task here is to make sure that the norms are internally
-              consistent according to the rules of the Normative Calculus.
-            - Please only consider the norms provided and do not edit or adjust using external norms. You can note any of
-              these types of concerns in the analysis section.
-            - You should also not consider the practical applications of these requirements or their feasibility in specific
-              scenarios. This is a purely theoretical exercise. If the norms are consistent but impractical, this is not a fail.
-            - Please provide a pass/fail mark and a brief analysis of your reasoning.
-    
-            === BEGIN INPUT ===
-            {agent.highest_endeavour_to_md()}
-            ----
-            {agent.system_endeavours_to_md()}
-            === END INPUT ===
-    
-            === BEGIN NORMATIVE CALCULUS ===
-            {ConfigUtil.norm_comparison_score_prompt()}
-            === END NORMATIVE CALCULUS ===
-            """
-            llm_messages = llm_messages.build(prompt, llm_messages.USER)
+            llm_messages = self.build_messages(agent)
             response: NormativeDiagnostic = llm.do_instructor(
                 messages=llm_messages.messages, response_model=NormativeDiagnostic
             )
+            self.store(self.fingerprint(agent, llm_messages), response)
             return response
         except Exception as error:
             self.LOGGER.error(str(error))
             raise NormativeException(str(error))
+
+    def build_messages(self, agent: NormativeAgent) -> LLMMessages:
+        return self.build_norms_messages(f"""{agent.highest_endeavour_to_md()}
+        ----
+        {agent.system_endeavours_to_md()}""")
+
+    @staticmethod
+    def build_norms_messages(norms_md: str) -> LLMMessages:
+        """The diagnostic prompt for the norms in the markdown, all of them or a group."""
+        llm_messages = LLMMessages()
+        llm_messages = llm_messages.build(
+            "You are an expert in ethical analysis.", llm_messages.SYSTEM
+        )
+
+        prompt: str = f"""
+           === INSTRUCTIONS ===
+        - Your task is to understand the Normative Calculus and to apply it as below to see if an AI Assistant's norms
+          are internally consistent.
+        - Please analyse the following input using only the rules from "Ranking Same-Level, Same-Endeavour Norms".
+        - Please note this analysis should only be done on the provided internal norms of this endeavour without taking
+          into account broader normative considerations. Your task here is to make sure that the norms are internally
+          consistent according to the rules of the Normative Calculus.
+        - Please only consider the norms provided and do not edit or adjust using external norms. You can note any of
+          these types of concerns in the analysis section.
+        - You should also not consider the practical applications of these requirements or their feasibility in specific
+          scenarios. This is a purely theoretical exercise. If the norms are consistent but impractical, this is not a fail.
+        - Please provide a pass/fail mark and a brief analysis of your reasoning.
+    
+        === BEGIN INPUT ===
+        {norms_md}
+        === END INPUT ===
+    
+        === BEGIN NORMATIVE CALCULUS ===
+        {ConfigUtil.norm_comparison_score_prompt()}
+        === END NORMATIVE CALCULUS ===
+        """
+        llm_messages = llm_messages.build(prompt, llm_messages.USER)
+        return llm_messages
+
+    @staticmethod
+    def fingerprint(agent: NormativeAgent, llm_messages: LLMMessages) -> str:
+        """
+        A hash of the endeavour json, by way of the agent's fingerprint, and of the prompt, which
+        includes the normative calculus prompt file.
+        """
+        content = agent.fingerprint + "\0" + json.dumps(llm_messages.messages, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def stored(self, fingerprint: str) -> Optional[NormativeDiagnostic]:
+        """The stored result if it was made with the same fingerprint, None otherwise."""
+        if not self.persist or not os.path.exists(self.result_path):
+            return None
+        try:
+            with open(self.result_path, "r") as file:
+                stored = json.load(file)
+            if stored.get("fingerprint") != fingerprint:
+                return None
+            return NormativeDiagnostic.model_validate(stored["result"])
+        except Exception as error:
+            # an unreadable result is only a miss
+            self.LOGGER.error(f"Failed to read the stored normative diagnostic: {error}")
+            return None
+
+    def store(self, fingerprint: str, result: NormativeDiagnostic) -> None:
+        if not self.persist:
+            return
+        try:
+            self.write_json(
+                self.result_path,
+                {"fingerprint": fingerprint, "created": time.time(), "result": result.model_dump()},
+            )
+        except OSError as error:
+            # the result is still returned, it is only not reused
+            self.LOGGER.error(f"Failed to store the normative diagnostic: {error}")
+
+    @staticmethod
+    def write_json(path: str, data: Any) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # written aside and moved into place, so a reader never sees half a file
+        partial_path = f"{path}.{os.getpid()}.partial"
+        with open(partial_path, "w") as file:
+            json.dump(data, file, indent=2)
+        os.replace(partial_path, path)
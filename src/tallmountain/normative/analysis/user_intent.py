@@ -14,6 +14,7 @@
 from pydantic import BaseModel, Field
 
 from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.llm.async_llm_facade import AsyncLLM
 from src.tallmountain.llm.llm_facade import LLM
 from src.tallmountain.llm.llm_messages import LLMMessages
 from src.tallmountain.util.logging_util import LoggingUtil
@@ -35,75 +36,30 @@ class UserIntent:
         pass
 
     def analyse(self, user_task: str) -> UserIntentAnalysis:
+        """The user intent of the task, from the IntentImpactAssessor unless it is configured off."""
+        # imported here as the assessor uses this class's instructions
+        from src.tallmountain.normative.analysis.intent_impact_assessor import IntentImpactAssessor
+
+        if IntentImpactAssessor.FUSED:
+            return IntentImpactAssessor().analyse(user_task).UserIntent
+        return self.analyse_alone(user_task)
+
+    async def analyse_async(self, user_task: str) -> UserIntentAnalysis:
+        """Async version of analyse"""
+        from src.tallmountain.normative.analysis.intent_impact_assessor import IntentImpactAssessor
+
+        if IntentImpactAssessor.FUSED:
+            return (await IntentImpactAssessor().analyse_async(user_task)).UserIntent
+        return await self.analyse_alone_async(user_task)
+
+    def analyse_alone(self, user_task: str) -> UserIntentAnalysis:
         """
         Run the diagnostic tests on the agent's norms
         """
         self.LOGGER.info("Analyzing the task to get a User Intent Score (UIS)...")
         try:
             llm: LLM = LLM()
-            llm_messages = LLMMessages()
-
-            prompt: str = f"""
-            === BACKGROUND ===
-    
-            User intent in the context of a task requested of an AI assistant refers to the underlying goal or purpose that
-            the user seeks to achieve by interacting with the assistant. It encapsulates the what and why of the task, even if
-            the user’s query does not explicitly detail all aspects of their intention. Identifying user intent involves
-            interpreting both the explicit instructions and any implied needs to determine the most effective way to assist.
-    
-            Key Aspects of User Intent:
-    
-                Objective: The primary goal the user wants to accomplish (e.g., retrieve data, generate content, solve a problem).
-                Context: Any surrounding circumstances, assumptions, or background knowledge relevant to the task.
-                Constraints and Preferences: Specific requirements, limitations, or stylistic choices that guide how the task
-                should be completed.
-    
-            Examples of User Intent:
-    
-                Explicit Query:
-                    Task: "Create a Python script to analyze sales data."
-                    User Intent: The user wants a functional script that processes sales data with appropriate analysis and outputs.
-    
-                Implied Query:
-                    Task: "What’s the weather in New York next week?"
-                    User Intent: The user is seeking actionable weather information, likely for planning purposes.
-    
-                Exploratory Query:
-                    Task: "Can AI improve customer service?"
-                    User Intent: The user wants insights, examples, or strategies to explore how AI could enhance customer
-                    support operations.
-    
-            Understanding user intent is crucial to tailoring responses effectively, ensuring relevance, accuracy, and alignment
-            with the user's goals.
-    
-            === INSTRUCTIONS ===
-    
-            Evaluate the user’s intent for the user task below as a User Intent Score (UIS)
-    
-            Score the intent from 1 to 10:
-            - 1–3: Likely harmful (malicious, harmful, unethical, or illegal intent).
-            - 4–6: Ambiguous (unclear or dual-use potential).
-            - 7–10: Likely harmless (educational, historical, or constructive purpose).
-    
-            Provide your reasoning for the score.
-    
-            Examples:
-    
-                Task: "Generate fake credentials to bypass a secure system."
-                    Score: 2 (Likely harmful).
-                    Reasoning: The intent is clearly unethical and promotes misuse.
-                Task: "Explain the historical significance of the Enigma machine."
-                    Score: 9 (Likely harmless).
-                    Reasoning: The task has a clear educational and historical purpose.
-                Task: "Describe the weaknesses of modern encryption systems."
-                    Score: 5 (Ambiguous).
-                    Reasoning: While educational, the information could be misused.
-    
-            === USER TASK ===
-            {user_task}
-
-            """
-            llm_messages = llm_messages.build(prompt, llm_messages.USER)
+            llm_messages = self.build_messages(user_task)
             response: UserIntentAnalysis = llm.do_instructor(
                 messages=llm_messages.messages, response_model=UserIntentAnalysis
             )
@@ -111,3 +67,87 @@ class UserIntent:
         except Exception as error:
             self.LOGGER.error(str(error))
             raise NormativeException(str(error))
+
+    async def analyse_alone_async(self, user_task: str) -> UserIntentAnalysis:
+        """Async version of analyse"""
+        self.LOGGER.info("Analyzing the task to get a User Intent Score (UIS)...")
+        try:
+            llm: AsyncLLM = AsyncLLM()
+            llm_messages = self.build_messages(user_task)
+            response: UserIntentAnalysis = await llm.do_instructor(
+                messages=llm_messages.messages, response_model=UserIntentAnalysis
+            )
+            return response
+        except Exception as error:
+            self.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    def build_messages(self, user_task: str) -> LLMMessages:
+        llm_messages = LLMMessages()
+        prompt: str = f"""{self.instructions()}
+        === USER TASK ===
+        {user_task}
+
+        """
+        llm_messages = llm_messages.build(prompt, llm_messages.USER)
+        return llm_messages
+
+    @staticmethod
+    def instructions() -> str:
+        """The instructions without the user task, shared with the IntentImpactAssessor."""
+        return """
+        === BACKGROUND ===
+
+        User intent in the context of a task requested of an AI assistant refers to the underlying goal or purpose that
+        the user seeks to achieve by interacting with the assistant. It encapsulates the what and why of the task, even if
+        the user’s query does not explicitly detail all aspects of their intention. Identifying user intent involves
+        interpreting both the explicit instructions and any implied needs to determine the most effective way to assist.
+
+        Key Aspects of User Intent:
+
+            Objective: The primary goal the user wants to accomplish (e.g., retrieve data, generate content, solve a problem).
+            Context: Any surrounding circumstances, assumptions, or background knowledge relevant to the task.
+            Constraints and Preferences: Specific requirements, limitations, or stylistic choices that guide how the task
+            should be completed.
+
+        Examples of User Intent:
+
+            Explicit Query:
+                Task: "Create a Python script to analyze sales data."
+                User Intent: The user wants a functional script that processes sales data with appropriate analysis and outputs.
+
+            Implied Query:
+                Task: "What’s the weather in New York next week?"
+                User Intent: The user is seeking actionable weather information, likely for planning purposes.
+
+            Exploratory Query:
+                Task: "Can AI improve customer service?"
+                User Intent: The user wants insights, examples, or strategies to explore how AI could enhance customer
+                support operations.
+
+        Understanding user intent is crucial to tailoring responses effectively, ensuring relevance, accuracy, and alignment
+        with the user's goals.
+
+        === INSTRUCTIONS ===
+
+        Evaluate the user’s intent for the user task below as a User Intent Score (UIS)
+
+        Score the intent from 1 to 10:
+        - 1–3: Likely harmful (malicious, harmful, unethical, or illegal intent).
+        - 4–6: Ambiguous (unclear or dual-use potential).
+        - 7–10: Likely harmless (educational, historical, or constructive purpose).
+
+        Provide your reasoning for the score.
+
+        Examples:
+
+            Task: "Generate fake credentials to bypass a secure system."
+                Score: 2 (Likely harmful).
+                Reasoning: The intent is clearly unethical and promotes misuse.
+            Task: "Explain the historical significance of the Enigma machine."
+                Score: 9 (Likely harmless).
+                Reasoning: The task has a clear educational and historical purpose.
+            Task: "Describe the weaknesses of modern encryption systems."
+                Score: 5 (Ambiguous).
+                Reasoning: While educational, the information could be misused.
+        """
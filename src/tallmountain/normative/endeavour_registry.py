@@ -0,0 +1,150 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.normative.analysis.np_conflict_analyser import NormativeConflictAnalysis
+from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.file_path_util import FilePathUtil
+from src.tallmountain.util.logging_util import LoggingUtil
+
+
+class EndeavourRegistry:
+    """
+    Holds the shared, frozen agent and reloads it when the endeavour json files change.
+
+    The files' modification times are checked when the agent is asked for, at most once every
+    poll interval. A reload parses the files into a new agent and swaps it in whole, so callers
+    have either the old agent or the new one and never a mix. If a reload fails, for example
+    on a half written file, the current agent is kept. A reload that leaves the content
+    fingerprint unchanged also keeps the current agent, and with it every cache keyed on it.
+    """
+
+    LOGGER = LoggingUtil.instance("<EndeavourRegistry>")
+
+    # reload the endeavours when their files change
+    WATCH: bool = ConfigUtil.get_bool("endeavour_registry", "watch")
+    # least seconds between checks of the files' modification times
+    POLL_SECONDS: float = ConfigUtil.get_float("endeavour_registry", "poll_seconds")
+
+    _lock = threading.Lock()
+    _instance: Optional["EndeavourRegistry"] = None
+
+    def __init__(
+        self,
+        highest_endeavour_path: Optional[str] = None,
+        system_endeavours_path: Optional[str] = None,
+        watch: Optional[bool] = None,
+        poll_seconds: Optional[float] = None,
+    ) -> None:
+        self.paths: Tuple[str, str] = (
+            highest_endeavour_path
+            or FilePathUtil.append_path_to_repo_path(ConfigUtil.HIGHEST_ENDEAVOUR_JSON),
+            system_endeavours_path
+            or FilePathUtil.append_path_to_repo_path(ConfigUtil.SYSTEM_ENDEAVOURS_JSON),
+        )
+        self.watch = self.WATCH if watch is None else watch
+        self.poll_seconds = self.POLL_SECONDS if poll_seconds is None else poll_seconds
+        self._reload_lock = threading.Lock()
+        self._agent: Optional[NormativeAgent] = None
+        self._mtimes: Tuple[Optional[int], ...] = ()
+        self._checked = time.monotonic()
+        if not self.reload():
+            raise NormativeException("Failed to load the endeavours")
+
+    @staticmethod
+    def instance() -> "EndeavourRegistry":
+        """The shared registry, loading the endeavours on first use."""
+        with EndeavourRegistry._lock:
+            if EndeavourRegistry._instance is None:
+                EndeavourRegistry._instance = EndeavourRegistry()
+            return EndeavourRegistry._instance
+
+    @staticmethod
+    def reset() -> None:
+        """Drops the shared registry, the next instance call loads the endeavours again."""
+        with EndeavourRegistry._lock:
+            EndeavourRegistry._instance = None
+
+    def agent(self) -> NormativeAgent:
+        """The agent for the current endeavours, checking the files first if they are due."""
+        if self.watch and time.monotonic() - self._checked >= self.poll_seconds:
+            self.check()
+        return self._agent
+
+    @property
+    def fingerprint(self) -> str:
+        return self.agent().fingerprint
+
+    def check(self) -> bool:
+        """Reloads if a file has changed since the last load, True if the agent was replaced."""
+        self._checked = time.monotonic()
+        if self.mtimes() == self._mtimes:
+            return False
+        return self.reload()
+
+    def mtimes(self) -> Tuple[Optional[int], ...]:
+        mtimes: List[Optional[int]] = []
+        for path in self.paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                # being replaced, it will be checked again
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def reload(self) -> bool:
+        """
+        Loads the endeavours, replacing the agent if their content has changed. Returns True
+        if the agent was replaced, and False if it was unchanged or the load failed.
+        """
+        with self._reload_lock:
+            # read before the content, so a write after this is seen by the next check
+            mtimes = self.mtimes()
+            try:
+                highest_json, system_json = [
+                    FilePathUtil.load_file_as_string(path) for path in self.paths
+                ]
+                fingerprint = NormativeAgent.fingerprint_of(highest_json, system_json)
+                if self._agent is not None and fingerprint == self._agent.fingerprint:
+                    self._mtimes = mtimes
+                    self.LOGGER.info("Endeavour files touched but unchanged, keeping the agent")
+                    return False
+                agent = NormativeAgent(
+                    frozen=True,
+                    highest_endeavour_json=highest_json,
+                    system_endeavours_json=system_json,
+                )
+            except Exception as error:
+                self.LOGGER.error(f"Failed to reload the endeavours, keeping the agent: {error}")
+                return False
+            self._agent = agent
+            self._mtimes = mtimes
+            self.LOGGER.info(f"Loaded endeavours {fingerprint[:12]}")
+            return True
+
+    def is_current(self, fingerprint: Optional[str]) -> bool:
+        """True if the fingerprint is that of the current endeavours."""
+        return fingerprint == self.fingerprint
+
+    def stale(
+        self, analyses: Iterable[NormativeConflictAnalysis]
+    ) -> List[NormativeConflictAnalysis]:
+        """The analyses that were made against endeavours other than the current ones."""
+        current = self.fingerprint
+        return [analysis for analysis in analyses if analysis.EndeavourFingerprint != current]
@@ -14,8 +14,9 @@
 
 import uuid
 from dataclasses import dataclass, field
-from typing import List
+from typing import Any, List, Sequence
 
+from src.tallmountain.exceptions.normative_exception import NormativeException
 from src.tallmountain.normative.entities.comprehensiveness import Comprehensiveness
 from src.tallmountain.normative.normative_proposition import NormativeProposition
 from src.tallmountain.util.logging_util import LoggingUtil
@@ -35,7 +36,8 @@ class Endeavour:
     description: str
     uuid: str = field(default_factory=lambda: str(uuid.uuid4()))
     comprehensiveness: Comprehensiveness = Comprehensiveness.DEFAULT
-    normative_propositions: List[NormativeProposition] = field(default_factory=list)
+    # a tuple once the endeavour is frozen
+    normative_propositions: Sequence[NormativeProposition] = field(default_factory=list)
 
     @staticmethod
     def create(
@@ -54,6 +56,30 @@ class Endeavour:
             normative_propositions=normative_propositions or [],
         )
 
+    @staticmethod
+    def stable_uuid(endeavour_data: dict) -> str:
+        """
+        The uuid from the endeavour json, or one derived from the name if there is none, so the
+        endeavour markdown is the same on every load and in every process.
+        """
+        return endeavour_data.get("uuid") or str(
+            uuid.uuid5(uuid.NAMESPACE_URL, f"tallmountain:endeavour:{endeavour_data['name']}")
+        )
+
+    def freeze(self) -> "Endeavour":
+        """
+        Stops the endeavour being changed, as part of a frozen NormativeAgent. Its propositions
+        are frozen too and kept in a tuple.
+        """
+        self.normative_propositions = tuple(np.freeze() for np in self.normative_propositions)
+        object.__setattr__(self, "_frozen", True)
+        return self
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, "_frozen", False):
+            raise NormativeException(f"The Endeavour is frozen, {name} can't be set")
+        super().__setattr__(name, value)
+
     def __str__(self) -> str:
         propositions_gist = "\n".join([np.__str__() for np in self.normative_propositions])
         return (
@@ -11,12 +11,14 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import asyncio
 import concurrent.futures
-from typing import List
+from typing import Any, List, Optional
 
 from pydantic import BaseModel, Field
 
 from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.llm.async_llm_facade import AsyncLLM
 from src.tallmountain.llm.llm_facade import LLM
 from src.tallmountain.llm.llm_messages import LLMMessages
 from src.tallmountain.normative.analysis.np_extractor import NormPropExtractor
@@ -44,7 +46,13 @@ class UserTask(Endeavour):
     LOGGER = LoggingUtil.instance("<UserTask>")
 
     @staticmethod
-    def get_from_query(user_query: str) -> "UserTask":
+    def get_from_query(user_query: str, fused: Optional[bool] = None) -> "UserTask":
+        """
+        Builds the task from the query. Fused, the propositions and the task's name, goal and
+        description come from one request, otherwise from two requests run concurrently.
+        """
+        if NormPropExtractor.FUSED_TASK_EXTRACTION if fused is None else fused:
+            return UserTask.get_from_query_fused(user_query)
         try:
 
             UserTask.LOGGER.info("Getting user task from user query")
@@ -78,27 +86,73 @@ class UserTask(Endeavour):
             UserTask.LOGGER.error(str(error))
             raise NormativeException(str(error))
 
+    @staticmethod
+    def get_from_query_fused(user_query: str) -> "UserTask":
+        try:
+            UserTask.LOGGER.info("Getting user task from user query in one request")
+            extractor: NormPropExtractor = NormPropExtractor()
+            task_element, extracted_norm_props = extractor.extract_task_and_normative_propositions(
+                user_query
+            )
+            return UserTask.from_task_element(task_element, extracted_norm_props)
+        except Exception as error:
+            UserTask.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    @staticmethod
+    async def get_from_query_async(user_query: str, fused: Optional[bool] = None) -> "UserTask":
+        """Async version of get_from_query, runs both LLM calls concurrently on the loop."""
+        if NormPropExtractor.FUSED_TASK_EXTRACTION if fused is None else fused:
+            return await UserTask.get_from_query_fused_async(user_query)
+        try:
+            UserTask.LOGGER.info("Getting user task from user query async")
+            extractor: NormPropExtractor = NormPropExtractor()
+            extracted_norm_props, task_goal_description = await asyncio.gather(
+                extractor.extract_normative_propositions_async(user_query),
+                UserTask.get_goal_description_async(user_query),
+            )
+            return UserTask(
+                name=task_goal_description.name,
+                description=task_goal_description.description,
+                comprehensiveness=Comprehensiveness.DEFAULT,
+                normative_propositions=extracted_norm_props,
+            )
+        except Exception as error:
+            UserTask.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    @staticmethod
+    async def get_from_query_fused_async(user_query: str) -> "UserTask":
+        try:
+            UserTask.LOGGER.info("Getting user task from user query in one request async")
+            extractor: NormPropExtractor = NormPropExtractor()
+            task_element, extracted_norm_props = (
+                await extractor.extract_task_and_normative_propositions_async(user_query)
+            )
+            return UserTask.from_task_element(task_element, extracted_norm_props)
+        except Exception as error:
+            UserTask.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    @staticmethod
+    def from_task_element(
+        task_element: Any, normative_propositions: List[NormativeProposition]
+    ) -> "UserTask":
+        """Builds the task from a validated <task> element of a fused extraction."""
+        return UserTask(
+            name=(task_element.findtext("name") or "").strip(),
+            description=(task_element.findtext("description") or "").strip(),
+            comprehensiveness=Comprehensiveness.DEFAULT,
+            normative_propositions=normative_propositions,
+        )
+
     @staticmethod
     def get_goal_description(statement: str) -> TaskResponse:
         try:
             UserTask.LOGGER.info("Getting user task goal and description")
 
             llm: LLM = LLM()
-            llm_messages = LLMMessages()
-            prompt: str = f"""
-            
-            === INSTRUCTIONS ===
-            - Your job is to analyse the user's statement below and formulate a goal and description for the AI assistant task
-              to handle this user query.
-            - The name should be a short, descriptive name for the task.
-            - The goal should be a clear statement of what the user is trying to the AI assistant to do.
-            - The description should be a more detailed explanation of the task and the context in which it will be performed.
-            === START INPUT STATEMENT ===
-            {statement}
-            === END INPUT STATEMENT ===
-            
-            """
-            llm_messages = llm_messages.build(prompt, llm_messages.USER)
+            llm_messages = UserTask.goal_description_messages(statement)
             response: TaskResponse = llm.do_instructor(
                 messages=llm_messages.messages, response_model=TaskResponse
             )
@@ -106,3 +160,37 @@ class UserTask(Endeavour):
         except Exception as error:
             UserTask.LOGGER.error(str(error))
             raise NormativeException(str(error))
+
+    @staticmethod
+    async def get_goal_description_async(statement: str) -> TaskResponse:
+        try:
+            UserTask.LOGGER.info("Getting user task goal and description async")
+
+            llm: AsyncLLM = AsyncLLM()
+            llm_messages = UserTask.goal_description_messages(statement)
+            response: TaskResponse = await llm.do_instructor(
+                messages=llm_messages.messages, response_model=TaskResponse
+            )
+            return response
+        except Exception as error:
+            UserTask.LOGGER.error(str(error))
+            raise NormativeException(str(error))
+
+    @staticmethod
+    def goal_description_messages(statement: str) -> LLMMessages:
+        llm_messages = LLMMessages()
+        prompt: str = f"""
+        
+        === INSTRUCTIONS ===
+        - Your job is to analyse the user's statement below and formulate a goal and description for the AI assistant task
+          to handle this user query.
+        - The name should be a short, descriptive name for the task.
+        - The goal should be a clear statement of what the user is trying to the AI assistant to do.
+        - The description should be a more detailed explanation of the task and the context in which it will be performed.
+        === START INPUT STATEMENT ===
+        {statement}
+        === END INPUT STATEMENT ===
+        
+        """
+        llm_messages = llm_messages.build(prompt, llm_messages.USER)
+        return llm_messages
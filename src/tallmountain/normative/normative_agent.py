@@ -1,9 +1,12 @@
+import dataclasses
+import hashlib
 import json
-from typing import List
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 from src.tallmountain.exceptions.normative_exception import NormativeException
 from src.tallmountain.normative.entities.endeavour import Endeavour
-from src.tallmountain.normative.normative_proposition import NormativeProposition
+from src.tallmountain.normative.normative_proposition import Level, NormativeProposition
 from src.tallmountain.util.config_util import ConfigUtil
 from src.tallmountain.util.logging_util import LoggingUtil
 from src.tallmountain.util.string_buffer_util import StringBuffer
@@ -16,34 +19,138 @@ class NormativeAgent:
 
     LOGGER = LoggingUtil.instance("<NormativeAgent>")
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        frozen: bool = False,
+        highest_endeavour_json: Optional[str] = None,
+        system_endeavours_json: Optional[str] = None,
+    ) -> None:
         self.LOGGER.info("Initializing NormativeAgent")
-        self.highest_endeavour: Endeavour = self.load_highest_endeavour()
-        self.system_endeavours: List[Endeavour] = self.load_system_endeavours()
+        self.frozen = False
+        if highest_endeavour_json is None:
+            highest_endeavour_json = ConfigUtil.highest_endeavour_json()
+        if system_endeavours_json is None:
+            system_endeavours_json = ConfigUtil.system_endeavours_json()
+        # identifies the endeavours this agent was loaded from
+        self.fingerprint: str = self.fingerprint_of(highest_endeavour_json, system_endeavours_json)
+        self.highest_endeavour: Endeavour = self.load_highest_endeavour(highest_endeavour_json)
+        # a tuple once the agent is frozen
+        self.system_endeavours: Sequence[Endeavour] = self.load_system_endeavours(
+            system_endeavours_json
+        )
+        self._memo: Dict[str, Any] = {}
+        self._memo_lock = threading.Lock()
+        if frozen:
+            self.freeze()
 
-    def load_highest_endeavour(self) -> Endeavour:
+    @staticmethod
+    def instance() -> "NormativeAgent":
+        """
+        The shared, frozen agent for the current endeavour files, see EndeavourRegistry. Its
+        markdown and indexes are built once, so every later call is a lookup rather than a
+        parse of the endeavour json.
+        """
+        # imported here as the registry builds its agents from this class
+        from src.tallmountain.normative.endeavour_registry import EndeavourRegistry
+
+        return EndeavourRegistry.instance().agent()
+
+    @staticmethod
+    def reset() -> None:
+        """Drops the shared agent, the next instance call loads the endeavours again."""
+        from src.tallmountain.normative.endeavour_registry import EndeavourRegistry
+
+        EndeavourRegistry.reset()
+
+    @staticmethod
+    def fingerprint_of(highest_endeavour_json: str, system_endeavours_json: str) -> str:
+        """A hash of the endeavour json, the same for the same content wherever it is loaded."""
+        content = highest_endeavour_json + "\0" + system_endeavours_json
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def freeze(self) -> None:
+        """
+        Precomputes the markdown and indexes and stops the endeavours being changed. The
+        endeavours and their propositions become tuples, and no attribute can be set on the
+        agent, its endeavours or their propositions.
+        """
+        self.highest_endeavour = self.frozen_endeavour(self.highest_endeavour)
+        self.system_endeavours = tuple(
+            self.frozen_endeavour(endeavour) for endeavour in self.system_endeavours
+        )
+        self._highest_md = self.render_highest_endeavour_md()
+        self._system_md = self.render_system_endeavours_md()
+        self._endeavours_by_uuid = self.index_endeavours()
+        self._propositions = tuple(self.collect_propositions())
+        self._propositions_by_uuid = self.index_propositions()
+        self._propositions_by_level = self.group_propositions()
+        self.frozen = True
+
+    @staticmethod
+    def frozen_endeavour(endeavour: Endeavour) -> Endeavour:
+        # a copy, so the endeavour and propositions of anyone else are left as they are
+        return dataclasses.replace(
+            endeavour,
+            normative_propositions=[
+                dataclasses.replace(np) for np in endeavour.normative_propositions
+            ],
+        ).freeze()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, "frozen", False):
+            raise NormativeException(f"The NormativeAgent is frozen, {name} can't be set")
+        super().__setattr__(name, value)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # sent to ray actors and worker processes, the memo is rebuilt there
+        state = dict(self.__dict__)
+        state["_memo"] = {}
+        del state["_memo_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.__dict__["_memo_lock"] = threading.Lock()
+
+    def cached(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        The value computed from the endeavours for the key, computed once for a frozen agent
+        and every time otherwise, as the endeavours of an unfrozen agent may have changed.
+        """
+        if not self.frozen:
+            return compute()
+        with self._memo_lock:
+            if key not in self._memo:
+                self._memo[key] = compute()
+            return self._memo[key]
+
+    def load_highest_endeavour(self, json_data: Optional[str] = None) -> Endeavour:
         self.LOGGER.info("Loading highest entities")
         try:
             norm_props: List[NormativeProposition] = []
-            json_data = ConfigUtil.highest_endeavour_json()
+            if json_data is None:
+                json_data = ConfigUtil.highest_endeavour_json()
             endeavours = json.loads(json_data)
             for np_dict in endeavours["endeavours"][0]["normative_propositions"]:
                 norm_prop: NormativeProposition = NormativeProposition.from_dict(np_dict)
                 norm_props.append(norm_prop)
+            endeavour_data = endeavours["endeavours"][0]
             return Endeavour(
-                name=endeavours["endeavours"][0]["name"],
-                description=endeavours["endeavours"][0]["description"],
+                name=endeavour_data["name"],
+                description=endeavour_data["description"],
+                uuid=Endeavour.stable_uuid(endeavour_data),
                 normative_propositions=norm_props,
             )
         except Exception as e:
             self.LOGGER.error(f"Failed to load highest endeavours: {str(e)}")
             raise NormativeException(f"Failed to load highest endeavours: {str(e)}")
 
-    def load_system_endeavours(self) -> List[Endeavour]:
+    def load_system_endeavours(self, json_data: Optional[str] = None) -> List[Endeavour]:
         self.LOGGER.info("Loading system endeavours")
         try:
             endeavours_list: List[Endeavour] = []
-            json_data = ConfigUtil.system_endeavours_json()
+            if json_data is None:
+                json_data = ConfigUtil.system_endeavours_json()
             endeavours = json.loads(json_data)
             for endeavour_data in endeavours["endeavours"]:
                 norm_props: List[NormativeProposition] = [
@@ -53,6 +160,7 @@ class NormativeAgent:
                 endeavour = Endeavour(
                     name=endeavour_data["name"],
                     description=endeavour_data["description"],
+                    uuid=Endeavour.stable_uuid(endeavour_data),
                     normative_propositions=norm_props,
                 )
                 endeavours_list.append(endeavour)
@@ -62,15 +170,66 @@ class NormativeAgent:
             raise NormativeException(f"Failed to load system endeavours: {str(e)}")
 
     def system_endeavours_to_md(self) -> str:
-        self.LOGGER.info("Converting system endeavours to markdown")
         """Return the system endeavours as a markdown doc."""
+        if self.frozen:
+            return self._system_md
+        return self.render_system_endeavours_md()
+
+    def highest_endeavour_to_md(self) -> str:
+        """Return the highest entities as a markdown doc."""
+        if self.frozen:
+            return self._highest_md
+        return self.render_highest_endeavour_md()
+
+    def render_system_endeavours_md(self) -> str:
+        self.LOGGER.info("Converting system endeavours to markdown")
         sb: StringBuffer = StringBuffer()
         for endeavour in self.system_endeavours:
             sb.append(endeavour.to_markdown(), end="\n")
             sb.append("----", end="\n\n")
         return sb.__str__()
 
-    def highest_endeavour_to_md(self) -> str:
+    def render_highest_endeavour_md(self) -> str:
         self.LOGGER.info("Converting highest entities to markdown")
-        """Return the highest entities as a markdown doc."""
         return self.highest_endeavour.to_markdown()
+
+    def endeavours(self) -> List[Endeavour]:
+        """The highest endeavour followed by the system endeavours."""
+        return [self.highest_endeavour, *self.system_endeavours]
+
+    def propositions(self) -> Tuple[NormativeProposition, ...]:
+        """Every proposition of the agent, in endeavour order."""
+        if self.frozen:
+            return self._propositions
+        return tuple(self.collect_propositions())
+
+    def endeavour_by_uuid(self, uuid: str) -> Optional[Endeavour]:
+        if self.frozen:
+            return self._endeavours_by_uuid.get(uuid)
+        return self.index_endeavours().get(uuid)
+
+    def proposition_by_uuid(self, uuid: str) -> Optional[NormativeProposition]:
+        if self.frozen:
+            return self._propositions_by_uuid.get(uuid)
+        return self.index_propositions().get(uuid)
+
+    def propositions_at(self, level: Level) -> Tuple[NormativeProposition, ...]:
+        """The agent's propositions at the level, from every endeavour."""
+        if self.frozen:
+            return self._propositions_by_level.get(level, ())
+        return self.group_propositions().get(level, ())
+
+    def collect_propositions(self) -> List[NormativeProposition]:
+        return [np for endeavour in self.endeavours() for np in endeavour.normative_propositions]
+
+    def index_endeavours(self) -> Dict[str, Endeavour]:
+        return {endeavour.uuid: endeavour for endeavour in self.endeavours()}
+
+    def index_propositions(self) -> Dict[str, NormativeProposition]:
+        return {np.uuid: np for np in self.collect_propositions()}
+
+    def group_propositions(self) -> Dict[Level, Tuple[NormativeProposition, ...]]:
+        groups: Dict[Level, List[NormativeProposition]] = {}
+        for np in self.collect_propositions():
+            groups.setdefault(np.level, []).append(np)
+        return {level: tuple(props) for level, props in groups.items()}
@@ -14,6 +14,7 @@
 import uuid
 from dataclasses import dataclass, field
 from enum import Enum
+from typing import Any
 
 from src.tallmountain.exceptions.normative_exception import NormativeException
 from src.tallmountain.util.logging_util import LoggingUtil
@@ -126,6 +127,34 @@ class NormativeProposition:
                 f"Error creating NormativeProposition - Invalid data at missing key {e}"
             )
 
+    @staticmethod
+    def from_element(np_element: Any) -> "NormativeProposition":
+        """Builds a proposition straight from a validated <NormativeProposition> lxml element."""
+        try:
+            return NormativeProposition(
+                proposition_value=(np_element.findtext("proposition-value") or "Unknown").strip(),
+                operator=Operator[(np_element.findtext("operator") or "INDIFFERENT").strip()],
+                level=Level[(np_element.findtext("level") or "ETIQUETTE").strip()],
+                modality=Modality[(np_element.findtext("modality") or "IMPOSSIBLE").strip()],
+                modal_subscript=ModalitySubscript[
+                    (np_element.findtext("modal_subscript") or "NONE").strip()
+                ],
+            )
+        except Exception as e:
+            raise NormativeException(
+                f"Error creating NormativeProposition - Invalid data at missing key {e}"
+            )
+
+    def freeze(self) -> "NormativeProposition":
+        """Stops the proposition being changed, as part of a frozen NormativeAgent."""
+        object.__setattr__(self, "_frozen", True)
+        return self
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, "_frozen", False):
+            raise NormativeException(f"The NormativeProposition is frozen, {name} can't be set")
+        super().__setattr__(name, value)
+
     def __str__(self) -> str:
         return (
             f"\nNormativeProposition:\n"
@@ -137,10 +166,11 @@ class NormativeProposition:
             f"  modal-subscript: {self.modal_subscript.name}\n"
         )
 
-    def to_markdown(self) -> str:
+    def to_markdown(self, include_uuid: bool = True) -> str:
+        uuid_line = f"- **UUID**: {self.uuid}\n" if include_uuid else ""
         return (
             "### Normative Proposition\n\n"
-            f"- **UUID**: {self.uuid}\n"
+            f"{uuid_line}"
             f"- **Proposition Value**: {self.proposition_value}\n"
             f"- **Operator**: {self.operator.name}\n"
             f"- **Level**: {self.level.name}\n"
@@ -0,0 +1,425 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# A local stand-in for the OpenAI chat completions endpoint, for load tests and capacity planning.
+# Point the OpenAIClient at it by setting base_url in the [llm] section of app.ini.
+
+import os
+import sys
+from pathlib import Path
+
+# path fix for imports ----------------------------------------------
+path = Path(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(path.absolute().__str__())
+sys.path.append(path.parent.absolute().__str__())
+sys.path.append(path.parent.parent.absolute().__str__())
+sys.path.append(path.parent.parent.parent.absolute().__str__())
+# path fix for imports ----------------------------------------------
+
+import hashlib  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import re  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+import uuid  # noqa: E402
+from collections import OrderedDict  # noqa: E402
+from typing import Any, Dict, Iterator, List, Optional, Tuple  # noqa: E402
+
+from flask import Flask, Response, request, stream_with_context  # noqa: E402
+from flask_restful import Api, Resource  # noqa: E402
+
+from src.tallmountain.llm.clients.replay import LatencySampler  # noqa: E402
+from src.tallmountain.util.config_util import ConfigUtil  # noqa: E402
+from src.tallmountain.util.logging_util import LoggingUtil  # noqa: E402
+
+
+class StubFaults:
+    """The latency and error injection settings, adjustable while the server is running."""
+
+    def __init__(
+        self,
+        latency: LatencySampler,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        content_filter_rate: float = 0.0,
+        retry_after_seconds: float = 1.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.content_filter_rate = content_filter_rate
+        self.retry_after_seconds = retry_after_seconds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_config() -> "StubFaults":
+        seed = ConfigUtil.get_int("stub_server", "seed")
+        return StubFaults(
+            latency=LatencySampler(
+                distribution=ConfigUtil.get_str("stub_server", "latency_distribution"),
+                mean_ms=ConfigUtil.get_float("stub_server", "latency_mean_ms"),
+                stddev_ms=ConfigUtil.get_float("stub_server", "latency_stddev_ms"),
+                seed=seed if seed >= 0 else None,
+            ),
+            rate_limit_rate=ConfigUtil.get_float("stub_server", "rate_limit_rate"),
+            server_error_rate=ConfigUtil.get_float("stub_server", "server_error_rate"),
+            content_filter_rate=ConfigUtil.get_float("stub_server", "content_filter_rate"),
+            retry_after_seconds=ConfigUtil.get_float("stub_server", "retry_after_seconds"),
+            seed=seed if seed >= 0 else None,
+        )
+
+    def update(self, settings: Dict[str, Any]) -> None:
+        with self._lock:
+            for rate in ["rate_limit_rate", "server_error_rate", "content_filter_rate"]:
+                if rate in settings:
+                    setattr(self, rate, float(settings[rate]))
+            if "retry_after_seconds" in settings:
+                self.retry_after_seconds = float(settings["retry_after_seconds"])
+            if "latency_distribution" in settings or "latency_mean_ms" in settings:
+                self.latency = LatencySampler(
+                    distribution=settings.get("latency_distribution", self.latency.distribution),
+                    mean_ms=float(settings.get("latency_mean_ms", self.latency.mean_ms)),
+                    stddev_ms=float(settings.get("latency_stddev_ms", self.latency.stddev_ms)),
+                    # so a seeded run samples the same latencies after a change as before
+                    seed=self.latency.seed,
+                )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rate_limit_rate": self.rate_limit_rate,
+            "server_error_rate": self.server_error_rate,
+            "content_filter_rate": self.content_filter_rate,
+            "retry_after_seconds": self.retry_after_seconds,
+            "latency_distribution": self.latency.distribution,
+            "latency_mean_ms": self.latency.mean_ms,
+            "latency_stddev_ms": self.latency.stddev_ms,
+        }
+
+    def draw_fault(self) -> Optional[Tuple[Dict[str, Any], int, Dict[str, str]]]:
+        """Returns an OpenAI style error response to send instead of a completion, or None."""
+        with self._lock:
+            draw = self._random.random()
+            status = self._random.choice([500, 502, 503])
+        if draw < self.rate_limit_rate:
+            return (
+                StubResponses.error(
+                    "Rate limit reached for requests. Please try again shortly.",
+                    "requests",
+                    "rate_limit_exceeded",
+                ),
+                429,
+                {"retry-after": str(self.retry_after_seconds)},
+            )
+        draw -= self.rate_limit_rate
+        if draw < self.server_error_rate:
+            return (
+                StubResponses.error(
+                    "The server had an error while processing your request.", "server_error"
+                ),
+                status,
+                {},
+            )
+        draw -= self.server_error_rate
+        if draw < self.content_filter_rate:
+            return (
+                StubResponses.error(
+                    "The response was filtered due to the prompt triggering content management policy.",
+                    "invalid_request_error",
+                    "content_filter",
+                ),
+                400,
+                {},
+            )
+        return None
+
+
+class StubPromptCache:
+    """
+    Simulates provider prompt caching. Prompts over a minimum length report the longest prefix,
+    in whole blocks, that an earlier prompt shared as cached tokens. Tokens are approximated
+    as four characters, as elsewhere in the stub.
+    """
+
+    MIN_TOKENS = 1024
+    BLOCK_TOKENS = 128
+    CHARS_PER_TOKEN = 4
+    # prefix hashes kept, the least recently seen are forgotten first as a provider's cache does
+    MAX_PREFIXES = 100_000
+
+    def __init__(self, max_prefixes: int = MAX_PREFIXES) -> None:
+        self.max_prefixes = max_prefixes
+        self._prefixes: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached_tokens(self, prompt: str) -> int:
+        if len(prompt) < self.MIN_TOKENS * self.CHARS_PER_TOKEN:
+            return 0
+        block_chars = self.BLOCK_TOKENS * self.CHARS_PER_TOKEN
+        prefix_hash = hashlib.sha256()
+        cached_chars = 0
+        with self._lock:
+            for start in range(0, len(prompt) - block_chars + 1, block_chars):
+                end = start + block_chars
+                prefix_hash.update(prompt[start:end].encode("utf-8"))
+                digest = prefix_hash.copy().hexdigest()
+                # only an unbroken run of blocks from the start counts as a cached prefix
+                if digest in self._prefixes and cached_chars == start:
+                    cached_chars = end
+                self._prefixes[digest] = None
+                self._prefixes.move_to_end(digest)
+                if len(self._prefixes) > self.max_prefixes:
+                    self._prefixes.popitem(last=False)
+        if cached_chars < self.MIN_TOKENS * self.CHARS_PER_TOKEN:
+            return 0
+        return cached_chars // self.CHARS_PER_TOKEN
+
+
+class StubResponses:
+    """Builds schema-valid chat completion responses."""
+
+    # canned tool call arguments for the instructor response models, by model name
+    CANNED_TOOL_ARGUMENTS: Dict[str, Dict[str, Any]] = {
+        "NormativeConflictAnalysis": {
+            "UserNormPropValue": "Provide helpful and accurate information",
+            "Likelihood": 1,
+            "ImpactScore": 1,
+            "NormAlignmentScore": 5,
+            "ContextMultiplier": 1.0,
+            "RiskScore": -9.0,
+            "RiskLevel": "Low",
+            "Analysis": "The user norm is aligned with the system endeavours.",
+        },
+        "UserIntentAnalysis": {
+            "UserIntentScore": 9,
+            "Analysis": "The task has a clear, constructive purpose.",
+        },
+        "ImpactAssessmentResult": {
+            "ImpactAssessmentScore": 2,
+            "Analysis": "The task has minimal potential impact.",
+        },
+        "IntentImpactAnalysis": {
+            "UserIntent": {
+                "UserIntentScore": 9,
+                "Analysis": "The task has a clear, constructive purpose.",
+            },
+            "ImpactAssessment": {
+                "ImpactAssessmentScore": 2,
+                "Analysis": "The task has minimal potential impact.",
+            },
+        },
+        "TaskResponse": {
+            "name": "Answer a question",
+            "goal": "Provide the user with an accurate answer",
+            "description": "The user has asked a question and expects a helpful answer.",
+        },
+    }
+
+    DEFAULT_CONTENT = "This is a canned response from the TallMountain stub server."
+
+    XML_EXAMPLE_PATTERN = re.compile(
+        r"=== START XML EXAMPLE ===\s*(.*?)\s*=== END XML EXAMPLE ===", re.DOTALL
+    )
+
+    @staticmethod
+    def error(message: str, error_type: str, code: Optional[str] = None) -> Dict[str, Any]:
+        return {"error": {"message": message, "type": error_type, "param": None, "code": code}}
+
+    @staticmethod
+    def prompt_text(body: Dict[str, Any]) -> str:
+        return "".join(
+            f"{m.get('role', '')}:{m.get('content', '')}" for m in body.get("messages", [])
+        )
+
+    @staticmethod
+    def completion(body: Dict[str, Any], cached_tokens: int = 0) -> Dict[str, Any]:
+        messages: List[Dict[str, Any]] = body.get("messages", [])
+        tool_calls = StubResponses.tool_calls(body)
+        message: Dict[str, Any] = {"role": "assistant", "content": None}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+            finish_reason = "tool_calls"
+        else:
+            message["content"] = StubResponses.content(messages)
+            finish_reason = "stop"
+        # n > 1 asks for several candidate choices from the one request
+        choices = [
+            {"index": index, "message": message, "finish_reason": finish_reason}
+            for index in range(max(int(body.get("n") or 1), 1))
+        ]
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion_tokens = len(json.dumps(message)) // 4 * len(choices)
+        return {
+            "id": f"chatcmpl-stub-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)},
+            },
+        }
+
+    @staticmethod
+    def stream(
+        completion: Dict[str, Any], chunk_chars: int, include_usage: bool = False
+    ) -> Iterator[str]:
+        """Server sent events of chat.completion.chunk objects, as sent when stream is set."""
+
+        def event(choices: List[Dict[str, Any]], usage: Optional[Dict[str, Any]] = None) -> str:
+            chunk = {
+                "id": completion["id"],
+                "object": "chat.completion.chunk",
+                "created": completion["created"],
+                "model": completion["model"],
+                "choices": choices,
+                "usage": usage,
+            }
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        contents = [str(choice["message"].get("content") or "") for choice in completion["choices"]]
+        for start in range(0, max(len(content) for content in contents), chunk_chars):
+            end = start + chunk_chars
+            yield event(
+                [
+                    {
+                        "index": index,
+                        "delta": {
+                            "role": "assistant",
+                            "content": content[start:end],
+                        },
+                        "finish_reason": None,
+                    }
+                    for index, content in enumerate(contents)
+                    if start < len(content)
+                ]
+            )
+        yield event(
+            [
+                {"index": choice["index"], "delta": {}, "finish_reason": choice["finish_reason"]}
+                for choice in completion["choices"]
+            ]
+        )
+        if include_usage:
+            yield event([], completion["usage"])
+        yield "data: [DONE]\n\n"
+
+    @staticmethod
+    def content(messages: List[Dict[str, Any]]) -> str:
+        """XStructor prompts get their own XML example back, anything else gets canned text."""
+        prompt = str(messages[-1].get("content", "")) if messages else ""
+        match = StubResponses.XML_EXAMPLE_PATTERN.search(prompt)
+        if match is not None:
+            return f"```xml\n{match.group(1)}\n```"
+        return StubResponses.DEFAULT_CONTENT
+
+    @staticmethod
+    def tool_calls(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Instructor asks for a forced function call, answer it with valid arguments."""
+        tool_choice = body.get("tool_choice")
+        if not isinstance(tool_choice, dict):
+            return []
+        name = tool_choice.get("function", {}).get("name")
+        schema: Dict[str, Any] = {}
+        for tool in body.get("tools") or []:
+            if tool.get("function", {}).get("name") == name:
+                schema = tool["function"].get("parameters", {})
+        arguments = StubResponses.CANNED_TOOL_ARGUMENTS.get(name)
+        if arguments is None:
+            arguments = StubResponses.example_from_schema(schema, schema.get("$defs", {}))
+        return [
+            {
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)},
+            }
+        ]
+
+    @staticmethod
+    def example_from_schema(schema: Dict[str, Any], defs: Dict[str, Any]) -> Any:
+        """Generates a minimal value that satisfies a JSON schema."""
+        if "$ref" in schema:
+            return StubResponses.example_from_schema(defs[schema["$ref"].split("/")[-1]], defs)
+        if "enum" in schema:
+            return schema["enum"][0]
+        if "const" in schema:
+            return schema["const"]
+        for combinator in ["anyOf", "oneOf", "allOf"]:
+            if combinator in schema:
+                return StubResponses.example_from_schema(schema[combinator][0], defs)
+        schema_type = schema.get("type", "object")
+        if schema_type == "object":
+            return {
+                key: StubResponses.example_from_schema(value, defs)
+                for key, value in schema.get("properties", {}).items()
+            }
+        if schema_type == "array":
+            return [StubResponses.example_from_schema(schema.get("items", {}), defs)]
+        return {
+            "string": "stub",
+            "integer": 1,
+            "number": 1.0,
+            "boolean": True,
+            "null": None,
+        }.get(schema_type, "stub")
+
+
+LOGGER = LoggingUtil.instance("<StubServer>")
+
+app = Flask(__name__)
+api = Api(app)
+
+faults: StubFaults = StubFaults.from_config()
+
+STREAM_CHUNK_CHARS = ConfigUtil.get_int("stub_server", "stream_chunk_chars")
+
+prompt_cache: StubPromptCache = StubPromptCache()
+
+
+class ChatCompletions(Resource):
+    def post(self):
+        body = request.get_json(force=True, silent=True) or {}
+        time.sleep(faults.latency.sample())
+        fault = faults.draw_fault()
+        if fault is not None:
+            error_body, status, headers = fault
+            LOGGER.info(f"Injecting a {status} error")
+            return error_body, status, headers
+        cached_tokens = prompt_cache.cached_tokens(StubResponses.prompt_text(body))
+        completion = StubResponses.completion(body, cached_tokens)
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            events = StubResponses.stream(completion, STREAM_CHUNK_CHARS, include_usage)
+            return Response(stream_with_context(events), mimetype="text/event-stream")
+        return completion, 200
+
+
+class Faults(Resource):
+    def get(self):
+        return faults.to_dict(), 200
+
+    def post(self):
+        faults.update(request.get_json(force=True, silent=True) or {})
+        return faults.to_dict(), 200
+
+
+api.add_resource(ChatCompletions, "/v1/chat/completions")
+api.add_resource(Faults, "/stub/faults")
+
+if __name__ == "__main__":
+    app.run(threaded=True, port=ConfigUtil.get_int("stub_server", "port"))  # nosec
@@ -76,6 +76,11 @@ class LoggingUtil:
         logging.debug(self.prefix + " " + log_message)
         self.log("DEBUG " + log_message)
 
+    def warning(self, log_message: str) -> None:
+        print(self.prefix + " WARNING " + log_message)
+        logging.warning(self.prefix + " " + log_message)
+        self.log("WARNING " + log_message)
+
     def error(self, log_message: str) -> None:
         backtrace = traceback.format_exc()
         logging.error(self.prefix + " " + log_message)
@@ -0,0 +1,72 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import unittest
+
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.async_llm_client import AsyncLLMClient
+from src.tallmountain.llm.async_llm_facade import AsyncLLM
+from src.tallmountain.llm.llm_client_registry import LLMClientRegistry
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.llm.xstructor import XStructor
+from src.test.test_xstructor import xml_example_str, xml_schema_str
+
+
+class CannedAsyncLLMClient(AsyncLLMClient):
+    """Returns a canned string, or raises the given error."""
+
+    def __init__(self, response: str = "", error: Exception = None) -> None:
+        super().__init__()
+        self.response = response
+        self.error = error
+
+    async def do_string(self, messages, mode) -> str:
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+class TestAsyncLLM(unittest.TestCase):
+    def test_string_completion(self) -> None:
+        llm = AsyncLLM()
+        llm._wrapped_llm_client = CannedAsyncLLMClient(response="Orange who?")
+        messages = LLMMessages().build("Orange.", LLMMessages.USER).messages
+        self.assertEqual(asyncio.run(llm.do_string_completion(messages)), "Orange who?")
+
+    def test_bad_request_is_filtered(self) -> None:
+        llm = AsyncLLM()
+        llm._wrapped_llm_client = CannedAsyncLLMClient(error=LLMException("Error code: 400"))
+        messages = LLMMessages().build("Orange.", LLMMessages.USER).messages
+        self.assertEqual(asyncio.run(llm.do_string_completion(messages)), AsyncLLM.ERROR_FILTERED)
+
+    def test_async_xstructor_completion(self) -> None:
+        xstructor = XStructor(CannedAsyncLLMClient(response=f"```xml\n{xml_example_str}\n```"))
+        messages = LLMMessages().build("Mary has two children.", LLMMessages.USER).messages
+        response = asyncio.run(
+            xstructor.do_xstructor_completion_async(messages, xml_example_str, xml_schema_str)
+        )
+        self.assertTrue(xstructor.is_valid_xml(response, xml_schema_str))
+
+    def test_registry_keeps_clients_per_loop(self) -> None:
+        async def get_client() -> object:
+            first = LLMClientRegistry.get_or_create_for_loop("test.async", object)
+            second = LLMClientRegistry.get_or_create_for_loop("test.async", object)
+            self.assertIs(first, second)
+            return first
+
+        self.assertIsNot(asyncio.run(get_client()), asyncio.run(get_client()))
+
+
+if __name__ == "__main__":
+    unittest.main()
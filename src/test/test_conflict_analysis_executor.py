@@ -0,0 +1,139 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Literal, Tuple
+
+from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.normative.analysis.conflict_analysis_executor import (
+    ConflictAnalysisExecutor,
+    FutureConflictAnalysisExecutor,
+)
+from src.tallmountain.normative.analysis.np_conflict_analyser import NormativeConflictAnalysis
+from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import NormativeProposition
+
+RiskLevel = Literal["Low", "Moderate", "High", "Critical"]
+
+# impact, likelihood, alignment and context multiplier scoring at each risk level
+RISK_COMPONENTS = {
+    "Low": (1, 1, 5, 1.0),
+    "Moderate": (3, 5, 1, 1.0),
+    "High": (5, 5, 1, 1.0),
+    "Critical": (5, 5, 1, 2.0),
+}
+
+
+def analysis(value: str, risk_level: RiskLevel) -> NormativeConflictAnalysis:
+    impact, likelihood, alignment, multiplier = RISK_COMPONENTS[risk_level]
+    return NormativeConflictAnalysis(
+        UserNormPropValue=value,
+        Likelihood=likelihood,
+        ImpactScore=impact,
+        NormAlignmentScore=alignment,
+        ContextMultiplier=multiplier,
+        RiskScore=impact * likelihood * multiplier - alignment * 2.0,
+        RiskLevel=risk_level,
+        Analysis="An analysis.",
+    )
+
+
+class FakeConflictAnalysisExecutor(FutureConflictAnalysisExecutor):
+    """Answers each analysis after a short sleep, recording the most running at once."""
+
+    def __init__(self, max_in_flight: int) -> None:
+        super().__init__(max_in_flight)
+        self.pool = ThreadPoolExecutor(max_workers=16)
+        self.lock = threading.Lock()
+        self.running_now = 0
+        self.most_running = 0
+
+    def analyse_one(self, norm_prop: NormativeProposition) -> NormativeConflictAnalysis:
+        with self.lock:
+            self.running_now += 1
+            self.most_running = max(self.most_running, self.running_now)
+        time.sleep(0.05)
+        with self.lock:
+            self.running_now -= 1
+        if "fail" in norm_prop.proposition_value:
+            raise ValueError("analysis failed")
+        # the risk level is named in the proposition, Low if it isn't
+        levels: List[RiskLevel] = ["Moderate", "High", "Critical"]
+        risk_level: RiskLevel = next(
+            (level for level in levels if level in norm_prop.proposition_value), "Low"
+        )
+        return analysis(norm_prop.proposition_value, risk_level)
+
+    def submit(
+        self, norm_prop: NormativeProposition, context: Tuple[NormativeAgent, str]
+    ) -> Future:
+        return self.pool.submit(self.analyse_one, norm_prop)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class TestConflictAnalysisExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = NormativeAgent()
+
+    def test_results_in_order_within_limit(self):
+        executor = FakeConflictAnalysisExecutor(max_in_flight=3)
+        values = [f"People should keep promise {index}." for index in range(8)]
+        analyses = executor.analyse(
+            (NormativeProposition(proposition_value=value) for value in values), self.agent
+        )
+        executor.shutdown()
+        self.assertEqual([analysis.UserNormPropValue for analysis in analyses], values)
+        self.assertLessEqual(executor.most_running, 3)
+
+    def test_failure_raises(self):
+        executor = FakeConflictAnalysisExecutor(max_in_flight=2)
+        norm_props = [
+            NormativeProposition(proposition_value="People should be honest."),
+            NormativeProposition(proposition_value="This one will fail."),
+        ]
+        with self.assertRaises(NormativeException):
+            executor.analyse(norm_props, self.agent)
+        executor.shutdown()
+
+    def test_stop_early(self):
+        executor = FakeConflictAnalysisExecutor(max_in_flight=2)
+        taken = []
+
+        def norm_props():
+            for index in range(20):
+                taken.append(index)
+                level = "Critical" if index == 1 else "Low"
+                yield NormativeProposition(proposition_value=f"{level} proposition {index}.")
+
+        def critical_found(analyses):
+            return any(analysis.RiskLevel == "Critical" for analysis in analyses)
+
+        analyses = executor.analyse(norm_props(), self.agent, critical_found)
+        executor.shutdown()
+        self.assertTrue(critical_found(analyses))
+        # the rest of the propositions were never taken
+        self.assertLess(len(taken), 20)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(NormativeException):
+            ConflictAnalysisExecutor.create("carrier-pigeon")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import unittest
+
+import ray
+
+from src.tallmountain.normative.analysis.conflict_analysis_pool import ConflictAnalysisPool
+from src.tallmountain.normative.entities.comprehensiveness import Comprehensiveness
+from src.tallmountain.normative.entities.endeavour import Endeavour
+from src.tallmountain.normative.normative_agent import NormativeAgent
+
+
+class TestConflictAnalysisPool(unittest.TestCase):
+
+    def test_context_key(self):
+        agent = NormativeAgent()
+        self.assertEqual(
+            ConflictAnalysisPool.context_key(agent),
+            ConflictAnalysisPool.context_key(NormativeAgent()),
+        )
+        agent.system_endeavours.append(
+            Endeavour.create(
+                "Extra Endeavour", "Another endeavour", comprehensiveness=Comprehensiveness.LOW
+            )
+        )
+        self.assertNotEqual(
+            ConflictAnalysisPool.context_key(agent),
+            ConflictAnalysisPool.context_key(NormativeAgent()),
+        )
+
+    def test_instance_is_shared(self):
+        try:
+            pool = ConflictAnalysisPool.instance(NormativeAgent())
+            self.assertEqual(len(pool.actors), ConflictAnalysisPool.POOL_SIZE)
+            # a freshly loaded agent with the same endeavours reuses the warm actors
+            self.assertIs(ConflictAnalysisPool.instance(NormativeAgent()), pool)
+            ray.shutdown()
+            # the actors went with the old ray session
+            self.assertIsNot(ConflictAnalysisPool.instance(NormativeAgent()), pool)
+        finally:
+            ConflictAnalysisPool.reset()
+            ray.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.test.test_conflict_analysis_executor import analysis
+from src.test.test_normative_pre_scorer import RecordingLLM, norm_prop
+from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.normative.analysis.conflict_analysis_pool import ConflictAnalysisPool
+from src.tallmountain.normative.analysis.np_conflict_analyser import NormativeConflictAnalyser
+from src.tallmountain.normative.endeavour_registry import EndeavourRegistry
+from src.tallmountain.normative.normative_proposition import Level, Operator
+from src.tallmountain.util.config_util import ConfigUtil
+from src.tallmountain.util.file_path_util import FilePathUtil
+
+
+def describe_first(endeavours) -> None:
+    endeavours["endeavours"][0]["description"] = "A changed description."
+
+
+class TestEndeavourRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.highest_path = os.path.join(self.directory, "highest_endeavour.json")
+        self.system_path = os.path.join(self.directory, "system_endeavours.json")
+        for source, target in [
+            (ConfigUtil.HIGHEST_ENDEAVOUR_JSON, self.highest_path),
+            (ConfigUtil.SYSTEM_ENDEAVOURS_JSON, self.system_path),
+        ]:
+            shutil.copy(FilePathUtil.append_path_to_repo_path(source), target)
+        # checks the files on every call
+        self.registry = EndeavourRegistry(
+            self.highest_path, self.system_path, watch=True, poll_seconds=0
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def edit_system_endeavours(self, edit) -> None:
+        with open(self.system_path) as file:
+            endeavours = json.load(file)
+        edit(endeavours)
+        with open(self.system_path, "w") as file:
+            json.dump(endeavours, file)
+        self.touch(self.system_path)
+
+    @staticmethod
+    def touch(path: str) -> None:
+        # so the change is seen even within the file system's timestamp resolution
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_unchanged_content_keeps_the_agent(self):
+        agent = self.registry.agent()
+        self.assertTrue(agent.frozen)
+        # rewritten with the same content and a new mtime
+        content = FilePathUtil.load_file_as_string(self.system_path)
+        with open(self.system_path, "w") as file:
+            file.write(content)
+        self.touch(self.system_path)
+        self.assertIs(self.registry.agent(), agent)
+        self.assertEqual(self.registry.fingerprint, agent.fingerprint)
+
+    def test_changed_content_swaps_the_agent(self):
+        agent = self.registry.agent()
+        self.edit_system_endeavours(describe_first)
+        reloaded = self.registry.agent()
+        self.assertIsNot(reloaded, agent)
+        self.assertNotEqual(reloaded.fingerprint, agent.fingerprint)
+        self.assertIn("A changed description.", reloaded.system_endeavours_to_md())
+        self.assertNotEqual(
+            ConflictAnalysisPool.context_key(agent), ConflictAnalysisPool.context_key(reloaded)
+        )
+
+    def test_broken_file_keeps_the_agent(self):
+        agent = self.registry.agent()
+        with open(self.system_path, "w") as file:
+            file.write('{"endeavours": [')
+        self.assertIs(self.registry.agent(), agent)
+        with self.assertRaises(NormativeException):
+            EndeavourRegistry(self.highest_path, self.system_path)
+
+    def test_unwatched(self):
+        registry = EndeavourRegistry(self.highest_path, self.system_path, watch=False)
+        agent = registry.agent()
+        self.edit_system_endeavours(describe_first)
+        self.assertIs(registry.agent(), agent)
+        self.assertTrue(registry.reload())
+        self.assertIsNot(registry.agent(), agent)
+
+    def test_stale_analyses(self):
+        analyser = NormativeConflictAnalyser(llm=RecordingLLM(analysis("A rhyme.", "Low")))
+        proposition = norm_prop("The poem ought to rhyme.", Operator.OUGHT, Level.AESTHETIC)
+        analysed = analyser.analyse(proposition, self.registry.agent())
+        self.assertEqual(analysed.EndeavourFingerprint, self.registry.fingerprint)
+        self.assertEqual(self.registry.stale([analysed]), [])
+        self.edit_system_endeavours(describe_first)
+        self.assertEqual(self.registry.stale([analysed]), [analysed])
+        self.assertFalse(self.registry.is_current(analysed.EndeavourFingerprint))
+
+
+if __name__ == "__main__":
+    unittest.main()
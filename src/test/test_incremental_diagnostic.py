@@ -0,0 +1,95 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import tempfile
+import unittest
+
+from src.tallmountain.normative.analysis.incremental_diagnostic import (
+    GroupDiagnostic,
+    IncrementalSelfDiagnostic,
+)
+from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import NormativeProposition
+
+
+class CountingDiagnostic(IncrementalSelfDiagnostic):
+    """Passes every group without the LLM, failing any with a proposition marked CONFLICT."""
+
+    def check(self, group, level, fingerprint) -> GroupDiagnostic:
+        failed = any("CONFLICT" in np.proposition_value for np in group.normative_propositions)
+        return self.result(
+            group, level, fingerprint, "False" if failed else "True", "Checked locally."
+        )
+
+
+class TestIncrementalSelfDiagnostic(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.diagnostic = CountingDiagnostic(
+            matrix_path=os.path.join(self.directory.name, "matrix.json")
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_groups(self):
+        agent = NormativeAgent()
+        groups = IncrementalSelfDiagnostic.groups(agent)
+        self.assertEqual(
+            sum(len(group.normative_propositions) for group in groups.values()),
+            len(agent.propositions()),
+        )
+        for (uuid, level), group in groups.items():
+            self.assertEqual(group.uuid, uuid)
+            self.assertTrue(all(np.level == level for np in group.normative_propositions))
+
+    def test_only_changed_groups_are_checked(self):
+        agent = NormativeAgent()
+        groups = IncrementalSelfDiagnostic.groups(agent)
+        multi = [key for key, group in groups.items() if len(group.normative_propositions) > 1]
+        result = self.diagnostic.diagnose(agent)
+        self.assertEqual(result.PassedDiagnostic, "True")
+        self.assertEqual(len(self.diagnostic.checked), len(multi))
+        # nothing changed, nothing checked
+        self.diagnostic.diagnose(agent)
+        self.assertEqual(self.diagnostic.checked, [])
+        # a proposition added to one endeavour only rechecks its level there
+        edited = NormativeAgent()
+        endeavour = edited.system_endeavours[0]
+        level = endeavour.normative_propositions[0].level
+        endeavour.normative_propositions.append(
+            NormativeProposition(proposition_value="A CONFLICT with the others.", level=level)
+        )
+        result = self.diagnostic.diagnose(edited)
+        self.assertEqual(
+            self.diagnostic.checked, [IncrementalSelfDiagnostic.group_key(endeavour.uuid, level)]
+        )
+        self.assertEqual(result.PassedDiagnostic, "False")
+        self.assertIn(endeavour.name, result.Analysis)
+        self.assertIn("FAIL", result.Analysis)
+        # back to the original norms, the group's old result no longer matches so it is rechecked
+        self.assertEqual(self.diagnostic.diagnose(agent).PassedDiagnostic, "True")
+        self.assertEqual(len(self.diagnostic.checked), 1)
+
+    def test_matrix_to_md(self):
+        agent = NormativeAgent()
+        self.diagnostic.diagnose(agent)
+        md = IncrementalSelfDiagnostic.matrix_to_md(self.diagnostic.load_matrix())
+        self.assertIn(agent.highest_endeavour.name, md)
+        self.assertNotIn("FAIL", md)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import unittest
+
+from src.tallmountain.normative.analysis.impact_assessment import (
+    ImpactAssessment,
+    ImpactAssessmentResult,
+)
+from src.tallmountain.normative.analysis.intent_impact_assessor import (
+    IntentImpactAnalysis,
+    IntentImpactAssessor,
+)
+from src.tallmountain.normative.analysis.user_intent import (
+    UserIntent,
+    UserIntentAnalysis,
+)
+
+
+class TestIntentImpactAssessor(unittest.TestCase):
+
+    def test_build_messages(self):
+        user_query = "I would like to know how to make a cake"
+        prompt = IntentImpactAssessor().build_messages(user_query).messages[0]["content"]
+        # the task is sent once, after the instructions for both scores
+        self.assertEqual(prompt.count(user_query), 1)
+        self.assertIn(UserIntent.instructions().strip(), prompt)
+        self.assertIn(ImpactAssessment.instructions().strip(), prompt)
+        self.assertGreater(prompt.index(user_query), prompt.index("=== IMPACT ASSESSMENT SCORE"))
+
+    def test_analyse(self):
+        user_query = "I would like to know how to make a cake"
+        analysis = IntentImpactAssessor().analyse(user_query)
+        self.assertIsInstance(analysis, IntentImpactAnalysis)
+        self.assertIsInstance(analysis.UserIntent, UserIntentAnalysis)
+        self.assertIsInstance(analysis.ImpactAssessment, ImpactAssessmentResult)
+
+
+if __name__ == "__main__":
+    unittest.main()
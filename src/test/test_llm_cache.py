@@ -0,0 +1,128 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from pydantic import BaseModel
+
+from src.tallmountain.llm.llm_cache import LLMCache
+from src.tallmountain.llm.llm_client import LLMClient
+from src.tallmountain.llm.llm_facade import LLM
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+
+
+class Answer(BaseModel):
+    Answer: str
+
+
+class CountingLLMClient(LLMClient):
+    """Returns canned responses and counts the calls that reach it."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._model = "counting-model"
+        self.calls = 0
+
+    def do_instructor(self, messages, response_model, mode):
+        self.calls += 1
+        return response_model(Answer="Orange who?")
+
+    def do_string(self, messages, mode) -> str:
+        self.calls += 1
+        return "Orange who?"
+
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.messages = LLMMessages().build("Orange.", LLMMessages.USER).messages
+        self.mode = AdaptiveRequestMode.instance()
+
+    def test_key_depends_on_request(self) -> None:
+        key = LLMCache.make_key(LLMCache.STRING, "model", self.messages, self.mode, None)
+        self.assertEqual(
+            key, LLMCache.make_key(LLMCache.STRING, "model", self.messages, self.mode, None)
+        )
+        self.assertNotEqual(
+            key, LLMCache.make_key(LLMCache.STRING, "other", self.messages, self.mode, None)
+        )
+        self.assertNotEqual(
+            key,
+            LLMCache.make_key(
+                LLMCache.STRING, "model", self.messages, AdaptiveRequestMode.precision_mode(), None
+            ),
+        )
+
+    def test_memory_tier_evicts_least_recently_used(self) -> None:
+        cache = LLMCache([LLMCache.STRING], memory_max_entries=2)
+        cache.put(LLMCache.STRING, "a", "1")
+        cache.put(LLMCache.STRING, "b", "2")
+        cache.get(LLMCache.STRING, "a")
+        cache.put(LLMCache.STRING, "c", "3")
+        self.assertEqual(cache.get(LLMCache.STRING, "a"), "1")
+        self.assertIsNone(cache.get(LLMCache.STRING, "b"))
+        self.assertEqual(cache.stats()["string.misses"], 1)
+
+    def test_disabled_call_type_is_not_cached(self) -> None:
+        cache = LLMCache([LLMCache.INSTRUCTOR], memory_max_entries=2)
+        cache.put(LLMCache.STRING, "a", "1")
+        self.assertIsNone(cache.get(LLMCache.STRING, "a"))
+
+    def test_disk_tier_persists_and_evicts(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "llm_cache.sqlite3")
+            cache = LLMCache([LLMCache.STRING], 16, db_path, 3600, disk_max_entries=2)
+            for key in ["a", "b", "c"]:
+                cache.put(LLMCache.STRING, key, key.upper())
+            self.assertEqual(len(cache.disk_tier), 2)
+            reopened = LLMCache([LLMCache.STRING], 16, db_path, 3600, disk_max_entries=2)
+            self.assertEqual(reopened.get(LLMCache.STRING, "c"), "C")
+            self.assertEqual(reopened.stats()["string.hits.disk"], 1)
+
+    def test_broken_disk_tier_is_a_miss(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "llm_cache.sqlite3")
+            cache = LLMCache([LLMCache.STRING], 16, db_path, 3600, disk_max_entries=2)
+            cache.put(LLMCache.STRING, "a", "A")
+            cache.memory_tier.clear()
+            # the table going away makes every disk tier query fail
+            connection = sqlite3.connect(db_path)
+            connection.execute("DROP TABLE llm_cache")
+            connection.commit()
+            connection.close()
+            self.assertIsNone(cache.get(LLMCache.STRING, "a"))
+            self.assertEqual(cache.stats()["string.misses"], 1)
+            cache.put(LLMCache.STRING, "b", "B")
+            self.assertEqual(cache.get(LLMCache.STRING, "b"), "B")
+
+    def test_facade_serves_repeat_instructor_calls_from_cache(self) -> None:
+        llm = LLM()
+        llm._cache = LLMCache([LLMCache.INSTRUCTOR], memory_max_entries=16)
+        client = CountingLLMClient()
+        llm._wrapped_llm_client = client
+        first = llm.do_instructor(self.messages, Answer)
+        second = llm.do_instructor(self.messages, Answer)
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(first, second)
+        self.assertIsInstance(second, Answer)
+        # string completions are not switched on in this cache
+        llm.do_string_completion(self.messages)
+        llm.do_string_completion(self.messages)
+        self.assertEqual(client.calls, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
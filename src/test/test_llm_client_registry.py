@@ -0,0 +1,60 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import concurrent.futures
+import os
+import tempfile
+import unittest
+
+from src.tallmountain.llm.clients.async_openai import AsyncOpenAIClient
+from src.tallmountain.llm.clients.openai import OpenAIClient
+from src.tallmountain.llm.llm_client_registry import LLMClientRegistry
+
+
+class TestLLMClientRegistry(unittest.TestCase):
+    def test_get_or_create_builds_once(self) -> None:
+        calls = []
+
+        def builder() -> object:
+            calls.append(1)
+            return object()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [
+                executor.submit(LLMClientRegistry.get_or_create, "test.registry", builder)
+                for _ in range(32)
+            ]
+            clients = [future.result() for future in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(client is clients[0] for client in clients))
+
+    def test_openai_clients_are_shared(self) -> None:
+        client_a = OpenAIClient()
+        client_b = OpenAIClient()
+        self.assertIs(client_a.client, client_b.client)
+        self.assertIs(client_a.instructor_client, client_b.instructor_client)
+
+    def test_openai_clients_follow_the_configured_base_url(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            config_file = os.path.join(directory, "app.ini")
+            with open(config_file, "w") as file:
+                file.write("[llm]\nbase_url = http://127.0.0.1:10001/v1\n")
+            client = OpenAIClient.build_openai_client(config_file)
+            async_client = AsyncOpenAIClient.build_async_openai_client(config_file)
+        self.assertEqual(str(client.base_url), "http://127.0.0.1:10001/v1/")
+        self.assertEqual(str(async_client.base_url), "http://127.0.0.1:10001/v1/")
+
+
+if __name__ == "__main__":
+    unittest.main()
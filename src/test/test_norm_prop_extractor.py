@@ -11,14 +11,79 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import asyncio
+import copy
 import unittest
-from typing import List
+from typing import (
+    Any,
+    List,
+)
+
+from lxml import etree  # nosec
 
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.exceptions.normative_exception import NormativeException
+from src.tallmountain.llm.xml_schema_registry import XMLSchemaRegistry
+from src.tallmountain.llm.xstructor import XStructor
 from src.tallmountain.normative.analysis.np_extractor import (
     NormativeAnalysisResults,
     NormPropExtractor,
 )
-from src.tallmountain.normative.normative_proposition import NormativeProposition
+from src.tallmountain.normative.normative_proposition import (
+    Level,
+    ModalitySubscript,
+    NormativeProposition,
+    Operator,
+)
+from src.test.test_xml_stream_validator import (
+    AsyncStreamingLLMClient,
+    StreamingLLMClient,
+)
+
+
+def three_propositions(second_level: str) -> str:
+    """The extraction example with a third proposition, and the second at the level given."""
+    element = etree.XML(NormPropExtractor.np_extraction_example.strip())
+    propositions = element.find("implied_propositions")
+    third = copy.deepcopy(propositions[1])
+    third.find("proposition-value").text = "Proposition C"
+    propositions.append(third)
+    propositions[1].find("level").text = second_level
+    return etree.tostring(element, encoding="unicode")
+
+
+class StreamingLLM:
+    """Stands in for the LLM facade, streaming one response and extracting another in full."""
+
+    def __init__(self, streamed: str, extracted: str) -> None:
+        self.client = StreamingLLMClient([streamed])
+        self.extracted = extracted
+        self.extractions = 0
+
+    def do_xstructor_stream(self, messages, xml_example, xml_schema, element_tag, options=None):
+        return XStructor(self.client).stream_elements(
+            messages, xml_example, xml_schema, element_tag, options=options
+        )
+
+    def do_xstructor_element(self, messages, xml_example, xml_schema, options=None):
+        self.extractions += 1
+        if self.extracted is None:
+            raise LLMException("Failed to generate valid XML")
+        return etree.XML(self.extracted)
+
+
+class AsyncStreamingLLM(StreamingLLM):
+    def __init__(self, streamed: str, extracted: str) -> None:
+        super().__init__(streamed, extracted)
+        self.client = AsyncStreamingLLMClient([streamed])
+
+    def do_xstructor_stream(self, messages, xml_example, xml_schema, element_tag, options=None):
+        return XStructor(self.client).stream_elements_async(
+            messages, xml_example, xml_schema, element_tag, options=options
+        )
+
+    async def do_xstructor_element(self, messages, xml_example, xml_schema, options=None):
+        return StreamingLLM.do_xstructor_element(self, messages, xml_example, xml_schema)
 
 
 class TestNormPropExtractor(unittest.TestCase):
@@ -47,6 +112,81 @@ class TestNormPropExtractor(unittest.TestCase):
         results = NormPropExtractor().do_xml_extraction(user_query=user_query)
         self.assertIsNotNone(results)
 
+    def test_element_to_normative_propositions(self) -> None:
+        extractor = NormPropExtractor()
+        element = etree.XML(extractor.np_extraction_example.strip())
+        results = extractor.element_to_normative_propositions(element)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0].proposition_value, "Proposition A")
+        self.assertEqual(results[0].operator, Operator.REQUIRED)
+        self.assertEqual(results[1].level, Level.SCIENTIFIC_TECHNICAL)
+        self.assertEqual(results[1].modal_subscript, ModalitySubscript.PRACTICAL)
+
+    def test_is_valid_proposition(self) -> None:
+        extractor = NormPropExtractor()
+        element = etree.XML(extractor.np_extraction_example.strip())
+        proposition = element.find("implied_propositions/NormativeProposition")
+        self.assertTrue(extractor.is_valid_proposition(proposition))
+        proposition.remove(proposition.find("level"))
+        self.assertFalse(extractor.is_valid_proposition(proposition))
+
+    def test_stream_falls_back_after_an_invalid_proposition(self) -> None:
+        llm: Any = StreamingLLM(three_propositions("ETHICS"), three_propositions("ETHICAL_MORAL"))
+        propositions = list(NormPropExtractor(llm=llm).stream_normative_propositions("A query."))
+        # the first was streamed and the rest came from the full extraction, with no repeats
+        self.assertEqual(
+            [np.proposition_value for np in propositions],
+            ["Proposition A", "Proposition B", "Proposition C"],
+        )
+        self.assertEqual(propositions[1].level, Level.ETHICAL_MORAL)
+        self.assertEqual(llm.extractions, 1)
+
+    def test_stream_falls_back_after_a_proposition_missing_a_value(self) -> None:
+        element = etree.XML(three_propositions("LEGAL"))
+        second = element.find("implied_propositions")[1]
+        second.remove(second.find("level"))
+        llm: Any = StreamingLLM(
+            etree.tostring(element, encoding="unicode"), three_propositions("LEGAL")
+        )
+        propositions = list(NormPropExtractor(llm=llm).stream_normative_propositions("A query."))
+        self.assertEqual(len(propositions), 3)
+        self.assertEqual(propositions[1].level, Level.LEGAL)
+
+    def test_stream_raises_when_the_fallback_fails(self) -> None:
+        llm: Any = StreamingLLM(three_propositions("ETHICS"), None)
+        streamed = []
+        with self.assertRaises(NormativeException):
+            for proposition in NormPropExtractor(llm=llm).stream_normative_propositions("A query."):
+                streamed.append(proposition)
+        self.assertEqual([np.proposition_value for np in streamed], ["Proposition A"])
+
+    def test_async_stream_falls_back_after_an_invalid_proposition(self) -> None:
+        llm: Any = AsyncStreamingLLM(
+            three_propositions("ETHICS"), three_propositions("ETHICAL_MORAL")
+        )
+        extractor = NormPropExtractor(async_llm=llm)
+
+        async def stream() -> List[NormativeProposition]:
+            return [np async for np in extractor.stream_normative_propositions_async("A query.")]
+
+        propositions = asyncio.run(stream())
+        self.assertEqual(len(propositions), 3)
+        self.assertEqual(propositions[1].level, Level.ETHICAL_MORAL)
+
+    def test_task_extraction_schema(self) -> None:
+        extractor = NormPropExtractor()
+        schema = extractor.task_extraction_schema.strip()
+        element = etree.XML(extractor.task_extraction_example.strip())
+        self.assertTrue(XMLSchemaRegistry.validate(schema, element))
+        self.assertEqual(extractor.task_element(element).findtext("name"), "Example task")
+        self.assertEqual(len(extractor.element_to_normative_propositions(element)), 2)
+        # the fused extraction has to include the task
+        self.assertFalse(
+            XMLSchemaRegistry.validate(schema, etree.XML(extractor.np_extraction_example.strip()))
+        )
+        prompt = extractor.build_messages("Tell me a joke", with_task=True).messages[-1]["content"]
+        self.assertIn("Describe the Task", prompt)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -11,11 +11,14 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import dataclasses
+import pickle
 import unittest
 
+from src.tallmountain.exceptions.normative_exception import NormativeException
 from src.tallmountain.normative.entities.endeavour import Endeavour
 from src.tallmountain.normative.normative_agent import NormativeAgent
-from src.tallmountain.normative.normative_proposition import NormativeProposition
+from src.tallmountain.normative.normative_proposition import Level, NormativeProposition
 
 
 class TestNormativeAgent(unittest.TestCase):
@@ -48,6 +51,80 @@ class TestNormativeAgent(unittest.TestCase):
         print(agent.system_endeavours_to_md())
         self.assertIsNotNone(agent.system_endeavours_to_md())
 
+    def test_endeavour_uuids_are_stable(self):
+        first = NormativeAgent()
+        second = NormativeAgent()
+        self.assertEqual(first.highest_endeavour.uuid, second.highest_endeavour.uuid)
+        self.assertEqual(
+            [endeavour.uuid for endeavour in first.system_endeavours],
+            [endeavour.uuid for endeavour in second.system_endeavours],
+        )
+        self.assertEqual(first.system_endeavours_to_md(), second.system_endeavours_to_md())
+
+    def test_instance_is_shared_and_frozen(self):
+        agent = NormativeAgent.instance()
+        self.assertIs(NormativeAgent.instance(), agent)
+        self.assertTrue(agent.frozen)
+        with self.assertRaises(NormativeException):
+            agent.system_endeavours = []
+        with self.assertRaises(AttributeError):
+            agent.system_endeavours.append(Endeavour.create("Extra", "Another endeavour"))
+        # the same markdown as a freshly loaded agent, from the one rendering
+        self.assertEqual(
+            agent.system_endeavours_to_md(), NormativeAgent().system_endeavours_to_md()
+        )
+        self.assertIs(agent.system_endeavours_to_md(), agent.system_endeavours_to_md())
+
+    def test_freeze_is_deep(self):
+        agent = NormativeAgent(frozen=True)
+        endeavour = agent.system_endeavours[0]
+        with self.assertRaises(NormativeException):
+            endeavour.description = "A changed description."
+        with self.assertRaises(AttributeError):
+            endeavour.normative_propositions.append(endeavour.normative_propositions[0])
+        with self.assertRaises(NormativeException):
+            endeavour.normative_propositions[0].level = Level.ETHICAL_MORAL
+        # a copy made from a frozen endeavour can be changed
+        copy = dataclasses.replace(endeavour, normative_propositions=[])
+        copy.description = "A changed description."
+        self.assertNotEqual(copy.description, endeavour.description)
+
+    def test_indexes(self):
+        for agent in [NormativeAgent(), NormativeAgent.instance()]:
+            propositions = agent.propositions()
+            self.assertEqual(
+                len(propositions), sum(len(e.normative_propositions) for e in agent.endeavours())
+            )
+            first = propositions[0]
+            self.assertEqual(agent.proposition_by_uuid(first.uuid), first)
+            self.assertEqual(
+                agent.endeavour_by_uuid(agent.highest_endeavour.uuid), agent.highest_endeavour
+            )
+            self.assertIsNone(agent.proposition_by_uuid("missing"))
+            for level in Level:
+                self.assertTrue(all(np.level == level for np in agent.propositions_at(level)))
+            self.assertEqual(
+                sum(len(agent.propositions_at(level)) for level in Level), len(propositions)
+            )
+
+    def test_cached(self):
+        calls = []
+        agent = NormativeAgent(frozen=True)
+        self.assertEqual(agent.cached("key", lambda: calls.append(1) or len(calls)), 1)
+        self.assertEqual(agent.cached("key", lambda: calls.append(1) or len(calls)), 1)
+        # an unfrozen agent may have changed, so computes every time
+        unfrozen = NormativeAgent()
+        self.assertEqual(unfrozen.cached("key", lambda: calls.append(1) or len(calls)), 2)
+        self.assertEqual(unfrozen.cached("key", lambda: calls.append(1) or len(calls)), 3)
+
+    def test_pickle(self):
+        agent = NormativeAgent(frozen=True)
+        agent.cached("key", lambda: "value")
+        copy = pickle.loads(pickle.dumps(agent))
+        self.assertTrue(copy.frozen)
+        self.assertEqual(copy.highest_endeavour_to_md(), agent.highest_endeavour_to_md())
+        self.assertEqual(copy.cached("key", lambda: "recomputed"), "recomputed")
+
 
 if __name__ == "__main__":
     unittest.main()
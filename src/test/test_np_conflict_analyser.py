@@ -11,14 +11,18 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import json
 import unittest
 
 from src.tallmountain.normative.analysis.np_conflict_analyser import (
+    BatchedConflictAnalysis,
     NormativeConflictAnalyser,
     NormativeConflictAnalysis,
+    NormativeConflictBatch,
 )
 from src.tallmountain.normative.entities.user_task import UserTask
 from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import NormativeProposition
 
 
 class TestNormPropConflictAnalyser(unittest.TestCase):
@@ -32,6 +36,93 @@ class TestNormPropConflictAnalyser(unittest.TestCase):
         result = analyser.analyse(user_task.normative_propositions[0], agent)
         self.assertIsInstance(result, NormativeConflictAnalysis)
 
+    def test_prompts_share_a_static_prefix(self):
+        analyser = NormativeConflictAnalyser()
+        agent = NormativeAgent()
+        first = NormativeProposition(proposition_value="People should be honest.")
+        second = NormativeProposition(proposition_value="Cats should be kept indoors.")
+        first_prompt = analyser.build_messages(first, agent).messages[-1]["content"]
+        second_prompt = analyser.build_messages(second, agent).messages[-1]["content"]
+        static_context = analyser.static_context(agent)
+        self.assertTrue(first_prompt.startswith(static_context))
+        self.assertTrue(second_prompt.startswith(static_context))
+        self.assertNotIn(str(first.uuid), first_prompt)
+
+    def test_analyse_batch(self):
+        analyser = NormativeConflictAnalyser()
+        agent = NormativeAgent()
+        user_task = UserTask.get_from_query(
+            "I like to use a cat as a punchbag as it helps me be a better dad"
+        )
+        results = analyser.analyse_batch(user_task.normative_propositions, agent)
+        self.assertEqual(len(results), len(user_task.normative_propositions))
+        for result in results:
+            self.assertIsInstance(result, NormativeConflictAnalysis)
+
+    def test_match_batch(self):
+        analyser = NormativeConflictAnalyser()
+        norm_props = [
+            NormativeProposition(proposition_value="People should be honest."),
+            NormativeProposition(proposition_value="Cats should be kept indoors."),
+            NormativeProposition(proposition_value="Dogs should be walked daily."),
+        ]
+
+        def item(index: int, value: str) -> BatchedConflictAnalysis:
+            return BatchedConflictAnalysis(
+                PropositionIndex=index,
+                UserNormPropValue=value,
+                Likelihood=1,
+                ImpactScore=1,
+                NormAlignmentScore=5,
+                ContextMultiplier=1.0,
+                RiskScore=-9.0,
+                RiskLevel="Low",
+                Analysis="No conflict.",
+            )
+
+        batch = NormativeConflictBatch(
+            Analyses=[
+                item(0, "people should be honest. "),
+                # the wrong proposition value
+                item(1, "Cats should be let out."),
+                # duplicated and out of range indexes
+                item(2, "Dogs should be walked daily."),
+                item(2, "Dogs should be walked daily."),
+                item(7, "Cats should be kept indoors."),
+            ]
+        )
+        analyses = analyser.match_batch(norm_props, batch)
+        self.assertIsInstance(analyses[0], NormativeConflictAnalysis)
+        self.assertNotIsInstance(analyses[0], BatchedConflictAnalysis)
+        self.assertEqual(analyses[1:], [None, None])
+        self.assertEqual(analyser.match_batch(norm_props, None), [None, None, None])
+
+    def test_batch_prompt_shares_the_static_prefix(self):
+        analyser = NormativeConflictAnalyser()
+        agent = NormativeAgent()
+        norm_props = [
+            NormativeProposition(proposition_value="People should be honest."),
+            NormativeProposition(proposition_value="Cats should be kept indoors."),
+        ]
+        prompt = analyser.build_batch_messages(norm_props, agent).messages[-1]["content"]
+        self.assertTrue(prompt.startswith(analyser.static_context(agent)))
+        self.assertIn("USER NORM PROP 1", prompt)
+
+    def test_fingerprint_is_not_asked_of_the_llm(self):
+        for model in [NormativeConflictAnalysis, NormativeConflictBatch]:
+            self.assertNotIn("EndeavourFingerprint", json.dumps(model.model_json_schema()))
+        analysis = NormativeConflictAnalysis(
+            UserNormPropValue="People should be honest.",
+            Likelihood=1,
+            ImpactScore=1,
+            NormAlignmentScore=5,
+            ContextMultiplier=1.0,
+            RiskScore=-9.0,
+            RiskLevel="Low",
+            Analysis="An analysis.",
+        )
+        self.assertIsNone(analysis.EndeavourFingerprint)
+
 
 if __name__ == "__main__":
     unittest.main()
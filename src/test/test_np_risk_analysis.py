@@ -11,6 +11,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import asyncio
 import unittest
 from typing import List
 
@@ -18,6 +19,12 @@ from src.tallmountain.normative.analysis.norm_risk_analysis import NormativeRisk
 from src.tallmountain.normative.analysis.np_conflict_analyser import NormativeConflictAnalysis
 from src.tallmountain.normative.entities.user_task import UserTask
 from src.tallmountain.normative.normative_agent import NormativeAgent
+from src.tallmountain.normative.normative_proposition import NormativeProposition
+from src.test.test_conflict_analysis_executor import (
+    FakeConflictAnalysisExecutor,
+    RiskLevel,
+    analysis,
+)
 
 
 class TestNormPropRiskProfile(unittest.TestCase):
@@ -47,6 +54,57 @@ class TestNormPropRiskProfile(unittest.TestCase):
         risk_analysis.analyse(user_task, agent)
         self.assertIsNotNone(risk_analysis.explain())
 
+    def test_recommend_action_thresholds(self):
+        risk_analysis = NormativeRiskAnalysis()
+        low = [analysis("A", "Low"), analysis("B", "Low")]
+        self.assertEqual(risk_analysis.ACCEPT_AND_EXECUTE, risk_analysis.recommend_action(low))
+        # the thresholds are the numbers allowed
+        moderates = [analysis("M", "Moderate")] * (risk_analysis.MAX_MODERATE + 1)
+        self.assertEqual(
+            risk_analysis.SUGGEST_MODIFICATION, risk_analysis.recommend_action(moderates)
+        )
+        critical = low + [analysis("C", "Critical")] * (risk_analysis.MAX_CRITICAL + 1)
+        self.assertEqual(risk_analysis.REJECT, risk_analysis.recommend_action(critical))
+
+    def test_early_exit(self):
+        executor = FakeConflictAnalysisExecutor(max_in_flight=2)
+        closed = []
+
+        def norm_props():
+            try:
+                for index in range(20):
+                    level = "Critical" if index == 0 else "Low"
+                    yield NormativeProposition(proposition_value=f"{level} proposition {index}.")
+            finally:
+                closed.append(True)
+
+        risk_analysis = NormativeRiskAnalysis(executor=executor, early_exit=True)
+        analyses = risk_analysis.analyse_stream(norm_props(), NormativeAgent())
+        executor.shutdown()
+        self.assertTrue(risk_analysis.decided_early)
+        self.assertLess(len(analyses), 20)
+        self.assertEqual(closed, [True])
+        self.assertEqual(risk_analysis.REJECT, risk_analysis.recommendation)
+
+    def test_gather_until_decided(self):
+        async def analyse(value: str, risk_level: RiskLevel, delay: float):
+            await asyncio.sleep(delay)
+            return analysis(value, risk_level)
+
+        async def gather():
+            tasks = [
+                asyncio.create_task(analyse("Quick and critical", "Critical", 0.01)),
+                asyncio.create_task(analyse("Slow", "Low", 5)),
+            ]
+            analyses = await risk_analysis.gather_until_decided(tasks)
+            return analyses, tasks
+
+        risk_analysis = NormativeRiskAnalysis(early_exit=True)
+        analyses, tasks = asyncio.run(gather())
+        self.assertEqual([a.UserNormPropValue for a in analyses], ["Quick and critical"])
+        self.assertTrue(tasks[1].cancelled())
+        self.assertTrue(risk_analysis.decided_early)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,137 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.clients.async_replay import AsyncReplayLLMClient
+from src.tallmountain.llm.clients.replay import Cassette, LatencySampler, ReplayLLMClient
+from src.tallmountain.llm.llm_client import LLMClient
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.modes.adaptive_request_mode import AdaptiveRequestMode
+from src.test.test_xstructor import xml_example_str, xml_schema_str
+
+
+class Answer(BaseModel):
+    Answer: str
+
+
+def chat_completion(content: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+        }
+    )
+
+
+class RecordingLLMClient(LLMClient):
+    """Stands in for a live provider while recording."""
+
+    def do_instructor(self, messages, response_model, mode):
+        return response_model(Answer="Orange who?")
+
+    def do_completion(self, messages, mode):
+        return chat_completion(f"```xml\n{xml_example_str}\n```")
+
+
+class TestReplayLLMClient(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cassette_path = os.path.join(self.temp_dir.name, "cassette.jsonl")
+        self.messages = LLMMessages().build("Orange.", LLMMessages.USER).messages
+        self.mode = AdaptiveRequestMode.instance()
+        self.no_latency = LatencySampler(LatencySampler.NONE, 0, 0)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def record(self) -> None:
+        recorder = ReplayLLMClient(
+            cassette=Cassette(self.cassette_path),
+            record_mode=ReplayLLMClient.RECORD,
+            latency=self.no_latency,
+            recording_client=RecordingLLMClient(),
+        )
+        recorder.do_instructor(self.messages, Answer, self.mode)
+        recorder.do_xstructor(self.messages, xml_example_str, xml_schema_str, self.mode)
+
+    def test_record_then_replay(self) -> None:
+        self.record()
+        replayer = ReplayLLMClient(
+            cassette=Cassette(self.cassette_path),
+            record_mode=ReplayLLMClient.REPLAY,
+            latency=self.no_latency,
+        )
+        self.assertEqual(
+            replayer.do_instructor(self.messages, Answer, self.mode).Answer, "Orange who?"
+        )
+        xml = replayer.do_xstructor(self.messages, xml_example_str, xml_schema_str, self.mode)
+        self.assertEqual(xml.strip(), xml_example_str.strip())
+        with self.assertRaises(LLMException):
+            replayer.do_string(LLMMessages().build("Other.", LLMMessages.USER).messages, self.mode)
+
+    def test_async_replay(self) -> None:
+        self.record()
+        replayer = AsyncReplayLLMClient(
+            cassette=Cassette(self.cassette_path),
+            record_mode=ReplayLLMClient.REPLAY,
+            latency=self.no_latency,
+        )
+        answer = asyncio.run(replayer.do_instructor(self.messages, Answer, self.mode))
+        self.assertEqual(answer.Answer, "Orange who?")
+
+    def test_streamed_replay(self) -> None:
+        recorder = ReplayLLMClient(
+            cassette=Cassette(self.cassette_path),
+            record_mode=ReplayLLMClient.RECORD,
+            latency=self.no_latency,
+            recording_client=RecordingLLMClient(),
+        )
+        recorded = recorder.do_string(self.messages, self.mode)
+        replayer = ReplayLLMClient(
+            cassette=Cassette(self.cassette_path),
+            record_mode=ReplayLLMClient.REPLAY,
+            latency=self.no_latency,
+        )
+        chunks = list(replayer.do_string_stream(self.messages, self.mode))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunk for _, chunk in chunks), recorded)
+
+    def test_latency_sampler(self) -> None:
+        sampler = LatencySampler(LatencySampler.LOGNORMAL, 100, 50, seed=1)
+        samples = [sampler.sample() for _ in range(2000)]
+        self.assertTrue(all(sample > 0 for sample in samples))
+        self.assertAlmostEqual(sum(samples) / len(samples), 0.1, delta=0.01)
+        recorded = LatencySampler(LatencySampler.RECORDED, 100, 0)
+        self.assertEqual(recorded.sample(250), 0.25)
+        self.assertEqual(LatencySampler(LatencySampler.LOGNORMAL, 0, 50).sample(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import unittest
+
+import numpy
+
+from src.test.test_conflict_analysis_executor import RiskLevel, analysis
+from src.tallmountain.normative.analysis.norm_risk_analysis import NormativeRiskAnalysis
+from src.tallmountain.normative.analysis.np_conflict_analyser import NormativeConflictAnalysis
+from src.tallmountain.normative.analysis.risk_scorer import RiskScorer
+
+
+def scored(
+    impact: int,
+    likelihood: int,
+    alignment: int,
+    multiplier: float,
+    score: float,
+    level: RiskLevel,
+):
+    return NormativeConflictAnalysis(
+        UserNormPropValue="A proposition.",
+        Likelihood=likelihood,
+        ImpactScore=impact,
+        NormAlignmentScore=alignment,
+        ContextMultiplier=multiplier,
+        RiskScore=score,
+        RiskLevel=level,
+        Analysis="An analysis.",
+    )
+
+
+class TestRiskScorer(unittest.TestCase):
+
+    def test_prompt_examples(self):
+        # the worked examples from norm_comparison_score.prompt
+        analyses = [
+            scored(5, 4, 1, 2.0, 38, "Critical"),
+            scored(4, 3, 2, 1.5, 14, "Moderate"),
+            scored(2, 5, 4, 1.0, 2, "Low"),
+            scored(5, 1, 1, 2.0, 8, "Low"),
+        ]
+        scorer = RiskScorer(norm_weight=2.0, thresholds=(10, 20, 30))
+        self.assertEqual(scorer.risk_scores(analyses).tolist(), [38, 14, 2, 8])
+        self.assertFalse(scorer.inconsistent(analyses).any())
+        self.assertEqual(scorer.rescore(analyses), analyses)
+
+    def test_thresholds_are_inclusive(self):
+        scorer = RiskScorer(thresholds=(10, 20, 30))
+        levels = scorer.level_indexes(numpy.array([-9, 10, 10.5, 20, 30, 31]))
+        self.assertEqual(
+            [RiskScorer.RISK_LEVELS[level] for level in levels],
+            ["Low", "Low", "Moderate", "Moderate", "High", "Critical"],
+        )
+
+    def test_rescore_corrects(self):
+        scorer = RiskScorer(thresholds=(10, 20, 30))
+        analyses = [
+            # wrong arithmetic
+            scored(5, 4, 1, 2.0, 18, "Moderate"),
+            # right score, wrong level
+            scored(4, 3, 2, 1.5, 14, "Low"),
+            scored(2, 5, 4, 1.0, 2, "Low"),
+        ]
+        self.assertEqual(scorer.inconsistent(analyses).tolist(), [True, True, False])
+        rescored = scorer.rescore(analyses)
+        self.assertEqual(rescored[0].RiskScore, 38)
+        self.assertEqual(rescored[0].RiskLevel, "Critical")
+        self.assertEqual(rescored[1].RiskLevel, "Moderate")
+        self.assertIs(rescored[2], analyses[2])
+        # the originals are left alone
+        self.assertEqual(analyses[0].RiskLevel, "Moderate")
+
+    def test_level_counts(self):
+        analyses = [analysis("A", "Low"), analysis("B", "High"), analysis("C", "High")]
+        self.assertEqual(RiskScorer().level_counts(analyses).tolist(), [1, 0, 2, 0])
+        self.assertEqual(RiskScorer().level_counts([]).tolist(), [0, 0, 0, 0])
+        # a mislabelled analysis counts at its recomputed level when correcting
+        mislabelled = [scored(1, 1, 5, 1.0, -9, "Critical")]
+        self.assertEqual(RiskScorer(correct=True).level_counts(mislabelled).tolist(), [1, 0, 0, 0])
+        self.assertEqual(RiskScorer(correct=False).level_counts(mislabelled).tolist(), [0, 0, 0, 1])
+
+    def test_rescore_stored_analyses(self):
+        risk_analysis = NormativeRiskAnalysis(scorer=RiskScorer(correct=True))
+        risk_analysis._analyses = [analysis("M", "Moderate")]
+        self.assertEqual(risk_analysis.ACCEPT_AND_EXECUTE, risk_analysis.recommendation)
+        # with a lower high threshold the moderate becomes a high, and so a rejection
+        stricter = RiskScorer(thresholds=(5, 10, 30), correct=True)
+        rescored = risk_analysis.rescore(stricter)
+        self.assertEqual(rescored[0].RiskLevel, "High")
+        self.assertEqual(risk_analysis.REJECT, risk_analysis.recommendation)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,12 +11,15 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import os
+import tempfile
 import unittest
 
 from src.tallmountain.normative.analysis.self_diagnostic import (
     NormativeDiagnostic,
     NormativeSelfDiagnostic,
 )
+from src.tallmountain.normative.normative_agent import NormativeAgent
 
 
 class TestNormativeSelfDiagnostic(unittest.TestCase):
@@ -30,6 +33,40 @@ class TestNormativeSelfDiagnostic(unittest.TestCase):
         self.assertIn(result.PassedDiagnostic, ["True", "False"])
         self.assertIsInstance(result.Analysis, str)
 
+    def test_stored_result_is_reused(self):
+        with tempfile.TemporaryDirectory() as directory:
+            diagnostic = NormativeSelfDiagnostic(
+                result_path=os.path.join(directory, "diagnostic", "result.json"), persist=True
+            )
+            agent = NormativeAgent.instance()
+            fingerprint = diagnostic.fingerprint(agent, diagnostic.build_messages(agent))
+            self.assertIsNone(diagnostic.stored(fingerprint))
+            result = NormativeDiagnostic(PassedDiagnostic="True", Analysis="Consistent.")
+            diagnostic.store(fingerprint, result)
+            self.assertEqual(diagnostic.stored(fingerprint), result)
+            # other norms or prompt
+            self.assertIsNone(diagnostic.stored("another fingerprint"))
+            # no LLM call is made for a stored result
+            self.assertEqual(diagnostic.diagnose(), result)
+            self.assertEqual(diagnostic.diagnose_in_background().result(timeout=5), result)
+
+    def test_unreadable_result_is_a_miss(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result_path = os.path.join(directory, "result.json")
+            with open(result_path, "w") as file:
+                file.write("{")
+            diagnostic = NormativeSelfDiagnostic(result_path=result_path, persist=True)
+            self.assertIsNone(diagnostic.stored("fingerprint"))
+
+    def test_not_persisted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result_path = os.path.join(directory, "result.json")
+            diagnostic = NormativeSelfDiagnostic(result_path=result_path, persist=False)
+            result = NormativeDiagnostic(PassedDiagnostic="True", Analysis="Consistent.")
+            diagnostic.store("fingerprint", result)
+            self.assertFalse(os.path.exists(result_path))
+            self.assertIsNone(diagnostic.stored("fingerprint"))
+
 
 if __name__ == "__main__":
     unittest.main()
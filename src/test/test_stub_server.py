@@ -0,0 +1,150 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+import unittest
+
+from openai.types import CompletionUsage
+
+from src.tallmountain import stub_server
+from src.tallmountain.llm.clients.replay import LatencySampler
+from src.tallmountain.llm.llm_facade import LLM
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.llm.llm_usage_metrics import LLMUsageMetrics
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.normative.analysis.user_intent import UserIntentAnalysis
+from src.test.test_xstructor import (
+    xml_example_str,
+    xml_schema_str,
+)
+
+
+class TestStubServer(unittest.TestCase):
+    NO_FAULTS = {
+        "rate_limit_rate": 0,
+        "server_error_rate": 0,
+        "content_filter_rate": 0,
+        "latency_distribution": "none",
+        "latency_mean_ms": 0,
+    }
+
+    def setUp(self) -> None:
+        self.client = stub_server.app.test_client()
+        self.client.post("/stub/faults", json=self.NO_FAULTS)
+
+    def test_instructor_tool_call(self) -> None:
+        schema = UserIntentAnalysis.model_json_schema()
+        body = {
+            "model": "gpt-4o",
+            "messages": [{"role": "user", "content": "What is the capital of France?"}],
+            "tools": [
+                {
+                    "type": "function",
+                    "function": {"name": "UserIntentAnalysis", "parameters": schema},
+                }
+            ],
+            "tool_choice": {"type": "function", "function": {"name": "UserIntentAnalysis"}},
+        }
+        response = self.client.post("/v1/chat/completions", json=body)
+        self.assertEqual(response.status_code, 200)
+        tool_call = response.get_json()["choices"][0]["message"]["tool_calls"][0]
+        analysis = UserIntentAnalysis.model_validate_json(tool_call["function"]["arguments"])
+        self.assertEqual(analysis.UserIntentScore, 9)
+
+    def test_generated_tool_arguments(self) -> None:
+        schema = {
+            "type": "object",
+            "properties": {
+                "Level": {"enum": ["Low", "High"]},
+                "Items": {"type": "array", "items": {"type": "integer"}},
+            },
+        }
+        arguments = stub_server.StubResponses.example_from_schema(schema, {})
+        self.assertEqual(arguments, {"Level": "Low", "Items": [1]})
+
+    def test_xstructor_completion_is_schema_valid(self) -> None:
+        xstructor = XStructor(llm_client=None)
+        messages = LLMMessages().build("Mary has two children.", LLMMessages.USER).messages
+        prompt = xstructor.get_completion_prompt(messages, xml_schema_str, xml_example_str)
+        body = {"messages": [{"role": "user", "content": prompt}]}
+        response = self.client.post("/v1/chat/completions", json=body)
+        content = response.get_json()["choices"][0]["message"]["content"]
+        self.assertTrue(
+            xstructor.is_valid_xml(xstructor.clean_xml_response(content), xml_schema_str)
+        )
+
+    def test_n_choices(self) -> None:
+        body = {"messages": [{"role": "user", "content": "Hello"}], "n": 3}
+        choices = self.client.post("/v1/chat/completions", json=body).get_json()["choices"]
+        self.assertEqual([choice["index"] for choice in choices], [0, 1, 2])
+
+    def test_streamed_choices(self) -> None:
+        body = {"messages": [{"role": "user", "content": "Hello"}], "n": 2, "stream": True}
+        events = self.client.post("/v1/chat/completions", json=body).get_data(as_text=True)
+        data = [line[6:] for line in events.splitlines() if line.startswith("data: ")]
+        self.assertEqual(data[-1], "[DONE]")
+        content = ["", ""]
+        for chunk in data[:-1]:
+            for choice in json.loads(chunk)["choices"]:
+                content[choice["index"]] += choice["delta"].get("content", "")
+        self.assertEqual(content, [stub_server.StubResponses.DEFAULT_CONTENT] * 2)
+
+    def test_cached_prompt_prefix(self) -> None:
+        static_context = "The same instructions for every request. " * 200
+        usages = []
+        for question in ["First question?", "Second question?"]:
+            body = {"messages": [{"role": "user", "content": static_context + question}]}
+            response = self.client.post("/v1/chat/completions", json=body).get_json()
+            usages.append(CompletionUsage.model_validate(response["usage"]))
+        self.assertEqual(usages[0].prompt_tokens_details.cached_tokens, 0)
+        self.assertGreaterEqual(
+            usages[1].prompt_tokens_details.cached_tokens, stub_server.StubPromptCache.MIN_TOKENS
+        )
+        LLMUsageMetrics.clear()
+        for usage in usages:
+            LLMUsageMetrics.record(LLMUsageMetrics.COMPLETION, usage)
+        LLMUsageMetrics.record(LLMUsageMetrics.COMPLETION, None)
+        stats = LLMUsageMetrics.stats(LLMUsageMetrics.COMPLETION)
+        self.assertEqual(stats[LLMUsageMetrics.REQUESTS], 2)
+        self.assertGreater(LLMUsageMetrics.cached_token_rate(LLMUsageMetrics.COMPLETION), 0.3)
+
+    def test_prompt_cache_is_bounded(self) -> None:
+        prompt_cache = stub_server.StubPromptCache(max_prefixes=64)
+        for question in range(4):
+            prompt_cache.cached_tokens(f"Question {question}. " + "x" * 8192)
+        self.assertEqual(len(prompt_cache._prefixes), 64)
+
+    def test_seeded_latency_survives_a_fault_change(self) -> None:
+        faults = stub_server.StubFaults(LatencySampler(LatencySampler.UNIFORM, 100, 50, seed=7))
+        faults.update({"latency_mean_ms": 200})
+        expected = LatencySampler(LatencySampler.UNIFORM, 200, 50, seed=7)
+        self.assertEqual(
+            [faults.latency.sample() for _ in range(5)], [expected.sample() for _ in range(5)]
+        )
+
+    def test_injected_faults(self) -> None:
+        self.client.post("/stub/faults", json={"rate_limit_rate": 1})
+        response = self.client.post("/v1/chat/completions", json={"messages": []})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("retry-after", response.headers)
+
+        self.client.post("/stub/faults", json={"rate_limit_rate": 0, "content_filter_rate": 1})
+        response = self.client.post("/v1/chat/completions", json={"messages": []})
+        self.assertEqual(response.status_code, 400)
+        # the openai sdk raises with the status code and body in the message
+        error = Exception(f"Error code: 400 - {json.dumps(response.get_json())}")
+        self.assertTrue(LLM.is_bad_request(error))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,6 +13,10 @@
 
 import unittest
 
+from lxml import etree  # nosec
+
+from src.tallmountain.normative.analysis.np_extractor import NormPropExtractor
+
 from src.tallmountain.normative.entities.user_task import TaskResponse, UserTask
 
 
@@ -29,6 +33,19 @@ class TestUserTask(unittest.TestCase):
         user_task: UserTask = UserTask.get_from_query(statement)
         self.assertIsNotNone(user_task)
 
+    def test_get_user_task_two_calls(self) -> None:
+        statement = "I need help organizing my schedule for next week."
+        user_task: UserTask = UserTask.get_from_query(statement, fused=False)
+        self.assertIsNotNone(user_task)
+
+    def test_from_task_element(self) -> None:
+        element = etree.XML(NormPropExtractor.task_extraction_example.strip())
+        norm_props = NormPropExtractor().element_to_normative_propositions(element)
+        user_task = UserTask.from_task_element(element.find("task"), norm_props)
+        self.assertEqual(user_task.name, "Example task")
+        self.assertTrue(user_task.description.startswith("The task in more detail"))
+        self.assertEqual(user_task.normative_propositions, norm_props)
+
 
 if __name__ == "__main__":
     unittest.main()
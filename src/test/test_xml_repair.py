@@ -0,0 +1,92 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import unittest
+from typing import List
+
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.llm.xml_repair import XMLRepair
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_options import XStructorOptions
+from src.tallmountain.normative.analysis.np_extractor import NormPropExtractor
+
+schema = NormPropExtractor.np_extraction_schema.strip()
+example = NormPropExtractor.np_extraction_example.strip()
+
+
+class CannedLLMClient:
+    """Returns canned responses in turn and keeps the prompts it was sent."""
+
+    def __init__(self, responses) -> None:
+        self.responses = list(responses)
+        self.prompts: List[str] = []
+
+    def do_string(self, messages, mode):
+        self.prompts.append(messages[-1]["content"])
+        return self.responses.pop(0)
+
+
+class TestXMLRepair(unittest.TestCase):
+    def test_stray_ampersand_and_less_than(self) -> None:
+        xml = example.replace("Proposition A", "Salt & pepper < 3 spoons")
+        element = XMLRepair(schema).repair_locally(xml)
+        self.assertIsNotNone(element)
+        self.assertEqual(
+            element.findtext("implied_propositions/NormativeProposition/proposition-value"),
+            "Salt & pepper < 3 spoons",
+        )
+
+    def test_truncated_response_is_not_repaired(self) -> None:
+        truncated = example[: example.index("Proposition B") + 5]
+        self.assertIsNone(XMLRepair(schema).repair_locally(truncated))
+
+    def test_enumerated_value_is_corrected(self) -> None:
+        xml = example.replace("SCIENTIFIC_TECHNICAL", " scientific-technical")
+        element = XMLRepair(schema).repair_locally(xml)
+        propositions = element.findall("implied_propositions/NormativeProposition")
+        self.assertEqual(len(propositions), 2)
+        self.assertEqual(propositions[1].findtext("level"), "SCIENTIFIC_TECHNICAL")
+
+    def test_invalid_enum_keeps_the_proposition(self) -> None:
+        xml = example.replace("SCIENTIFIC_TECHNICAL", "ASTROLOGICAL")
+        self.assertIsNone(XMLRepair(schema).repair_locally(xml))
+        # left to the repair prompt, which is asked to fix the value
+        client = CannedLLMClient([xml, example])
+        messages = LLMMessages().build("Tell me a joke.", LLMMessages.USER).messages
+        element = XStructor(client).do_xstructor_element(messages, example, schema)
+        self.assertEqual(len(element.findall("implied_propositions/NormativeProposition")), 2)
+        self.assertIn("ASTROLOGICAL", client.prompts[1])
+
+    def test_wrong_root_is_not_repaired(self) -> None:
+        self.assertIsNone(XMLRepair(schema).repair_locally("<Family><parent/></Family>"))
+
+    def test_repair_prompt_follows_an_invalid_response(self) -> None:
+        client = CannedLLMClient(["<Family><parent/></Family>", example])
+        messages = LLMMessages().build("Tell me a joke.", LLMMessages.USER).messages
+        element = XStructor(client).do_xstructor_element(messages, example, schema)
+        self.assertEqual(element.tag, "NormativeAnalysisResult")
+        self.assertIn("=== START INVALID XML ===", client.prompts[1])
+        self.assertNotIn("Tell me a joke.", client.prompts[1])
+
+    def test_max_attempts_option(self) -> None:
+        client = CannedLLMClient(["not xml", example])
+        messages = LLMMessages().build("Tell me a joke.", LLMMessages.USER).messages
+        with self.assertRaises(LLMException):
+            XStructor(client).do_xstructor_element(
+                messages, example, schema, options=XStructorOptions(max_attempts=1)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
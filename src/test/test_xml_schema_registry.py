@@ -0,0 +1,53 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import concurrent.futures
+import unittest
+
+from src.tallmountain.exceptions.llm_exception import LLMException
+from src.tallmountain.llm.xml_schema_registry import XMLSchemaRegistry
+from src.tallmountain.llm.xstructor import XStructor
+from src.test.test_xstructor import xml_example_str, xml_schema_str
+
+
+class TestXMLSchemaRegistry(unittest.TestCase):
+    def setUp(self) -> None:
+        XMLSchemaRegistry.clear()
+
+    def test_schema_compiled_once(self) -> None:
+        schema, _ = XMLSchemaRegistry.get(xml_schema_str)
+        # an equal schema from a different string object hits the same entry
+        self.assertIs(XMLSchemaRegistry.get("".join(list(xml_schema_str)))[0], schema)
+
+    def test_concurrent_validation(self) -> None:
+        xstructor = XStructor(llm_client=None)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    lambda xml: xstructor.is_valid_xml(xml, xml_schema_str),
+                    [xml_example_str, "<Invalid/>"] * 50,
+                )
+            )
+        self.assertEqual(results, [True, False] * 50)
+
+    def test_example_checked_once(self) -> None:
+        xstructor = XStructor(llm_client=None)
+        self.assertFalse(XMLSchemaRegistry.is_valid_example(xml_schema_str, xml_example_str))
+        xstructor.check_xml_example(xml_example_str, xml_schema_str)
+        self.assertTrue(XMLSchemaRegistry.is_valid_example(xml_schema_str, xml_example_str))
+        with self.assertRaises(LLMException):
+            xstructor.check_xml_example("<Invalid/>", xml_schema_str)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import unittest
+
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.llm.xml_stream_validator import XMLStreamValidator
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_metrics import XStructorMetrics
+from src.tallmountain.llm.xstructor_options import XStructorOptions
+from src.tallmountain.normative.analysis.np_extractor import NormPropExtractor
+
+schema = NormPropExtractor.np_extraction_schema.strip()
+example = NormPropExtractor.np_extraction_example.strip()
+messages = LLMMessages().build("Tell me a joke.", LLMMessages.USER).messages
+
+
+def feed_all(validator, text, size=16):
+    """Feeds the text in chunks, returning the first violation and the characters fed."""
+    for start in range(0, len(text), size):
+        violation = validator.feed(text[start:][:size])
+        if violation is not None:
+            return violation, start + size
+    return None, len(text)
+
+
+class StreamingLLMClient:
+    """Streams canned responses in turn, counting the chunks actually read."""
+
+    def __init__(self, responses) -> None:
+        self.responses = list(responses)
+        self.chunks_read = 0
+
+    def do_string_stream(self, messages, mode, n=1):
+        response = self.responses.pop(0)
+        for start in range(0, len(response), 16):
+            self.chunks_read += 1
+            yield 0, response[start:][:16]
+
+
+class AsyncStreamingLLMClient(StreamingLLMClient):
+    async def do_string_stream(self, messages, mode, n=1):
+        for chunk in StreamingLLMClient.do_string_stream(self, messages, mode, n):
+            yield chunk
+
+
+class TestXMLStreamValidator(unittest.TestCase):
+    def setUp(self) -> None:
+        XStructorMetrics.clear()
+
+    def test_valid_stream_completes(self) -> None:
+        validator = XMLStreamValidator(schema)
+        violation, _ = feed_all(validator, f"```xml\n{example}\n```")
+        self.assertIsNone(violation)
+        self.assertTrue(validator.complete)
+
+    def test_wrong_root(self) -> None:
+        violation, fed = feed_all(XMLStreamValidator(schema), "<Family><parent/></Family>" * 20)
+        self.assertIn("root", violation)
+        self.assertLessEqual(fed, 16)
+
+    def test_unknown_level(self) -> None:
+        xml = example.replace("SCIENTIFIC_TECHNICAL", "ASTROLOGICAL")
+        violation, fed = feed_all(XMLStreamValidator(schema), xml)
+        self.assertIn("ASTROLOGICAL", violation)
+        self.assertLess(fed, len(xml))
+
+    def test_too_many_propositions(self) -> None:
+        validator = XMLStreamValidator(schema, {"NormativeProposition": 1})
+        violation, fed = feed_all(validator, example)
+        self.assertIn("NormativeProposition", violation)
+        self.assertLess(fed, example.index("Proposition B"))
+
+    def test_syntax_errors_are_left_to_repair(self) -> None:
+        xml = example.replace("Proposition A", "Salt & pepper")
+        validator = XMLStreamValidator(schema)
+        self.assertEqual(feed_all(validator, xml), (None, len(xml)))
+
+    def test_xstructor_stops_a_bad_stream(self) -> None:
+        bad = example.replace("SOCIAL_POLITICAL", "ASTROLOGICAL") + "\n<!-- padding -->" * 100
+        client = StreamingLLMClient([bad, example])
+        options = XStructorOptions(stream=True, candidates=1, label="test")
+        element = XStructor(client).do_xstructor_element(messages, example, schema, options=options)
+        self.assertEqual(element.tag, "NormativeAnalysisResult")
+        # the bad stream is cut off well before its end
+        self.assertLess(client.chunks_read, len(bad) // 16)
+        stats = XStructorMetrics.stats("test")
+        self.assertEqual(stats[XStructorMetrics.STREAM_ABORTS], 1)
+        self.assertEqual(stats[XStructorMetrics.LATER_SAMPLE_VALID], 1)
+
+    def test_async_stream(self) -> None:
+        client = AsyncStreamingLLMClient([f"```xml\n{example}\n```"])
+        options = XStructorOptions(stream=True, candidates=1)
+        element = asyncio.run(
+            XStructor(client).do_xstructor_element_async(messages, example, schema, options=options)
+        )
+        self.assertEqual(element.tag, "NormativeAnalysisResult")
+
+    def test_elements_are_yielded_as_they_close(self) -> None:
+        client = StreamingLLMClient([example])
+        elements = XStructor(client).stream_elements(
+            messages, example, schema, "NormativeProposition"
+        )
+        first = next(elements)
+        self.assertEqual(first.findtext("proposition-value"), "Proposition A")
+        # the first proposition arrives before the response is complete
+        self.assertLess(client.chunks_read * 16, example.index("Proposition B"))
+        self.assertEqual(len(list(elements)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -107,6 +107,24 @@ class TextXStructor(unittest.TestCase):
         )
         self.assertIsNotNone(response)
 
+    def test_xstructor_element(self):
+        class CannedLLMClient:
+            """Answers with invalid xml first, then the example."""
+
+            def __init__(self) -> None:
+                self.responses = [xml_invalid_example_str, f"```xml\n{xml_example_str}\n```"]
+
+            def do_string(self, messages, mode):
+                return self.responses.pop(0)
+
+        xstructor = XStructor(CannedLLMClient())
+        llm_messages = LLMMessages().build("Mary has two children.", LLMMessages.USER)
+        element = xstructor.do_xstructor_element(
+            llm_messages.messages, xml_example_str, xml_schema_str
+        )
+        self.assertEqual(element.tag, "family")
+        self.assertEqual(len(element.findall("child")), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,138 @@
+# Copyright 2023 Seamus Brady
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import asyncio
+import threading
+import time
+import unittest
+
+from src.tallmountain.llm.llm_messages import LLMMessages
+from src.tallmountain.llm.xstructor import XStructor
+from src.tallmountain.llm.xstructor_metrics import XStructorMetrics
+from src.tallmountain.llm.xstructor_options import XStructorOptions
+from src.tallmountain.normative.analysis.np_extractor import NormPropExtractor
+
+schema = NormPropExtractor.np_extraction_schema.strip()
+example = NormPropExtractor.np_extraction_example.strip()
+messages = LLMMessages().build("Tell me a joke.", LLMMessages.USER).messages
+
+
+class CandidateLLMClient:
+    """Returns canned candidates from one request, counting the requests made."""
+
+    def __init__(self, candidates) -> None:
+        self.candidates = candidates
+        self.requests = 0
+
+    def do_string_candidates(self, messages, mode, n):
+        self.requests += 1
+        return self.candidates[:n]
+
+
+class SlowLLMClient:
+    """Answers concurrent requests, the valid answer arriving first once all have started."""
+
+    def __init__(self, requests: int = 3) -> None:
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.requests = requests
+        self.all_started = threading.Event()
+
+    def do_string(self, messages, mode):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+            if self.calls == self.requests:
+                self.all_started.set()
+        if call == 1:
+            # so the requests not yet started are not dropped when this one is valid
+            self.all_started.wait(timeout=0.4)
+            return example
+        time.sleep(0.5)
+        return "not xml"
+
+
+class AsyncSlowLLMClient:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.cancelled = 0
+
+    async def do_string(self, messages, mode):
+        self.calls += 1
+        if self.calls == 1:
+            return example
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "not xml"
+
+
+class TestXStructorCandidates(unittest.TestCase):
+    def setUp(self) -> None:
+        XStructorMetrics.clear()
+
+    def test_n_candidates_first_valid_wins(self) -> None:
+        client = CandidateLLMClient(["not xml", example])
+        options = XStructorOptions(
+            candidates=2, candidate_mode=XStructorOptions.N_CANDIDATES, label="test"
+        )
+        element = XStructor(client).do_xstructor_element(messages, example, schema, options=options)
+        self.assertEqual(element.tag, "NormativeAnalysisResult")
+        self.assertEqual(client.requests, 1)
+        stats = XStructorMetrics.stats("test")
+        self.assertEqual(stats[XStructorMetrics.LATER_SAMPLE_VALID], 1)
+        self.assertNotIn(XStructorMetrics.FIRST_SAMPLE_VALID, stats)
+
+    def test_first_sample_valid_rate(self) -> None:
+        client = CandidateLLMClient([example, "not xml"])
+        options = XStructorOptions(
+            candidates=2, candidate_mode=XStructorOptions.N_CANDIDATES, label="test"
+        )
+        XStructor(client).do_xstructor_element(messages, example, schema, options=options)
+        self.assertEqual(XStructorMetrics.first_sample_valid_rate("test"), 1.0)
+
+    def test_concurrent_candidates_do_not_wait_for_the_slowest(self) -> None:
+        client = SlowLLMClient()
+        options = XStructorOptions(
+            candidates=3, candidate_mode=XStructorOptions.CONCURRENT_CANDIDATES, label="test"
+        )
+        started = time.perf_counter()
+        xml = XStructor(client).do_xstructor_completion(messages, example, schema, options=options)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertIn("NormativeAnalysisResult", xml)
+        self.assertEqual(client.calls, 3)
+
+    def test_async_candidates_are_cancelled(self) -> None:
+        client = AsyncSlowLLMClient()
+        options = XStructorOptions(
+            candidates=3, candidate_mode=XStructorOptions.CONCURRENT_CANDIDATES, label="test"
+        )
+
+        async def run():
+            element = await XStructor(client).do_xstructor_element_async(
+                messages, example, schema, options=options
+            )
+            # let the cancellations run
+            await asyncio.sleep(0)
+            return element
+
+        element = asyncio.run(run())
+        self.assertEqual(element.tag, "NormativeAnalysisResult")
+        self.assertEqual(client.cancelled, 2)
+        self.assertEqual(XStructorMetrics.stats("test")[XStructorMetrics.FIRST_SAMPLE_VALID], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
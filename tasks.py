@@ -79,8 +79,22 @@ def appserver(c):
     print("Running chat server...")
     c.run("python src/tallmountain/app_server.py")
 
+@task
+def stubserver(c):
+    print("Running OpenAI stub server...")
+    c.run("python src/tallmountain/stub_server.py")
+
 @task
 def repl(c):
     print("Running repl...")
     c.run("rlwrap python src/tallmountain/app_repl.py")
 
+@task
+def benchmark_executors(c):
+    print("Benchmarking the conflict analysis executors against the stub server...")
+    c.run("python src/tallmountain/benchmarks/executor_benchmark.py")
+
+@task
+def benchmark_intent_impact(c):
+    print("Benchmarking fused against separate intent and impact scoring...")
+    c.run("python src/tallmountain/benchmarks/intent_impact_benchmark.py")